@@ -0,0 +1,117 @@
+"""Per-process admission control for turns sent to the chatbot backend.
+
+At most `limit` turns talk to the backend at once, counting the chat POST, its
+stream and any reconnects. Later turns wait in one FIFO queue shared by every
+session, so a burst from a few tabs cannot overtake turns already waiting (a
+session has one turn at a time: a new one cancels its previous one). Turns are
+shed instead of queued once max_queue are waiting, and leave the queue after
+max_wait seconds, so users get a clear "busy" message rather than a backend
+timeout.
+"""
+import collections
+import threading
+import time
+
+import config
+import metrics
+
+
+class AdmissionRejected(Exception):
+    """A turn was shed: too many turns were waiting, or it waited too long."""
+
+
+class Ticket:
+    """One turn's place in the queue, and then its upstream slot."""
+
+    __slots__ = ("session_id", "enqueued", "admitted", "observed")
+
+    def __init__(self, session_id, observed=True):
+        self.session_id = session_id
+        self.enqueued = time.monotonic()
+        self.admitted = False
+        # Speculative turns are left out of the queue metrics
+        self.observed = observed
+
+
+class AdmissionController:
+    """Caps the turns in flight upstream and queues the rest in arrival order."""
+
+    def __init__(self, limit=None, max_queue=None, max_wait=None):
+        self.limit = config.UPSTREAM_MAX_IN_FLIGHT if limit is None else limit
+        self.max_queue = config.UPSTREAM_MAX_QUEUE if max_queue is None else max_queue
+        self.max_wait = config.UPSTREAM_MAX_QUEUE_WAIT if max_wait is None else max_wait
+        self.in_flight = 0
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+
+    def enter(self, session_id):
+        """A ticket for a new turn, admitted at once when a slot is free and nobody is waiting.
+
+        Raises AdmissionRejected when max_queue turns are already waiting.
+        """
+        ticket = Ticket(session_id)
+        with self._cond:
+            if self.in_flight < self.limit and not self._queue:
+                self._admit(ticket)
+            elif len(self._queue) >= self.max_queue:
+                metrics.inc("genie_admission_total", {"result": "shed_queue_full"})
+                raise AdmissionRejected(f"{len(self._queue)} turns already waiting")
+            else:
+                self._queue.append(ticket)
+        if not ticket.admitted:
+            metrics.inc("genie_admission_total", {"result": "queued"})
+        return ticket
+
+    def try_enter(self, session_id):
+        """A ticket only if a slot is free right now, else None; never queues (for prefetches)."""
+        with self._cond:
+            if self.in_flight >= self.limit or self._queue:
+                return None
+            ticket = Ticket(session_id, observed=False)
+            self._admit(ticket)
+            return ticket
+
+    def saturated(self):
+        """Whether a new turn would have to wait."""
+        with self._cond:
+            return self.in_flight >= self.limit or bool(self._queue)
+
+    def wait(self, ticket, timeout):
+        """Wait up to timeout for ticket to be admitted; returns its place in line (0 once admitted)."""
+        with self._cond:
+            if not ticket.admitted:
+                self._cond.wait(timeout)
+            return 0 if ticket.admitted else self._queue.index(ticket) + 1
+
+    def leave(self, ticket, reason="cancelled"):
+        """Give back ticket's slot, or take it out of the queue when it was never admitted."""
+        with self._cond:
+            if ticket.admitted:
+                self.in_flight -= 1
+                self._grant()
+                return
+            self._queue.remove(ticket)
+            # The next waiters move up a place
+            self._cond.notify_all()
+        if ticket.observed:
+            metrics.inc("genie_admission_total", {"result": reason})
+            metrics.observe("genie_admission_wait_seconds", time.monotonic() - ticket.enqueued, {"result": reason})
+
+    def _admit(self, ticket):
+        ticket.admitted = True
+        self.in_flight += 1
+        if ticket.observed:
+            metrics.inc("genie_admission_total", {"result": "admitted"})
+            metrics.observe(
+                "genie_admission_wait_seconds", time.monotonic() - ticket.enqueued, {"result": "admitted"},
+            )
+
+    def _grant(self):
+        """Admit waiting turns, oldest first, while slots are free."""
+        while self._queue and self.in_flight < self.limit:
+            self._admit(self._queue.popleft())
+        self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"in_flight": self.in_flight, "queued": len(self._queue), "limit": self.limit}
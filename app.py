@@ -1,270 +1,285 @@
-import json
 import logging
 import streamlit as st
-import requests
 import uuid
 import time
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+import metrics
+from config import (
+    CHATBOT_SERVICE_URL, CHAT_CANCEL_PATH, CHAT_METADATA, CHAT_REQUEST_MODE, CHAT_STREAM_POST_PATH, CHAT_TIMEOUT,
+    COALESCE_REQUESTS, HISTORY_MAX_TURNS, HISTORY_WINDOW_TURNS, STREAM_FLUSH_INTERVAL, STREAM_POLL_INTERVAL,
+    STREAM_RENDER_MODE, STREAM_UI_SLICE,
+)
+from messages import ChatMessage, apply_event
+from rendering import (
+    StreamRenderer, finalize_message, history_split, inject_page_assets, render_history, render_message,
+)
+# Built once per process; the HTTP stack and stores load on first use, not with the first page
+from resources import (
+    get_history_store, get_http_session, get_prefetcher, get_response_cache, get_session_store, get_stream_manager,
+    init_process,
 )
-logger = logging.getLogger(__name__)
-
-
-CHATBOT_SERVICE_URL = "https://api-qa.edvoy.com"
-# CHATBOT_SERVICE_URL = "http://localhost:4110"
-
-def render_course_cards(sources, intent):
-    """Generate HTML for course or university sources."""
-    if not sources:
-        return ""
-    
-    html_output = '<div class="sources-section">'
-    course_template = """
-<div class="course-card">
-    <div class="course-content">
-        <div class="course-title">{course_name}</div>
-        <div class="course-university">🏛️ {university_name}</div>
-        <div class="course-location">📍 {location}</div>
-        <a href="{course_url}" target="_blank" class="course-link">View Course ↗</a>
-    </div>
-</div>
-"""
-    
-    university_template = """
-<div class="course-card">
-    <div class="course-content">
-        <div class="course-title">{university_name}</div>
-        <div class="course-location">📍 {location}</div>
-        <a href="{university_url}" target="_blank" class="course-link">View University ↗</a>
-    </div>
-</div>
-"""
-
-    for source in sources[:5]:
-        if intent == "UNIVERSITY_SEARCH":
-            university_name = source.get("name", "Unknown University")
-            address = source.get("address", {})
-            location = address.get('country', 'N/A')
-            ref_id = source.get("refId", "")
-            university_url = source.get("url", f"https://edvoy.com/institutions/{ref_id}/")
-            html_output += university_template.format(university_name=university_name, location=location, university_url=university_url)
-        else:
-            institution = source.get("institution", {})
-            address = institution.get("address", {})
-            course_name = source.get("name", "Course Title")
-            university_name = institution.get("name", "Unknown University")
-            location = address.get('country', 'N/A')
-            edp_ref_id = source.get("edpRefId", "")
-            course_level = (source.get("courseLevel") or "").lower()
-            slug = source.get("slug", "")
-            course_url = source.get("url", f"https://edvoy.com/institutions/{edp_ref_id}/{course_level}/{slug}/")
-            html_output += course_template.format(course_name=course_name, university_name=university_name, location=location, course_url=course_url)
-    
-    html_output += '</div>'
-    return html_output
 
-def render_message(entry, placeholder=st):
-    """Render a single message entry with all its metadata."""
-    if entry["sender"] == "user":
-        placeholder.markdown(f'<div class="user-message"><strong>You:</strong> {entry["text"]}</div>', unsafe_allow_html=True)
-    else:
-        # Check for thinking state
-        thinking_text = entry.get("thinkingText", "")
-        text = entry.get("text", "")
-        
-        # Display Header
-        placeholder.markdown(f'<div class="genie-header"><strong>🧞‍♂️ Genie</strong></div>', unsafe_allow_html=True)
-        
-        # Thinking State (only show if no text or if it's explicitly a transition)
-        if thinking_text and not entry.get("isStreamEnded", False):
-            placeholder.markdown(f'<div class="thinking-message"><span class="pulse"></span> {thinking_text}</div>', unsafe_allow_html=True)
-        
-        if text:
-            # Render main response
-            placeholder.markdown(text)
-            
-            # Sources/Cards
-            sources = entry.get("sources", [])
-            if sources:
-                placeholder.markdown(render_course_cards(sources, entry.get("intent", "")), unsafe_allow_html=True)
-            
-            # Suggestions
-            suggestions = entry.get("suggestions", [])
-            if suggestions and entry.get("isStreamEnded", False):
-                # Using a container for suggestions to keep them grouped
-                with placeholder.container():
-                    st.write("---") # Visual separator
-                    st.caption("Suggested actions:")
-                    # Create columns for buttons to simulate chips
-                    cols = st.columns(len(suggestions) if len(suggestions) > 0 else 1)
-                    for i, sugg in enumerate(suggestions):
-                        btn_label = sugg.get("text", sugg.get("prompt", "Option"))
-                        # Use a unique key for each button
-                        if i < len(cols):
-                            if cols[i].button(btn_label, key=f"sugg_{entry.get('id', 'h')}_{i}"):
-                                st.session_state.suggestion_clicked = {
-                                    "prompt": sugg.get("prompt"),
-                                    "action": sugg.get("action")
-                                }
-                                st.rerun()
+logger = logging.getLogger(__name__)
 
 st.set_page_config(page_title="Genie 🎓 Assistant", layout="wide")
+init_process()
 
-# Custom CSS
-st.markdown("""
-<style>
-.main-header {
-    background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-    -webkit-background-clip: text;
-    -webkit-text-fill-color: transparent;
-    font-size: 2.5em;
-    font-weight: bold;
-    text-align: center;
-    margin-bottom: 30px;
-}
-.user-message {
-    background: #f0f8ff;
-    padding: 12px 16px;
-    border-radius: 15px 15px 0 15px;
-    margin: 10px 0 10px auto;
-    border-right: 4px solid #667eea;
-    color: #1a1a1a;
-    max-width: 80%;
-    box-shadow: 0 2px 5px rgba(0,0,0,0.05);
-}
-.genie-header {
-    color: #764ba2;
-    margin-bottom: 4px;
-    font-size: 0.9em;
-    margin-top: 15px;
-}
-.thinking-message {
-    background: #f9f9f9;
-    padding: 10px 16px;
-    border-radius: 0 15px 15px 15px;
-    border-left: 4px solid #d1d5db;
-    color: #6b7280;
-    font-style: italic;
-    display: flex;
-    align-items: center;
-    gap: 10px;
-}
-.pulse {
-    width: 8px;
-    height: 8px;
-    background-color: #d1d5db;
-    border-radius: 50%;
-    animation: pulse-animation 1.5s infinite;
-}
-@keyframes pulse-animation {
-    0% { transform: scale(1); opacity: 1; }
-    50% { transform: scale(1.5); opacity: 0.5; }
-    100% { transform: scale(1); opacity: 1; }
-}
-.course-card {
-    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-    border-radius: 12px;
-    padding: 15px;
-    margin: 10px 0;
-    color: white;
-    box-shadow: 0 4px 12px rgba(0, 0, 0, 0.1);
-}
-.course-title { font-weight: bold; font-size: 1.1em; margin-bottom: 5px; }
-.course-link {
-    display: inline-block;
-    background: rgba(255, 255, 255, 0.2);
-    color: white !important;
-    padding: 5px 12px;
-    border-radius: 15px;
-    text-decoration: none;
-    font-size: 0.85em;
-    margin-top: 8px;
-}
-.sources-section {
-    display: grid;
-    grid-template-columns: repeat(auto-fill, minmax(280px, 1fr));
-    gap: 15px;
-    margin-top: 10px;
-}
-/* Chat container styling */
-.chat-container {
-    display: flex;
-    flex-direction: column;
-    height: calc(100vh - 200px);
-    overflow-y: auto;
-    padding-bottom: 20px;
-}
-/* Ensure input stays at bottom */
-.stChatInput {
-    position: sticky;
-    bottom: 0;
-    background-color: var(--background-color);
-    z-index: 100;
-    padding-top: 10px;
-}
-/* Auto-scroll to bottom */
-.chat-messages {
-    flex: 1;
-    overflow-y: auto;
-    padding-bottom: 20px;
-}
-</style>
-<script>
-function scrollToBottom() {
-    window.scrollTo({
-        top: document.body.scrollHeight,
-        behavior: 'smooth'
-    });
-}
-// Scroll to bottom on page load
-window.addEventListener('load', scrollToBottom);
-// Scroll to bottom when content changes
-const observer = new MutationObserver(scrollToBottom);
-observer.observe(document.body, { childList: true, subtree: true });
-</script>
-""", unsafe_allow_html=True)
+inject_page_assets()
 
 st.markdown('<h1 class="main-header">Genie 🎓 Study Abroad Assistant</h1>', unsafe_allow_html=True)
 
+def restorable_session_id():
+    """Session id carried in the page URL from an earlier visit, if valid."""
+    sid = st.query_params.get("sid") if hasattr(st, "query_params") else None
+    try:
+        return str(uuid.UUID(sid)) if sid else None
+    except ValueError:
+        return None
+
+def start_session(session_id):
+    """Switch to session_id and remember it in the URL so a refresh can restore it."""
+    st.session_state.session_id = session_id
+    if hasattr(st, "query_params"):
+        st.query_params["sid"] = session_id
+
 # Initialize session vars
 if "session_id" not in st.session_state:
-    st.session_state.session_id = str(uuid.uuid4())
+    restored_id = restorable_session_id()
+    if restored_id:
+        # Only the recent window is read now; older turns load with the archive
+        window = 2 * (HISTORY_WINDOW_TURNS or HISTORY_MAX_TURNS) or None
+        recent, total = get_history_store().load_recent(restored_id, window)
+        logger.info(f"Restored session {restored_id}: {len(recent)} of {total} messages")
+        st.session_state.history = recent
+        st.session_state.spilled = total - len(recent)
+        shared = get_session_store().load(restored_id) if get_session_store() is not None else None
+        if shared:
+            from session_store import restore
+            # Picks up a turn another process was streaming; its stream is reopened below
+            st.session_state.update(restore(shared))
+    start_session(restored_id or str(uuid.uuid4()))
 if "history" not in st.session_state:
     st.session_state.history = []
 if "pending_response" not in st.session_state:
     st.session_state.pending_response = False
 if "suggestion_clicked" not in st.session_state:
     st.session_state.suggestion_clicked = None
+if "pending_cache_key" not in st.session_state:
+    st.session_state.pending_cache_key = None
+if "spilled" not in st.session_state:
+    st.session_state.spilled = 0
+if "turn_started" not in st.session_state:
+    st.session_state.turn_started = None
+if "send_error" not in st.session_state:
+    st.session_state.send_error = None
+if "turn_id" not in st.session_state:
+    st.session_state.turn_id = None
+
+def append_history(record):
+    """Add a finished message and persist it; turns past HISTORY_MAX_TURNS leave session state."""
+    history = st.session_state.history
+    history.append(record)
+    get_history_store().append(st.session_state.session_id, [record])
+    excess = history_split(history, HISTORY_MAX_TURNS)
+    if excess:
+        del history[:excess]
+        st.session_state.spilled += excess
+
+def sync_session():
+    """Publish this session's turn state so any app process can resume it."""
+    store = get_session_store()
+    if store is None:
+        return
+    from session_store import snapshot
+    try:
+        # Another process restoring the session must also see the history written so far
+        get_history_store().flush()
+        store.save(st.session_state.session_id, snapshot(st.session_state))
+    except Exception as e:
+        logger.warning(f"Session store write failed for {st.session_state.session_id}: {e}")
+
+def stream_url(session_id):
+    return f"{CHATBOT_SERVICE_URL}/chat-bot/chat-stream/{session_id}"
+
+CANCEL_URL = f"{CHATBOT_SERVICE_URL}{CHAT_CANCEL_PATH}" if CHAT_CANCEL_PATH else None
 
 def send_message(query_text, action_key=""):
+    from response_cache import cacheable, make_key
+    # A new message supersedes whatever is still streaming for this session
+    get_stream_manager().cancel(st.session_state.session_id, "superseded")
     try:
         logger.info(f"Sending message: {query_text[:50]}...")
-        st.session_state.history.append({"sender": "user", "text": query_text})
-        
-        resp = requests.post(
-            f"{CHATBOT_SERVICE_URL}/chat-bot/chat",
-            json={
-                "session_id": st.session_state.session_id,
-                "message": query_text,
-                "metadata": {
-                    "university_name": "University of Derby",
-                    "country": "United Kingdom"
-                },
-                "action_key": action_key
-            },
-            timeout=10
-        )
-        resp.raise_for_status()
+        opening = not st.session_state.history and not st.session_state.spilled
+        append_history(ChatMessage("user", query_text))
+        st.session_state.turn_started = time.monotonic()
+        # Only the stream tagged with this turn may complete it
+        st.session_state.turn_id = uuid.uuid4().hex
+
+        prefetcher = get_prefetcher()
+        claimed = None
+        if prefetcher is not None:
+            claimed = prefetcher.claim(st.session_state.session_id, query_text, action_key, turn_id=st.session_state.turn_id)
+
+        cache = get_response_cache()
+        # Follow-ups depend on the conversation, which the key does not cover
+        cache_key = None
+        if cache is not None and cacheable(opening, action_key):
+            cache_key = make_key(query_text, action_key, CHAT_METADATA)
+        cached_events = cache.get(cache_key) if cache_key is not None and claimed is None else None
+        body = {
+            "session_id": st.session_state.session_id,
+            "message": query_text,
+            "metadata": CHAT_METADATA,
+            "action_key": action_key
+        }
+        if claimed is not None:
+            logger.info(f"Serving prefetched answer ({prefetcher.stats()})")
+        elif cached_events is not None:
+            logger.info(f"Response cache hit ({cache.stats()})")
+            get_stream_manager().replay(st.session_state.session_id, cached_events, turn_id=st.session_state.turn_id)
+        elif CHAT_REQUEST_MODE == "two_phase":
+            get_stream_manager().settle(st.session_state.session_id)
+            with metrics.span("genie_chat_post_seconds"):
+                resp = get_http_session().post(
+                    f"{CHATBOT_SERVICE_URL}/chat-bot/chat",
+                    json=body,
+                    timeout=CHAT_TIMEOUT
+                )
+            resp.raise_for_status()
+        else:
+            # The worker sends the message and opens the stream straight away,
+            # so the first events are already queued when the rerun starts
+            get_stream_manager().start(
+                st.session_state.session_id,
+                stream_url(st.session_state.session_id),
+                cache_key=cache_key,
+                turn_started=st.session_state.turn_started,
+                post_url=f"{CHATBOT_SERVICE_URL}/chat-bot/chat",
+                post_body=body,
+                stream_post_url=f"{CHATBOT_SERVICE_URL}{CHAT_STREAM_POST_PATH}" if CHAT_REQUEST_MODE == "single" else None,
+                turn_id=st.session_state.turn_id,
+                cancel_url=CANCEL_URL,
+                # Only opening questions can share an answer with other sessions
+                coalesce_key=make_key(query_text, action_key, CHAT_METADATA) if COALESCE_REQUESTS and opening else None,
+            )
+        st.session_state.pending_cache_key = cache_key
         st.session_state.pending_response = True
         st.session_state.suggestion_clicked = None
+        sync_session()
         st.rerun()
     except Exception as e:
+        metrics.inc("genie_errors_total", {"stage": "post"})
         logger.error(f"Error sending message: {e}")
         st.error(f"Failed to send message: {e}")
 
+def consume_stream(budget=None):
+    """Drain queued stream events into the UI, yielding once nothing was sent for budget seconds.
+
+    A widget interaction interrupts the run at its next element update, so the
+    script thread only needs handing back while the stream is quiet. Each new
+    run re-sends the message shown so far, which ending slices while text is
+    flowing would repeat for nothing.
+    """
+    session_id = st.session_state.session_id
+    manager = get_stream_manager()
+    handle = manager.get(session_id)
+    if handle is None:
+        handle = manager.start(
+            session_id,
+            stream_url(session_id),
+            cache_key=st.session_state.pending_cache_key,
+            turn_started=st.session_state.turn_started,
+            turn_id=st.session_state.turn_id,
+            cancel_url=CANCEL_URL,
+        )
+    elif handle.turn_id != st.session_state.turn_id:
+        # Another tab on the same session started a newer turn; this one's answer is gone
+        logger.info(f"Turn {st.session_state.turn_id} of {session_id} was superseded")
+        st.session_state.pending_response = False
+        st.rerun()
+    current_msg = handle.message
+
+    response_placeholder = st.empty()
+    renderer = None
+    if STREAM_RENDER_MODE == "incremental":
+        renderer = StreamRenderer(response_placeholder, tuning=handle.flush_tuning)
+    if renderer:
+        renderer.flush(current_msg)
+    else:
+        with response_placeholder.container():
+            render_message(current_msg)
+
+    deadline = None if budget is None else time.monotonic() + budget
+    while True:
+        timeout = STREAM_FLUSH_INTERVAL
+        if renderer and renderer.pending:
+            # Wake up when held-back text is due rather than on a fixed tick
+            timeout = renderer.next_flush_in()
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            timeout = min(timeout, remaining)
+
+        events = handle.drain(timeout)
+        flushes = renderer.flushes if renderer else 0
+        for chunk in events:
+            ctype = apply_event(current_msg, chunk)
+            logger.debug(f"Event: {ctype}")
+            # Update UI
+            if renderer:
+                # Status and end events show at once; content chunks follow the flush interval
+                renderer.update(current_msg, force=ctype != "content_chunk")
+        if renderer:
+            renderer.flush_due(current_msg)
+            # The next fragment run starts from this run's flush-rate estimate
+            handle.flush_tuning = renderer.tuning
+        elif events:
+            with response_placeholder.container():
+                render_message(current_msg)
+        if deadline is not None and (renderer.flushes != flushes if renderer else events):
+            deadline = time.monotonic() + budget
+
+        if not (current_msg["isStreamEnded"] or handle.exhausted):
+            continue
+        if not manager.discard(handle):
+            # Superseded or cancelled meanwhile: a stale answer never reaches history
+            st.session_state.pending_response = False
+            st.rerun()
+
+        if current_msg["isStreamEnded"]:
+            record = finalize_message(current_msg)
+            append_history(record)
+            if get_prefetcher() is not None and record.suggestions:
+                get_prefetcher().schedule(session_id, record.suggestions)
+            st.session_state.pending_response = False
+            sync_session()
+            st.rerun()
+
+        if handle.exhausted:
+            # Stream failed for good (reconnects exhausted or not resumable)
+            if handle.error:
+                logger.error(f"Stream error: {handle.error}")
+                if handle.failed_stage == "post":
+                    st.session_state.send_error = f"Failed to send message: {handle.error}"
+                elif handle.failed_stage == "admission":
+                    st.session_state.send_error = str(handle.error)
+            if current_msg["text"]:
+                # Keep the partial answer instead of making the user ask again
+                current_msg["isStreamEnded"] = True
+                append_history(finalize_message(current_msg))
+            st.session_state.pending_response = False
+            sync_session()
+            st.rerun()
+
+# Reruns only this fragment while streaming so the script thread is released between slices
+if hasattr(st, "fragment"):
+    @st.fragment(run_every=STREAM_POLL_INTERVAL)
+    def stream_fragment():
+        consume_stream(STREAM_UI_SLICE)
+else:
+    stream_fragment = consume_stream
+
 # Handle suggestion clicks
 if st.session_state.suggestion_clicked:
     send_message(st.session_state.suggestion_clicked["prompt"], st.session_state.suggestion_clicked["action"] or "")
@@ -272,13 +287,27 @@ if st.session_state.suggestion_clicked:
 # Display chat history
 if st.session_state.history:
     if st.sidebar.button("🗑️ Clear Chat"):
+        get_stream_manager().cancel(st.session_state.session_id, "cleared")
+        if get_prefetcher() is not None:
+            get_prefetcher().release(st.session_state.session_id)
+        get_history_store().delete(st.session_state.session_id)
+        if get_session_store() is not None:
+            get_session_store().delete(st.session_state.session_id)
         st.session_state.history = []
+        st.session_state.spilled = 0
         st.session_state.pending_response = False
-        st.session_state.session_id = str(uuid.uuid4()) # Start fresh
+        start_session(str(uuid.uuid4())) # Start fresh
         st.rerun()
 
-    for i, entry in enumerate(st.session_state.history):
-        render_message(entry)
+    render_history(
+        st.session_state.history,
+        spilled=st.session_state.spilled,
+        load_spilled=lambda: get_history_store().load(st.session_state.session_id, 0, st.session_state.spilled),
+    )
+
+if st.session_state.send_error:
+    st.error(st.session_state.send_error)
+    st.session_state.send_error = None
 
 # Input area - moved to bottom after chat history
 query = st.chat_input("Ask me anything about studying abroad...")
@@ -287,83 +316,4 @@ if query:
 
 # Handle streaming response
 if st.session_state.pending_response:
-    response_placeholder = st.empty()
-    
-    try:
-        sse_url = f"{CHATBOT_SERVICE_URL}/chat-bot/chat-stream/{st.session_state.session_id}"
-        logger.info(f"Streaming from: {sse_url}")
-        
-        with requests.get(sse_url, stream=True, timeout=30) as resp:
-            resp.raise_for_status()
-            
-            # Local state for the current streaming message
-            current_msg = {
-                "id": str(uuid.uuid4()),
-                "sender": "genie",
-                "text": "",
-                "thinkingText": "Genie is thinking...",
-                "sources": [],
-                "suggestions": [],
-                "intent": "",
-                "isStreamEnded": False
-            }
-            
-            for line in resp.iter_lines(decode_unicode=True):
-                if line and line.startswith("data: "):
-                    try:
-                        data_json = line[6:].strip()
-                        if not data_json: continue
-                        
-                        chunk = json.loads(data_json)
-                        ctype = chunk.get("type")
-                        logger.debug(f"Event: {ctype}")
-                        
-                        if ctype == "status_update":
-                            current_msg["thinkingText"] = chunk.get("data", {}).get("message") or chunk.get("message") or "Thinking..."
-                        
-                        elif ctype == "content_chunk":
-                            if chunk.get("full_response_for_db"):
-                                current_msg["text"] = chunk["full_response_for_db"]
-                            elif chunk.get("text_chunk"):
-                                current_msg["text"] += chunk["text_chunk"]
-                        
-                        elif ctype == "ai_response_completed":
-                            current_msg["sources"] = chunk.get("data", {}).get("sources", [])
-                            current_msg["intent"] = chunk.get("data", {}).get("intent", "")
-                        
-                        elif ctype == "final_summary":
-                            if chunk.get("full_response_for_db"):
-                                current_msg["text"] = chunk["full_response_for_db"]
-                            elif chunk.get("data", {}).get("text"):
-                                current_msg["text"] = chunk["data"]["text"]
-                            current_msg["suggestions"] = chunk.get("data", {}).get("suggestions", [])
-                            current_msg["isStreamEnded"] = True
-                        
-                        elif ctype in ["handoff_initiated", "information_gathering_required"]:
-                            current_msg["text"] = chunk.get("full_response_for_db") or chunk.get("data", {}).get("text") or "Assistance required."
-                            current_msg["isStreamEnded"] = True
-                        
-                        elif ctype == "stream_end":
-                            current_msg["isStreamEnded"] = True
-                        
-                        elif ctype == "error":
-                            current_msg["text"] = f"Error: {chunk.get('message', 'An unknown error occurred.')}"
-                            current_msg["isStreamEnded"] = True
-
-                        # Update UI
-                        with response_placeholder.container():
-                            render_message(current_msg)
-                            
-                        if current_msg["isStreamEnded"]:
-                            st.session_state.history.append(current_msg)
-                            st.session_state.pending_response = False
-                            st.rerun()
-                            break
-
-                    except json.JSONDecodeError:
-                        continue
-            
-    except Exception as e:
-        logger.error(f"Stream error: {e}", exc_info=True)
-        st.session_state.pending_response = False
-        st.rerun()
+    stream_fragment()
@@ -0,0 +1,124 @@
+"""Turn latency, backend load and shed turns under a burst, with and without admission control.
+
+A burst of sessions sends one turn each, through the real client path
+(StreamManager, SSE parser, apply_event), to a stand-in backend that
+generates `--capacity` streams at full speed and slows every stream down in
+proportion beyond that, its time to first event included. Without a limit
+the burst pushes the backend's first events past the client read timeout;
+with one, turns wait in the client's FIFO queue instead.
+
+Reported per UPSTREAM_MAX_IN_FLIGHT (0 is no limit):
+
+- ok / shed / failed: turns answered, turned away by admission control, failed otherwise
+- first_token / turn: client-side latency of the answered turns
+- wait: mean time turns waited for a slot, 0 for those admitted at once (genie_admission_wait_seconds)
+- peak_streams: most streams the backend generated at once
+
+Run with: python benchmarks/bench_admission.py --sessions 48 --capacity 8 --limits 0 8
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config  # noqa: E402
+import metrics  # noqa: E402
+from http_client import build_session  # noqa: E402
+from load_test import percentiles  # noqa: E402
+from messages import apply_event  # noqa: E402
+from standin_server import StandinServer  # noqa: E402
+from stream_worker import StreamManager  # noqa: E402
+
+
+def run_turn(manager, base_url, results):
+    session_id = str(uuid.uuid4())
+    started = time.monotonic()
+    handle = manager.start(
+        session_id, f"{base_url}/chat-bot/chat-stream/{session_id}", turn_started=started,
+        post_url=f"{base_url}/chat-bot/chat",
+        post_body={"session_id": session_id, "message": "bench", "metadata": config.CHAT_METADATA, "action_key": ""},
+    )
+    msg = handle.message
+    first_token = None
+    while not (msg["isStreamEnded"] or handle.exhausted):
+        for chunk in handle.drain(0.1):
+            if apply_event(msg, chunk) == "content_chunk" and first_token is None:
+                first_token = time.monotonic() - started
+    manager.discard(handle)
+    if msg["isStreamEnded"] and msg["text"] and not msg["text"].startswith("Error:"):
+        results.append(("ok", first_token, time.monotonic() - started))
+    else:
+        results.append(("shed" if handle.failed_stage == "admission" else "failed", None, None))
+
+
+def run_burst(server, limit, sessions, ramp):
+    manager = StreamManager(build_session(), max_in_flight=limit)
+    metrics.reset()
+    results = []
+    threads = []
+    for _ in range(sessions):
+        thread = threading.Thread(target=run_turn, args=(manager, server.url, results), daemon=True)
+        thread.start()
+        threads.append(thread)
+        if ramp:
+            time.sleep(ramp / sessions)
+    for thread in threads:
+        thread.join()
+    waits = [h for h in metrics.snapshot()["histograms"] if h["name"] == "genie_admission_wait_seconds"]
+    waited = sum(h["sum"] for h in waits)
+    queued = sum(h["count"] for h in waits)
+    answered = [r for r in results if r[0] == "ok"]
+    return {
+        "ok": len(answered),
+        "shed": sum(r[0] == "shed" for r in results),
+        "failed": sum(r[0] == "failed" for r in results),
+        "first_token_ms": percentiles([r[1] for r in answered if r[1] is not None]),
+        "turn_ms": percentiles([r[2] for r in answered]),
+        "mean_wait_ms": waited / queued * 1000 if queued else 0.0,
+        "peak_streams": server.counters["peak_streams"],
+        "reconnects": server.counters["resumes"],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sessions", type=int, default=48, help="turns in the burst")
+    ap.add_argument("--ramp", type=float, default=1.0, help="seconds over which the burst arrives")
+    ap.add_argument("--capacity", type=int, default=8, help="streams the stand-in generates at full speed")
+    ap.add_argument("--think", type=float, default=1.0, help="stand-in seconds before the first event, at full speed")
+    ap.add_argument("--tokens", type=int, default=60)
+    ap.add_argument("--rate", type=float, default=30.0, help="content_chunk events per second, at full speed")
+    ap.add_argument("--limits", type=int, nargs="+", default=[0, 8], help="UPSTREAM_MAX_IN_FLIGHT values")
+    ap.add_argument("--max-queue", type=int, default=config.UPSTREAM_MAX_QUEUE)
+    ap.add_argument("--max-wait", type=float, default=config.UPSTREAM_MAX_QUEUE_WAIT, help="seconds before shedding")
+    ap.add_argument("--read-timeout", type=float, default=3.0, help="client stream read timeout")
+    ap.add_argument("--json", help="write the results to this file")
+    args = ap.parse_args()
+
+    metrics.ENABLED = True
+    config.UPSTREAM_MAX_QUEUE, config.UPSTREAM_MAX_QUEUE_WAIT = args.max_queue, args.max_wait
+    config.STREAM_TIMEOUT = (config.HTTP_CONNECT_TIMEOUT, args.read_timeout)
+    config.STREAM_MAX_RECONNECTS = 2
+    report = {}
+    for limit in args.limits:
+        with StandinServer(tokens=args.tokens, token_rate=args.rate, capacity=args.capacity, think=args.think) as server:
+            r = report[str(limit)] = run_burst(server, limit, args.sessions, args.ramp)
+        print(
+            f"limit {limit or 'off':>3}  ok {r['ok']:3d}  shed {r['shed']:3d}  failed {r['failed']:3d}  "
+            f"first_token p50 {r['first_token_ms'].get('p50', 0):7.0f} p95 {r['first_token_ms'].get('p95', 0):7.0f} ms  "
+            f"turn p95 {r['turn_ms'].get('p95', 0):7.0f} ms  wait {r['mean_wait_ms']:6.0f} ms  "
+            f"peak streams {r['peak_streams']:3d}  reconnects {r['reconnects']}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
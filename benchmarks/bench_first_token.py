@@ -0,0 +1,76 @@
+"""Benchmark: time-to-first-token of the two-phase, eager and single-POST request modes.
+
+two_phase posts the message, pays a script rerun, then opens the stream.
+eager lets the stream worker post and connect while the rerun happens.
+single sends one streaming POST. The stand-in adds --latency seconds of
+round-trip per request; --rerun models the page re-execution in between.
+
+Run with: python benchmarks/bench_first_token.py [--latency 0.05] [--rerun 0.1] [--turns 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config  # noqa: E402
+from http_client import build_session  # noqa: E402
+from standin_server import StandinServer  # noqa: E402
+from stream_worker import StreamManager  # noqa: E402
+
+
+def first_token(handle):
+    while not handle.exhausted:
+        for chunk in handle.drain(0.01):
+            if chunk.get("type") == "content_chunk":
+                return time.perf_counter()
+    raise RuntimeError(f"stream ended without content: {handle.error}")
+
+
+def turn(mode, http, manager, base_url, rerun):
+    session_id = str(uuid.uuid4())
+    body = {"session_id": session_id, "message": "courses in UK", "metadata": config.CHAT_METADATA, "action_key": ""}
+    stream_url = f"{base_url}/chat-bot/chat-stream/{session_id}"
+    start = time.perf_counter()
+    if mode == "two_phase":
+        http.post(f"{base_url}/chat-bot/chat", json=body, timeout=config.CHAT_TIMEOUT).raise_for_status()
+        time.sleep(rerun)
+        handle = manager.start(session_id, stream_url)
+    else:
+        handle = manager.start(
+            session_id, stream_url, post_url=f"{base_url}/chat-bot/chat", post_body=body,
+            stream_post_url=f"{base_url}{config.CHAT_STREAM_POST_PATH}" if mode == "single" else None,
+        )
+        time.sleep(rerun)
+    ttft = first_token(handle) - start
+    manager.cancel(session_id)
+    return ttft
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--latency", type=float, default=0.05, help="simulated round-trip per request (s)")
+    ap.add_argument("--rerun", type=float, default=0.1, help="simulated Streamlit rerun between phases (s)")
+    ap.add_argument("--turns", type=int, default=20)
+    args = ap.parse_args()
+
+    with StandinServer(latency=args.latency) as server:
+        http = build_session()
+        manager = StreamManager(http, max_workers=4)
+        print(f"round-trip {args.latency * 1000:.0f} ms, rerun {args.rerun * 1000:.0f} ms, {args.turns} turns")
+        baseline = None
+        for mode in ("two_phase", "eager", "single"):
+            turn(mode, http, manager, server.url, args.rerun)  # warm the connection pool
+            samples = [turn(mode, http, manager, server.url, args.rerun) for _ in range(args.turns)]
+            median = statistics.median(samples)
+            baseline = baseline or median
+            print(f"{mode:<10} TTFT p50 {median * 1000:7.1f} ms  max {max(samples) * 1000:7.1f} ms"
+                  f"  saved {(baseline - median) * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
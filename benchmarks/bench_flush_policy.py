@@ -0,0 +1,158 @@
+"""Compare UI flush policies for streamed answers at several backend token rates.
+
+Each session streams a turn from the stand-in backend through the real client
+path (StreamManager, SSE parser, apply_event, StreamRenderer) and the same
+drain/flush loop as app.py, in fragment runs with a fresh renderer each
+(seeded with the previous run's rate estimate). Reported per policy and token rate:
+
+- cpu_ms: CPU time of the consuming (script) thread per turn
+- flushes: UI flushes per turn
+- lag p50/p95: time from a content_chunk being drained to the flush showing it
+- first_paint: turn start until the first content_chunk is on screen
+
+Policies: "per_event" flushes on every event (the original loop), "fixed" waits
+STREAM_FLUSH_INTERVAL between flushes, "adaptive" tunes the interval from the
+measured chunk rate and render cost.
+
+Run with: python benchmarks/bench_flush_policy.py --rates 10 50 200 --sessions 8
+or at the pace of recorded turns: --recordings recordings/*.sserec [--speed 2x]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config  # noqa: E402
+from http_client import build_session  # noqa: E402
+from load_test import NullPlaceholder, consume_runs, percentiles  # noqa: E402
+from rendering import StreamRenderer  # noqa: E402
+from sse_record import parse_speed  # noqa: E402
+from standin_server import StandinServer  # noqa: E402
+from stream_worker import StreamManager  # noqa: E402
+
+POLICIES = {
+    "per_event": {"adaptive": False, "flush_interval": 0.0, "flush_chunks": 1},
+    "fixed": {"adaptive": False},
+    "adaptive": {"adaptive": True},
+}
+
+
+class LagRenderer(StreamRenderer):
+    """StreamRenderer that records in lag how long each content chunk waited to be shown."""
+
+    def __init__(self, placeholder, lag, **kwargs):
+        super().__init__(placeholder, **kwargs)
+        self.lag = lag
+
+    def flush(self, entry):
+        super().flush(entry)
+        now = time.perf_counter()
+        lag = self.lag
+        if lag["waiting"] and lag["first_paint"] is None:
+            lag["first_paint"] = now
+        lag["lags"].extend(now - arrived for arrived in lag["waiting"])
+        lag["waiting"] = []
+
+
+def streamlit_placeholder():
+    """A real (bare mode) Streamlit placeholder, so flushes pay the delta-building cost."""
+    import streamlit as st
+    return st.empty()
+
+
+def run_turn(manager, base_url, session_id, policy, placeholder_factory):
+    """Stream one turn with the app's drain/flush loop; returns its measurements."""
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
+    handle = manager.start(
+        session_id, f"{base_url}/chat-bot/chat-stream/{session_id}",
+        post_url=f"{base_url}/chat-bot/chat",
+        post_body={"session_id": session_id, "message": "bench", "metadata": config.CHAT_METADATA, "action_key": ""},
+    )
+    lag = {"waiting": [], "lags": [], "first_paint": None}
+
+    def on_event(ctype):
+        if ctype == "content_chunk":
+            lag["waiting"].append(time.perf_counter())
+
+    def new_renderer(tuning):
+        nonlocal renderer
+        renderer = LagRenderer(placeholder_factory(), lag, tuning=tuning, **POLICIES[policy])
+        return renderer
+
+    renderer = None
+    flushes = consume_runs(handle, new_renderer, on_event)
+    manager.discard(handle)
+    return {
+        "cpu": time.thread_time() - cpu_started,
+        "flushes": flushes,
+        "lags": lag["lags"],
+        "first_paint": (lag["first_paint"] or time.perf_counter()) - started,
+        "interval": renderer.interval,
+    }
+
+
+def run_policy(base_url, policy, sessions, placeholder_factory):
+    manager = StreamManager(build_session(), max_workers=sessions)
+    results = []
+    lock = threading.Lock()
+
+    def session():
+        result = run_turn(manager, base_url, str(uuid.uuid4()), policy, placeholder_factory)
+        with lock:
+            results.append(result)
+
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    lags = [lag for r in results for lag in r["lags"]]
+    return {
+        "cpu_ms": sum(r["cpu"] for r in results) / len(results) * 1000,
+        "flushes": sum(r["flushes"] for r in results) / len(results),
+        "lag_ms": percentiles(lags),
+        "first_paint_ms": percentiles([r["first_paint"] for r in results]),
+        "final_interval_ms": sum(r["interval"] for r in results) / len(results) * 1000,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rates", type=float, nargs="+", default=[10, 50, 200], help="content_chunk events per second")
+    ap.add_argument("--tokens", type=int, default=300)
+    ap.add_argument("--sessions", type=int, default=8, help="concurrent turns per measurement")
+    ap.add_argument("--policies", nargs="+", default=list(POLICIES), choices=list(POLICIES))
+    ap.add_argument("--placeholder", choices=["streamlit", "null"], default="streamlit")
+    ap.add_argument("--recordings", nargs="+", help="replay these recorded turns (*.sserec) instead of --rates")
+    ap.add_argument("--speed", default="original", help="recording replay speed: original, max or Nx")
+    ap.add_argument("--json", help="write the results to this file")
+    args = ap.parse_args()
+
+    placeholder_factory = streamlit_placeholder if args.placeholder == "streamlit" else NullPlaceholder
+    report = {}
+    paces = [("recorded", {"recordings": args.recordings, "replay_speed": parse_speed(args.speed)})] if args.recordings \
+        else [(f"{rate:g} tok/s", {"token_rate": rate}) for rate in args.rates]
+    for pace, backend in paces:
+        with StandinServer(tokens=args.tokens, **backend) as server:
+            for policy in args.policies:
+                r = run_policy(server.url, policy, args.sessions, placeholder_factory)
+                report[f"{policy}@{pace.split()[0]}"] = r
+                print(
+                    f"{pace:>12s}  {policy:10s} cpu {r['cpu_ms']:7.1f} ms/turn  flushes {r['flushes']:6.1f}  "
+                    f"lag p50 {r['lag_ms']['p50']:5.1f} p95 {r['lag_ms']['p95']:5.1f} ms  "
+                    f"first paint p50 {r['first_paint_ms']['p50']:6.1f} ms  interval {r['final_interval_ms']:5.1f} ms"
+                )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
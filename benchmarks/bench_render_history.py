@@ -0,0 +1,97 @@
+"""Benchmark: card rendering cost for a long chat history across reruns.
+
+Compares the original per-render str.format of every card, the memoized
+per-source cards, and the pre-rendered parts stored on finished records.
+
+Run with: python benchmarks/bench_render_history.py [--turns 200] [--reruns 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rendering  # noqa: E402
+from messages import apply_event, new_genie_message  # noqa: E402
+from standin_server import turn_events  # noqa: E402
+
+
+def legacy_render_course_cards(sources, intent):
+    """render_course_cards as it was before memoization."""
+    if not sources:
+        return ""
+    html_output = '<div class="sources-section">'
+    course_template = rendering.COURSE_CARD_TEMPLATE
+    university_template = rendering.UNIVERSITY_CARD_TEMPLATE
+    for source in sources[:5]:
+        if intent == "UNIVERSITY_SEARCH":
+            address = source.get("address", {})
+            ref_id = source.get("refId", "")
+            html_output += university_template.format(
+                university_name=source.get("name", "Unknown University"),
+                location=address.get('country', 'N/A'),
+                university_url=source.get("url", f"https://edvoy.com/institutions/{ref_id}/"),
+            )
+        else:
+            institution = source.get("institution", {})
+            address = institution.get("address", {})
+            edp_ref_id = source.get("edpRefId", "")
+            course_level = (source.get("courseLevel") or "").lower()
+            slug = source.get("slug", "")
+            html_output += course_template.format(
+                course_name=source.get("name", "Course Title"),
+                university_name=institution.get("name", "Unknown University"),
+                location=address.get('country', 'N/A'),
+                course_url=source.get("url", f"https://edvoy.com/institutions/{edp_ref_id}/{course_level}/{slug}/"),
+            )
+    html_output += '</div>'
+    return html_output
+
+
+def build_history(turns):
+    history = []
+    for i in range(turns):
+        history.append({"sender": "user", "text": f"question {i}"})
+        msg = new_genie_message()
+        for chunk in turn_events(f"question {i}", tokens=40):
+            apply_event(msg, chunk)
+        history.append(msg)
+    return history
+
+
+def run(name, history, reruns, cards_html):
+    start = time.perf_counter()
+    total = 0
+    for _ in range(reruns):
+        for entry in history:
+            if isinstance(entry, dict) and entry["sender"] == "user":
+                continue
+            total += len(cards_html(entry))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed * 1000 / reruns:8.3f} ms/rerun  ({total // reruns:,} bytes of HTML)")
+    return elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=200)
+    ap.add_argument("--reruns", type=int, default=50)
+    args = ap.parse_args()
+
+    history = build_history(args.turns)
+    print(f"{args.turns} turns, {len(history)} history entries, {args.reruns} reruns")
+    base = run("legacy str.format", history, args.reruns,
+               lambda e: legacy_render_course_cards(e["sources"], e.get("intent", "")))
+    run("memoized cards", history, args.reruns,
+        lambda e: rendering.render_course_cards(e["sources"], e.get("intent", "")))
+    records = [rendering.finalize_message(entry) if entry["sender"] != "user" else entry for entry in history]
+    stored = run(
+        "stored frozen parts", records, args.reruns, lambda e: "".join(body for body, _ in rendering.frozen_parts(e)),
+    )
+    print(f"speedup vs legacy: {base / stored:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Measure what each Streamlit rerun of app.py sends to the browser.
+
+Runs the app headless (streamlit.testing AppTest) against the stand-in backend
+and counts the delta messages and their serialized bytes per rerun: the first
+page load, an idle rerun, a rerun with chat history and one streamed turn.
+The streamed turn is paced by --rate, so it goes through the same drain loop
+(app.consume_stream) and fragment runs as a live answer.
+Browser-side cost (style recalculation, scroll handlers) is not visible here.
+
+Run with: python benchmarks/bench_rerun_payload.py --turns 5
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from standin_server import StandinServer  # noqa: E402
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+class DeltaMeter:
+    """Wraps the forward message queue to tally delta messages and bytes."""
+
+    def __init__(self):
+        from streamlit.runtime.forward_msg_queue import ForwardMsgQueue
+        self.messages = 0
+        self.bytes = 0
+        original = ForwardMsgQueue.enqueue
+
+        def enqueue(queue, msg):
+            if msg.WhichOneof("type") == "delta":
+                self.messages += 1
+                self.bytes += msg.ByteSize()
+            return original(queue, msg)
+
+        ForwardMsgQueue.enqueue = enqueue
+
+    def take(self):
+        result = {"messages": self.messages, "bytes": self.bytes}
+        self.messages = self.bytes = 0
+        return result
+
+
+def settle(at, limit=50):
+    """Rerun until the pending answer has been appended to history."""
+    for _ in range(limit):
+        if not at.session_state.pending_response:
+            return
+        at.run()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--turns", type=int, default=5, help="chat turns in history for the history rerun")
+    ap.add_argument("--tokens", type=int, default=120)
+    ap.add_argument("--rate", type=float, default=100.0, help="stand-in content_chunk events per second (0: unthrottled)")
+    ap.add_argument("--json", help="write the results to this file")
+    args = ap.parse_args()
+
+    with StandinServer(tokens=args.tokens, token_rate=args.rate) as server:
+        os.environ["CHATBOT_SERVICE_URL"] = server.url
+        os.environ.setdefault("GENIE_HISTORY_STORE_PATH", tempfile.mkdtemp(prefix="genie-bench-history-"))
+        meter = DeltaMeter()
+        from streamlit.testing.v1 import AppTest
+        at = AppTest.from_file(APP, default_timeout=30)
+
+        report = {}
+        at.run()
+        report["first_load"] = meter.take()
+        at.run()
+        report["idle_rerun"] = meter.take()
+        for turn in range(args.turns):
+            at.chat_input[0].set_value(f"question {turn}").run()
+            settle(at)
+            report.setdefault("streamed_turn", meter.take())
+        meter.take()
+        at.run()
+        report["history_rerun"] = meter.take()
+
+    for name, r in report.items():
+        print(f"{name:14s} {r['messages']:5d} deltas  {r['bytes']:8d} bytes")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark: session-state memory per chat session.
+
+Builds the same history as the original plain dicts with full backend payloads
+and as compact ChatMessage records, and measures both with tracemalloc.
+
+Run with: python benchmarks/bench_session_memory.py [--turns 100] [--sources 20]
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from messages import ChatMessage  # noqa: E402
+from standin_server import turn_events  # noqa: E402
+
+
+def legacy_entry(events):
+    """History entry the way app.py used to store it: the raw payload lists."""
+    msg = {"sender": "genie", "text": "", "thinkingText": "", "sources": [], "suggestions": [],
+           "intent": "", "isStreamEnded": True}
+    for chunk in events:
+        if chunk["type"] == "content_chunk":
+            msg["text"] += chunk["text_chunk"]
+        elif chunk["type"] == "ai_response_completed":
+            msg["sources"] = chunk["data"]["sources"]
+            msg["intent"] = chunk["data"]["intent"]
+        elif chunk["type"] == "final_summary":
+            msg["suggestions"] = chunk["data"]["suggestions"]
+    return msg
+
+
+def measure(build):
+    tracemalloc.start()
+    history = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return history, size
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=100)
+    ap.add_argument("--sources", type=int, default=20)
+    ap.add_argument("--tokens", type=int, default=150)
+    args = ap.parse_args()
+
+    def legacy():
+        history = []
+        for i in range(args.turns):
+            events = turn_events(f"question {i}", args.tokens, args.sources)
+            history.append({"sender": "user", "text": f"question {i}"})
+            history.append(legacy_entry(events))
+        return history
+
+    def compact():
+        history = []
+        for i in range(args.turns):
+            events = turn_events(f"question {i}", args.tokens, args.sources)
+            history.append(ChatMessage("user", f"question {i}"))
+            history.append(ChatMessage.from_stream(legacy_entry(events)))
+            del events
+        return history
+
+    _, legacy_size = measure(legacy)
+    _, compact_size = measure(compact)
+    print(f"{args.turns} turns, {args.sources} sources per answer")
+    print(f"plain dicts      {legacy_size / 1024:10.1f} KiB  ({legacy_size / args.turns:,.0f} B/turn)")
+    print(f"ChatMessage      {compact_size / 1024:10.1f} KiB  ({compact_size / args.turns:,.0f} B/turn)")
+    print(f"reduction: {legacy_size / compact_size:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
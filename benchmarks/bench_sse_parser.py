@@ -0,0 +1,122 @@
+"""Microbenchmark: SSEParser vs. the original iter_lines + json.loads loop.
+
+Run with: python benchmarks/bench_sse_parser.py [--events 20000] [--chunk 1400]
+or on recorded traffic, with the recorded chunk boundaries:
+python benchmarks/bench_sse_parser.py --recordings recordings/*.sserec
+"""
+import argparse
+import codecs
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sse  # noqa: E402
+from sse_record import Recording  # noqa: E402
+
+
+def record_stream(n_events, seed=7):
+    """Build a stream shaped like a real Genie turn with n_events content chunks."""
+    rng = random.Random(seed)
+    words = "study abroad university course tuition visa scholarship campus intake deadline".split()
+    events = [{"type": "status_update", "data": {"message": "Searching courses..."}}]
+    for _ in range(n_events):
+        events.append({"type": "content_chunk", "text_chunk": " " + rng.choice(words)})
+    sources = [
+        {
+            "name": f"MSc Course {i}",
+            "slug": f"msc-course-{i}",
+            "edpRefId": f"ref-{i}",
+            "courseLevel": "Postgraduate",
+            "institution": {"name": "University of Derby", "address": {"country": "United Kingdom", "city": "Derby"}},
+        }
+        for i in range(20)
+    ]
+    events.append({"type": "ai_response_completed", "data": {"sources": sources, "intent": "COURSE_SEARCH"}})
+    events.append({"type": "final_summary", "data": {"suggestions": [{"text": "More", "prompt": "More", "action": ""}]}})
+    events.append({"type": "stream_end"})
+    return b"".join(f"data: {json.dumps(e)}\n\n".encode() for e in events)
+
+
+def split_chunks(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def iter_lines_baseline(chunks):
+    """The original loop: requests' iter_lines(decode_unicode=True) + data: slicing."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = None
+    out = 0
+    for chunk in chunks:
+        chunk = decoder.decode(chunk)
+        if pending is not None:
+            chunk = pending + chunk
+        lines = chunk.splitlines()
+        if lines and lines[-1] and chunk and lines[-1][-1] == chunk[-1]:
+            pending = lines.pop()
+        else:
+            pending = None
+        for line in lines:
+            if line and line.startswith("data: "):
+                data_json = line[6:].strip()
+                if not data_json:
+                    continue
+                try:
+                    json.loads(data_json)
+                    out += 1
+                except json.JSONDecodeError:
+                    continue
+    return out
+
+
+def sse_parser(chunks, loads):
+    parser = sse.SSEParser()
+    out = 0
+    for chunk in chunks:
+        for event in parser.feed(chunk):
+            loads(event.raw)
+            out += 1
+    return out
+
+
+def bench(name, fn, repeat):
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<24} {best * 1000:8.2f} ms  {count / best:12,.0f} events/s")
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=20000)
+    ap.add_argument("--chunk", type=int, default=1400)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--recordings", nargs="+", help="parse these recorded turns (*.sserec) instead")
+    args = ap.parse_args()
+
+    if args.recordings:
+        recordings = [Recording.load(path) for path in args.recordings]
+        chunks = [chunk for r in recordings for conn in r.connections for _, chunk in conn]
+        events = sum(len(r.events()) for r in recordings)
+        print(f"{events} recorded events, {sum(map(len, chunks)):,} bytes, {len(chunks)} chunks")
+    else:
+        body = record_stream(args.events)
+        chunks = split_chunks(body, args.chunk)
+        print(f"{args.events + 4} events, {len(body):,} bytes, {len(chunks)} chunks of {args.chunk} bytes")
+
+    base = bench("iter_lines + json", lambda: iter_lines_baseline(chunks), args.repeat)
+    bench("SSEParser + json", lambda: sse_parser(chunks, sse.stdlib_loads), args.repeat)
+    if sse.orjson is not None:
+        best = bench("SSEParser + orjson", lambda: sse_parser(chunks, sse.orjson.loads), args.repeat)
+        print(f"speedup vs baseline: {base / best:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
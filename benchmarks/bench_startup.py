@@ -0,0 +1,116 @@
+"""Cold-start and per-rerun cost of app.py.
+
+Each sample runs in a fresh Python process that imports streamlit, then runs
+app.py headless (streamlit.testing AppTest) against the stand-in backend:
+
+- import_streamlit: importing streamlit itself (paid by every worker)
+- first_run: the first script run of a new process, i.e. the app's own
+  imports and per-process setup on top of streamlit; the first served page
+- first_run_modules: modules newly imported by that first run
+- rerun: later idle reruns of the same session, which re-execute the whole
+  top level of app.py
+- first_body / rerun_body: the same two, counting only the execution of
+  app.py itself and not the test harness around it
+- first_message: sending the first chat message, where the HTTP client and
+  stream workers are needed
+
+Run with: python benchmarks/bench_startup.py --processes 5 --reruns 50
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import percentiles  # noqa: E402
+from standin_server import StandinServer  # noqa: E402
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+PROBE = r"""
+import json, sys, time
+started = time.perf_counter()
+import streamlit
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+before = set(sys.modules)
+# Runs app.py as the page script, timing its execution
+wrapper = (
+    "import builtins, time\n"
+    f"code = compile(open({sys.argv[1]!r}).read(), {sys.argv[1]!r}, 'exec')\n"
+    "started = time.perf_counter()\n"
+    "try:\n"
+    f"    exec(code, {{'__name__': '__main__', '__file__': {sys.argv[1]!r}}})\n"
+    "finally:\n"
+    "    builtins.genie_bodies = getattr(builtins, 'genie_bodies', []) + [time.perf_counter() - started]\n"
+)
+at = AppTest.from_string(wrapper, default_timeout=60)
+t = time.perf_counter()
+at.run()
+first_run = time.perf_counter() - t
+modules = sorted(set(sys.modules) - before)
+reruns = []
+for _ in range(int(sys.argv[2])):
+    t = time.perf_counter()
+    at.run()
+    reruns.append(time.perf_counter() - t)
+t = time.perf_counter()
+at.chat_input[0].set_value("hello").run()
+first_message = time.perf_counter() - t
+import builtins
+bodies = builtins.genie_bodies
+print(json.dumps({
+    "import_streamlit": imported - started, "first_run": first_run, "first_run_modules": modules,
+    "reruns": reruns, "first_body": bodies[0], "rerun_bodies": bodies[1:len(reruns) + 1],
+    "first_message": first_message, "exception": [str(e.value) for e in at.exception],
+}))
+"""
+
+
+def probe(reruns, env):
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE, APP, str(reruns)], env=env, cwd=os.path.dirname(APP), capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--processes", type=int, default=5, help="fresh processes to sample")
+    ap.add_argument("--reruns", type=int, default=50, help="idle reruns per process")
+    ap.add_argument("--modules", action="store_true", help="list the modules the first run imports")
+    ap.add_argument("--json", help="write the results to this file")
+    args = ap.parse_args()
+
+    with StandinServer() as server:
+        env = dict(os.environ, CHATBOT_SERVICE_URL=server.url)
+        env.setdefault("GENIE_HISTORY_STORE_PATH", tempfile.mkdtemp(prefix="genie-bench-history-"))
+        samples = [probe(args.reruns, env) for _ in range(args.processes)]
+
+    errors = [e for s in samples for e in s["exception"]]
+    report = {
+        "import_streamlit_ms": percentiles([s["import_streamlit"] for s in samples]),
+        "first_run_ms": percentiles([s["first_run"] for s in samples]),
+        "first_run_modules": len(samples[0]["first_run_modules"]),
+        "rerun_ms": percentiles([r for s in samples for r in s["reruns"]]),
+        "first_body_ms": percentiles([s["first_body"] for s in samples]),
+        "rerun_body_ms": percentiles([r for s in samples for r in s["rerun_bodies"]]),
+        "first_message_ms": percentiles([s["first_message"] for s in samples]),
+        "errors": errors,
+    }
+    for name in ("import_streamlit_ms", "first_run_ms", "rerun_ms", "first_body_ms", "rerun_body_ms", "first_message_ms"):
+        r = report[name]
+        print(f"{name:20s} p50 {r['p50']:8.1f} ms  p95 {r['p95']:8.1f} ms")
+    print(f"first run imports {report['first_run_modules']} modules" + (f"; errors: {errors}" if errors else ""))
+    if args.modules:
+        print(" ".join(samples[0]["first_run_modules"]))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Bytes on the wire per streamed turn, by transport compression and event profile.
+
+Streams turns from the stand-in backend through the real client path
+(StreamManager, SSE parser, apply_event) with each combination of
+STREAM_COMPRESSION ("off", "gzip") and STREAM_EVENT_PROFILE ("full",
+"compact"), and reports per turn:
+
+- wire_bytes: response body bytes the server sent (after compression)
+- cpu_ms: CPU time per turn of the whole process, stand-in server (compression) included
+- ok: turns whose final text and sources match the uncompressed full-profile turn
+
+Run with: python benchmarks/bench_stream_bytes.py --turns 20 --sources 8
+or against recorded turns: --recordings recordings/*.sserec
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config  # noqa: E402
+from http_client import build_session  # noqa: E402
+from messages import apply_event  # noqa: E402
+from rendering import finalize_message  # noqa: E402
+from sse_record import Recording  # noqa: E402
+from standin_server import StandinServer  # noqa: E402
+from stream_worker import StreamManager  # noqa: E402
+
+VARIANTS = [("off", "full"), ("gzip", "full"), ("off", "compact"), ("gzip", "compact")]
+
+
+def run_turn(manager, base_url):
+    session_id = str(uuid.uuid4())
+    handle = manager.start(
+        session_id, f"{base_url}/chat-bot/chat-stream/{session_id}",
+        post_url=f"{base_url}/chat-bot/chat",
+        post_body={"session_id": session_id, "message": "bench", "metadata": config.CHAT_METADATA, "action_key": ""},
+    )
+    msg = handle.message
+    while not (msg["isStreamEnded"] or handle.exhausted):
+        for chunk in handle.drain(0.1):
+            apply_event(msg, chunk)
+    manager.discard(handle)
+    return finalize_message(msg).to_dict()
+
+
+def run_variant(server, compression, profile, turns):
+    config.STREAM_COMPRESSION, config.STREAM_EVENT_PROFILE = compression, profile
+    manager = StreamManager(build_session(), max_workers=4)
+    cpu_started = time.process_time()
+    answers = [run_turn(manager, server.url) for _ in range(turns)]
+    return {
+        "wire_bytes": server.counters["bytes"] / turns,
+        "cpu_ms": (time.process_time() - cpu_started) / turns * 1000,
+    }, answers
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--turns", type=int, default=20)
+    ap.add_argument("--tokens", type=int, default=300)
+    ap.add_argument("--sources", type=int, default=8, help="sources in each ai_response_completed")
+    ap.add_argument("--recordings", nargs="+", help="stand-in replays these recorded turns (*.sserec)")
+    ap.add_argument("--json", help="write the results to this file")
+    args = ap.parse_args()
+
+    recordings = [Recording.load(path) for path in args.recordings or ()]
+    report = {}
+    reference = None
+    for compression, profile in VARIANTS:
+        # A fresh stand-in per variant, so the same turns are replayed in the same order
+        with StandinServer(tokens=args.tokens, sources=args.sources, recordings=recordings, replay_speed=0) as server:
+            r, answers = run_variant(server, compression, profile, args.turns)
+        answers = [{k: v for k, v in a.items() if k != "id"} for a in answers]
+        reference = answers if reference is None else reference
+        r["ok"] = sum(a == b for a, b in zip(answers, reference))
+        report[f"{compression}/{profile}"] = r
+        print(
+            f"compression {compression:4s} profile {profile:7s}  {r['wire_bytes']:9.0f} bytes/turn  "
+            f"cpu {r['cpu_ms']:6.2f} ms/turn  ok {r['ok']}/{args.turns}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
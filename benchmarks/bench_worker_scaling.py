@@ -0,0 +1,218 @@
+"""Chat throughput with 1..N app worker processes sharing one session store.
+
+Each worker is a separate process with its own StreamManager, history writer
+and session store client, like one Streamlit process behind a load balancer.
+Like a load balancer without sticky sessions, a session's next turn is sent to
+the next worker in turn once its previous turn is stored, so with two or more
+workers every follow-up turn runs on a different process than the last one. Every turn resumes the session from the
+shared stores (snapshot plus history), checks it saw the previous turn, streams
+an answer from the stand-in backend through the client path and stores the
+result. The stand-in backend and key-value server run in their own processes.
+
+Reported per worker count: turns/s, turn latency, the share of turns resumed
+on a different worker than the session's previous turn, and resume
+inconsistencies (should be 0). Throughput can only scale up to the number of
+CPU cores available, which is printed first.
+
+Run with: python benchmarks/bench_worker_scaling.py --workers 1 2 4 --store sqlite resp
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import NullPlaceholder, consume_runs, percentiles  # noqa: E402
+
+
+def serve(kind, kwargs, ready):
+    """Process target running a stand-in server until terminated."""
+    if kind == "backend":
+        from standin_server import StandinServer
+        server = StandinServer(**kwargs)
+        ready.send(server.url)
+        server.httpd.serve_forever()
+    else:
+        from standin_kv import StandinKV
+        kv = StandinKV(**kwargs)
+        ready.send(kv.url)
+        kv.server.serve_forever()
+
+
+def start_server(ctx, kind, **kwargs):
+    parent, child = ctx.Pipe()
+    proc = ctx.Process(target=serve, args=(kind, kwargs, child), daemon=True)
+    proc.start()
+    return proc, parent.recv()
+
+
+def run_turn(manager, sessions, history, base_url, session_id, turn):
+    """Resume session_id from the shared stores, stream one turn and store it back."""
+    import config
+    from messages import ChatMessage
+    from rendering import StreamRenderer, finalize_message
+    from session_store import restore, snapshot
+
+    started = time.perf_counter()
+    shared = restore(sessions.load(session_id) or {})
+    _, total = history.load_recent(session_id, 2 * config.HISTORY_WINDOW_TURNS)
+    consistent = total == 2 * turn and not shared["pending_response"]
+
+    message = f"question {turn} of {session_id[:8]}"
+    history.append(session_id, [ChatMessage("user", message)])
+    state = {"pending_response": True, "turn_id": uuid.uuid4().hex, "turn_started": time.monotonic()}
+    history.flush()
+    sessions.save(session_id, snapshot(state))
+
+    handle = manager.start(
+        session_id, f"{base_url}/chat-bot/chat-stream/{session_id}",
+        post_url=f"{base_url}/chat-bot/chat", turn_id=state["turn_id"],
+        post_body={"session_id": session_id, "message": message, "metadata": config.CHAT_METADATA, "action_key": ""},
+    )
+    msg = handle.message
+    consume_runs(handle, lambda tuning: StreamRenderer(NullPlaceholder(), tuning=tuning))
+    manager.discard(handle)
+
+    history.append(session_id, [finalize_message(msg)])
+    state["pending_response"] = False
+    history.flush()
+    sessions.save(session_id, snapshot(state))
+    return time.perf_counter() - started, consistent and msg["isStreamEnded"]
+
+
+def worker(worker_id, env, threads, jobs, results):
+    """One app process serving the turns routed to it with up to threads in flight."""
+    from history_store import build_history_store
+    from http_client import build_session
+    from session_store import build_session_store
+    from stream_worker import StreamManager
+
+    sessions = build_session_store()
+    history = build_history_store()
+    manager = StreamManager(build_session(), max_workers=threads)
+    results.put(None)
+
+    def loop():
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            session_id, turn = job
+            try:
+                latency, ok = run_turn(manager, sessions, history, env["CHATBOT_SERVICE_URL"], session_id, turn)
+            except Exception as e:
+                latency, ok = 0.0, False
+                print(f"worker {worker_id}: {e}", file=sys.stderr)
+            results.put((session_id, turn, worker_id, latency, ok))
+
+    pool = [threading.Thread(target=loop) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    history.flush()
+
+
+def run(ctx, workers, store, args, base_url, kv_url):
+    data_dir = tempfile.mkdtemp(prefix="genie-bench-scaling-")
+    env = {
+        "CHATBOT_SERVICE_URL": base_url,
+        "GENIE_SESSION_STORE": store,
+        "GENIE_SESSION_STORE_PATH": os.path.join(args.shm, f"genie-bench-{uuid.uuid4().hex[:8]}.sqlite3"),
+        "GENIE_HISTORY_STORE": "resp" if store == "resp" else "sqlite",
+        "GENIE_HISTORY_STORE_PATH": os.path.join(data_dir, "history.sqlite3"),
+        "GENIE_KV_URL": kv_url,
+    }
+    # Spawned workers inherit the environment, read by config when it is first imported
+    os.environ.update(env)
+    queues, results = [ctx.Queue() for _ in range(workers)], ctx.Queue()
+    threads = math.ceil(args.sessions / workers)
+    procs = [
+        ctx.Process(target=worker, args=(i, env, threads, queues[i], results)) for i in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    # Process start-up is not part of the measurement
+    for _ in procs:
+        results.get()
+    started = time.perf_counter()
+    for i in range(args.sessions):
+        queues[i % workers].put((str(uuid.uuid4()), 0))
+    done = []
+    while len(done) < args.sessions * args.turns:
+        session_id, turn, worker_id, latency, ok = result = results.get()
+        done.append(result)
+        if turn + 1 < args.turns:
+            queues[(worker_id + 1) % workers].put((session_id, turn + 1))
+    elapsed = time.perf_counter() - started
+    for q in queues:
+        for _ in range(threads):
+            q.put(None)
+    for p in procs:
+        p.join()
+    shutil.rmtree(data_dir, ignore_errors=True)
+    try:
+        os.remove(env["GENIE_SESSION_STORE_PATH"])
+    except FileNotFoundError:
+        pass
+
+    last_worker, moved, followups = {}, 0, 0
+    for session_id, turn, worker_id, _, _ in sorted(done, key=lambda r: (r[0], r[1])):
+        if turn:
+            followups += 1
+            moved += last_worker[session_id] != worker_id
+        last_worker[session_id] = worker_id
+    return {
+        "turns_per_s": len(done) / elapsed,
+        "latency_ms": percentiles([r[3] for r in done if r[4]]),
+        "moved": moved / followups if followups else 0.0,
+        "inconsistent": sum(not r[4] for r in done),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--store", nargs="+", default=["sqlite", "resp"], choices=["sqlite", "resp"])
+    ap.add_argument("--sessions", type=int, default=32, help="sessions in flight at once, across all workers")
+    ap.add_argument("--turns", type=int, default=4, help="turns per session")
+    ap.add_argument("--tokens", type=int, default=120)
+    ap.add_argument("--rate", type=float, default=100.0, help="backend content_chunk events per second")
+    ap.add_argument("--shm", default="/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+                    help="directory for the shared SQLite session store")
+    ap.add_argument("--json", help="write the results to this file")
+    args = ap.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    backend, base_url = start_server(ctx, "backend", tokens=args.tokens, token_rate=args.rate)
+    kv, kv_url = start_server(ctx, "kv")
+    print(f"{os.cpu_count()} CPU cores; {args.sessions} sessions x {args.turns} turns at {args.rate:g} tok/s")
+    report = {}
+    try:
+        for store in args.store:
+            for workers in args.workers:
+                r = report[f"{store}@{workers}"] = run(ctx, workers, store, args, base_url, kv_url)
+                print(
+                    f"{store:6s} {workers:2d} workers  {r['turns_per_s']:7.1f} turns/s  "
+                    f"latency p50 {r['latency_ms'].get('p50', 0):7.1f} p95 {r['latency_ms'].get('p95', 0):7.1f} ms  "
+                    f"resumed elsewhere {r['moved']:5.1%}  inconsistent {r['inconsistent']}"
+                )
+    finally:
+        backend.terminate()
+        kv.terminate()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
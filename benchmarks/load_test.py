@@ -0,0 +1,237 @@
+"""Load test: N concurrent simulated Genie sessions against the stand-in backend.
+
+Each session runs the real client path (pooled HTTP session, POST to
+/chat-bot/chat, StreamManager worker, SSE parser, apply_event and the
+incremental StreamRenderer, drained in fragment runs as app.py does) with a
+placeholder that only counts what would be sent to the browser.
+
+Run with: python benchmarks/load_test.py --sessions 200 --turns 3 --rate 50 --json results.json
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config  # noqa: E402
+from http_client import build_session  # noqa: E402
+from messages import apply_event  # noqa: E402
+from rendering import StreamRenderer  # noqa: E402
+from sse_record import parse_speed  # noqa: E402
+from standin_server import StandinServer  # noqa: E402
+from stream_worker import StreamManager  # noqa: E402
+
+
+class NullPlaceholder:
+    """Duck-typed Streamlit placeholder that only counts elements and bytes sent."""
+
+    def __init__(self, stats=None):
+        self.stats = {"elements": 0, "bytes": 0} if stats is None else stats
+
+    def container(self):
+        return NullPlaceholder(self.stats)
+
+    def empty(self):
+        return NullPlaceholder(self.stats)
+
+    def markdown(self, body, unsafe_allow_html=False):
+        self.stats["elements"] += 1
+        self.stats["bytes"] += len(body.encode("utf-8"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def rss_kb():
+    """Current resident set size in KiB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+    return {
+        "p50": pick(50) * 1000,
+        "p95": pick(95) * 1000,
+        "p99": pick(99) * 1000,
+        "mean": sum(ordered) / len(ordered) * 1000,
+        "max": ordered[-1] * 1000,
+    }
+
+
+def consume_runs(handle, new_renderer, on_event=None, ui_slice=None):
+    """Drain a turn the way app.consume_stream does over its fragment runs; returns the flushes.
+
+    Each run gets a fresh renderer from new_renderer(tuning), seeded with the
+    previous run's flush-rate estimate, and ends once nothing was flushed for
+    ui_slice seconds; runs start STREAM_POLL_INTERVAL apart.
+    """
+    ui_slice = config.STREAM_UI_SLICE if ui_slice is None else ui_slice
+    msg = handle.message
+    flushes = 0
+    while True:
+        renderer = new_renderer(handle.flush_tuning)
+        renderer.flush(msg)
+        deadline = time.monotonic() + ui_slice
+        while time.monotonic() < deadline:
+            timeout = renderer.next_flush_in() if renderer.pending else config.STREAM_FLUSH_INTERVAL
+            flushed = renderer.flushes
+            for chunk in handle.drain(min(timeout, deadline - time.monotonic())):
+                ctype = apply_event(msg, chunk)
+                if on_event is not None:
+                    on_event(ctype)
+                renderer.update(msg, force=ctype != "content_chunk")
+            renderer.flush_due(msg)
+            handle.flush_tuning = renderer.tuning
+            if msg["isStreamEnded"] or handle.exhausted:
+                return flushes + renderer.flushes
+            if renderer.flushes != flushed:
+                deadline = time.monotonic() + ui_slice
+        flushes += renderer.flushes
+        time.sleep(config.STREAM_POLL_INTERVAL)
+
+
+def run_turn(http, manager, base_url, session_id, message, ui_stats, renderer_factory=StreamRenderer):
+    """One POST + stream turn through the client code; returns its timings."""
+    start = time.perf_counter()
+    resp = http.post(
+        f"{base_url}/chat-bot/chat",
+        json={"session_id": session_id, "message": message, "metadata": config.CHAT_METADATA, "action_key": ""},
+        timeout=config.CHAT_TIMEOUT,
+    )
+    resp.raise_for_status()
+    handle = manager.start(session_id, f"{base_url}/chat-bot/chat-stream/{session_id}")
+    msg = handle.message
+    first_token = None
+    tokens = 0
+
+    def on_event(ctype):
+        nonlocal first_token, tokens
+        if ctype == "content_chunk":
+            tokens += 1
+            if first_token is None:
+                first_token = time.perf_counter()
+
+    flushes = consume_runs(handle, lambda tuning: renderer_factory(NullPlaceholder(ui_stats), tuning=tuning), on_event)
+    manager.discard(handle)
+    end = time.perf_counter()
+    return {
+        "ttft": (first_token or end) - start,
+        "latency": end - start,
+        "tokens": tokens,
+        "ok": bool(msg["isStreamEnded"]) and handle.error is None,
+        "flushes": flushes,
+    }
+
+
+def run_load(base_url, sessions, turns, ramp=0.0, renderer_factory=StreamRenderer):
+    """Drive sessions concurrent sessions of turns turns each and summarise the results."""
+    http = build_session()
+    manager = StreamManager(http, max_workers=sessions)
+    results = []
+    lock = threading.Lock()
+    ui_stats = {"elements": 0, "bytes": 0}
+
+    def session(index):
+        if ramp:
+            time.sleep(ramp * index / sessions)
+        session_id = str(uuid.uuid4())
+        for turn in range(turns):
+            try:
+                result = run_turn(http, manager, base_url, session_id, f"question {turn} from {index}", ui_stats,
+                                  renderer_factory)
+            except Exception as e:
+                result = {"ok": False, "error": str(e)}
+            with lock:
+                results.append(result)
+
+    rss_before = rss_kb()
+    cpu_before = time.process_time()
+    wall_start = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(i,), daemon=True) for i in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_before
+    rss_after = rss_kb()
+
+    ok = [r for r in results if r.get("ok")]
+    tokens = sum(r["tokens"] for r in ok)
+    return {
+        "sessions": sessions,
+        "turns_per_session": turns,
+        "turns_ok": len(ok),
+        "errors": len(results) - len(ok),
+        "wall_s": wall,
+        "ttft_ms": percentiles([r["ttft"] for r in ok]),
+        "turn_latency_ms": percentiles([r["latency"] for r in ok]),
+        "tokens_rendered_per_s": tokens / wall if wall else 0.0,
+        "ui_flushes": sum(r["flushes"] for r in ok),
+        "ui_bytes": ui_stats["bytes"],
+        "cpu_s": cpu,
+        "cpu_ms_per_session": cpu / sessions * 1000,
+        "rss_kb": rss_after,
+        "rss_kb_per_session": max(rss_after - rss_before, 0) / sessions,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sessions", type=int, default=50)
+    ap.add_argument("--turns", type=int, default=2)
+    ap.add_argument("--tokens", type=int, default=120, help="content_chunk events per answer")
+    ap.add_argument("--rate", type=float, default=50.0, help="content_chunk events per second, 0 for unpaced")
+    ap.add_argument("--ramp", type=float, default=0.0, help="seconds over which sessions start")
+    ap.add_argument("--recordings", nargs="+", help="stand-in replays these recorded turns (*.sserec)")
+    ap.add_argument("--speed", default="original", help="recording replay speed: original, max or Nx")
+    ap.add_argument("--url", default=None, help="use an already running backend instead of an in-process stand-in")
+    ap.add_argument("--json", default=None, help="write results to this file")
+    args = ap.parse_args()
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server = StandinServer(
+            tokens=args.tokens, token_rate=args.rate, recordings=args.recordings, replay_speed=parse_speed(args.speed),
+        ).start()
+        base_url = server.url
+    try:
+        results = run_load(base_url, args.sessions, args.turns, args.ramp)
+    finally:
+        if server is not None:
+            server.stop()
+    results["backend"] = {"url": args.url or "in-process stand-in", "tokens": args.tokens, "rate": args.rate}
+    if args.recordings:
+        results["backend"].update(recordings=args.recordings, speed=args.speed)
+
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
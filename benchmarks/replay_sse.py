@@ -0,0 +1,118 @@
+"""Replay recorded event streams through the client's parse and render path, offline.
+
+Feeds each recording's chunks, with their recorded timing scaled by --speed
+(original, Nx or max), through SSEParser, apply_event and the UI renderer:
+StreamRenderer with the app's drain/flush timing (--mode incremental) or
+render_message on every event (--mode full). Streamlit runs in bare mode, so
+the delta-building cost is paid without a browser.
+
+Reported per recording and in total: events, bytes, wall time and CPU time
+of the hot loop. --profile writes a cProfile of all replays for pstats or
+snakeviz.
+
+Record turns with GENIE_STREAM_RECORD_DIR=recordings streamlit run app.py, then
+run with: python benchmarks/replay_sse.py recordings/*.sserec --speed max
+"""
+import argparse
+import cProfile
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from messages import apply_event, new_genie_message  # noqa: E402
+from rendering import StreamRenderer, render_message  # noqa: E402
+from sse import SSEParser  # noqa: E402
+from sse_record import Recording, parse_speed  # noqa: E402
+
+
+def replay(recording, speed, mode, placeholder):
+    """Run one recorded turn through the client; returns its measurements."""
+    msg = new_genie_message()
+    renderer = StreamRenderer(placeholder) if mode == "incremental" else None
+    events = 0
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
+    for conn in recording.connections:
+        parser = SSEParser()
+        for delay, chunk in conn:
+            due = time.perf_counter() + (delay / speed if speed else 0)
+            # Held-back text is flushed while waiting for the next chunk, as app.py does
+            while renderer is not None and renderer.pending:
+                wait = renderer.next_flush_in()
+                if time.perf_counter() + wait >= due:
+                    break
+                time.sleep(wait)
+                renderer.flush_due(msg)
+            pause = due - time.perf_counter()
+            if pause > 0:
+                time.sleep(pause)
+            for event in parser.feed(chunk):
+                try:
+                    data = event.json()
+                except ValueError:
+                    continue
+                events += 1
+                ctype = apply_event(msg, data)
+                if renderer is not None:
+                    renderer.update(msg, force=ctype != "content_chunk")
+                else:
+                    with placeholder.container():
+                        render_message(msg)
+            if renderer is not None:
+                renderer.flush_due(msg)
+    if renderer is not None and renderer.pending:
+        renderer.flush(msg)
+    return {
+        "events": events,
+        "bytes": recording.bytes,
+        "recorded_s": recording.duration,
+        "wall_s": time.perf_counter() - started,
+        "cpu_ms": (time.thread_time() - cpu_started) * 1000,
+        "ended": msg["isStreamEnded"],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("recordings", nargs="+", help="*.sserec files")
+    ap.add_argument("--speed", default="max", help="original, max or Nx (e.g. 4x)")
+    ap.add_argument("--mode", choices=["incremental", "full"], default="incremental")
+    ap.add_argument("--repeat", type=int, default=1, help="replays of each recording")
+    ap.add_argument("--profile", help="write a cProfile of the replays to this file")
+    ap.add_argument("--json", help="write the results to this file")
+    args = ap.parse_args()
+
+    import streamlit as st
+    speed = parse_speed(args.speed)
+    recordings = [Recording.load(path) for path in args.recordings]
+    profiler = cProfile.Profile() if args.profile else None
+    results = []
+    for recording in recordings:
+        for _ in range(args.repeat):
+            if profiler is not None:
+                profiler.enable()
+            r = replay(recording, speed, args.mode, st.empty())
+            if profiler is not None:
+                profiler.disable()
+            r["path"] = recording.path
+            results.append(r)
+            print(
+                f"{os.path.basename(recording.path)}  {r['events']:5d} events  {r['bytes']:7d} bytes  "
+                f"recorded {r['recorded_s']:6.2f} s  wall {r['wall_s']:6.2f} s  cpu {r['cpu_ms']:7.1f} ms"
+                + ("" if r["ended"] else "  (no end-of-stream event)")
+            )
+    events = sum(r["events"] for r in results)
+    cpu = sum(r["cpu_ms"] for r in results)
+    print(f"total: {len(results)} turns, {events} events, cpu {cpu:.1f} ms ({cpu / max(events, 1) * 1000:.1f} us/event)")
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
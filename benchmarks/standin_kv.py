@@ -0,0 +1,150 @@
+"""Local stand-in for a Redis-compatible key-value server.
+
+Speaks enough RESP for the shared session and history stores (PING, GET, SET
+with EX, DEL, EXPIRE, RPUSH, LRANGE, LLEN, SELECT, AUTH), keeps everything in memory
+and expires keys lazily. Point the app at it with GENIE_KV_URL.
+
+Run standalone with: python benchmarks/standin_kv.py --port 6390
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+
+def _bulk(value):
+    if value is None:
+        return b"$-1\r\n"
+    data = value if isinstance(value, bytes) else str(value).encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+class KVHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            size = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def handle(self):
+        kv = self.server.standin
+        while True:
+            args = self.read_command()
+            if not args:
+                return
+            self.wfile.write(kv.execute(args[0].decode().upper(), args[1:]))
+            self.wfile.flush()
+
+
+class _QuietTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class StandinKV:
+    """Threaded in-memory RESP server; use as a context manager or call start()/stop()."""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.data = {}
+        self.expires = {}
+        self.commands = 0
+        self._lock = threading.Lock()
+        self.server = _QuietTCPServer((host, port), KVHandler)
+        self.server.standin = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def _live(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def execute(self, name, args):
+        with self._lock:
+            self.commands += 1
+            if name in ("PING", "SELECT", "AUTH"):
+                return b"+PONG\r\n" if name == "PING" else b"+OK\r\n"
+            if name == "GET":
+                value = self._live(args[0])
+                if isinstance(value, list):
+                    return b"-WRONGTYPE Operation against a key holding the wrong kind of value\r\n"
+                return _bulk(value)
+            if name == "SET":
+                self.data[args[0]] = args[1]
+                self.expires.pop(args[0], None)
+                if len(args) >= 4 and args[2].upper() == b"EX":
+                    self.expires[args[0]] = time.time() + int(args[3])
+                return b"+OK\r\n"
+            if name == "DEL":
+                removed = sum(self.data.pop(key, None) is not None for key in args)
+                for key in args:
+                    self.expires.pop(key, None)
+                return b":%d\r\n" % removed
+            if name == "EXPIRE":
+                if self._live(args[0]) is None:
+                    return b":0\r\n"
+                self.expires[args[0]] = time.time() + int(args[1])
+                return b":1\r\n"
+            if name == "RPUSH":
+                items = self._live(args[0])
+                if items is None:
+                    items = self.data[args[0]] = []
+                items.extend(args[1:])
+                return b":%d\r\n" % len(items)
+            if name == "LLEN":
+                return b":%d\r\n" % len(self._live(args[0]) or [])
+            if name == "LRANGE":
+                items = self._live(args[0]) or []
+                start, stop = int(args[1]), int(args[2])
+                start = max(start + len(items), 0) if start < 0 else start
+                stop = stop + len(items) if stop < 0 else stop
+                chosen = items[start:stop + 1]
+                return b"*%d\r\n" % len(chosen) + b"".join(_bulk(item) for item in chosen)
+            return b"-ERR unknown command '%s'\r\n" % name.encode()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=6390)
+    args = ap.parse_args()
+    kv = StandinKV(args.host, args.port)
+    print(f"Stand-in key-value server on {kv.url} (set GENIE_KV_URL to use it)")
+    try:
+        kv.server.serve_forever()
+    except KeyboardInterrupt:
+        kv.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+"""Local stand-in for the chatbot service's chat and chat-stream endpoints.
+
+Replays a realistic Genie turn (status_update, content_chunk, ai_response_completed,
+final_summary, stream_end) as SSE with event ids, honours Last-Event-ID, and can
+drop connections mid-stream to exercise reconnects. POST /chat-bot/chat-stream
+answers in a single streaming round-trip unless stream_post is off, and
+POST /chat-bot/cancel stops a session's generation unless cancel_endpoint is off.
+Streams are gzip-compressed when the client accepts it (unless compression is
+off) and follow the compact event profile when the client asks for it (unless
+compact is off): sources projected to the requested fields and final_summary
+carrying the answer's length and SHA-256 instead of the full text.
+Given recordings (*.sserec, see sse_record.py), turns replay the recorded
+events in rotation with their original timing, scaled by replay_speed.
+
+Run standalone with: python benchmarks/standin_server.py --port 4110
+"""
+import argparse
+import hashlib
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = "study abroad university course tuition visa scholarship campus intake deadline".split()
+
+
+def turn_events(message, tokens=120, sources=8):
+    """Build the event sequence the backend sends for one turn."""
+    events = [
+        {"type": "status_update", "data": {"message": "Understanding your question..."}},
+        {"type": "status_update", "data": {"message": "Searching courses..."}},
+    ]
+    text = []
+    for i in range(tokens):
+        word = WORDS[i % len(WORDS)]
+        chunk = (" " if i else "") + word + ("\n\n" if i % 40 == 39 else "")
+        text.append(chunk)
+        events.append({"type": "content_chunk", "text_chunk": chunk})
+    events.append({
+        "type": "ai_response_completed",
+        "data": {
+            "intent": "COURSE_SEARCH",
+            "sources": [
+                {
+                    "name": f"MSc {WORDS[i % len(WORDS)].title()} {i}",
+                    "slug": f"msc-{i}",
+                    "edpRefId": f"edp-{i}",
+                    "courseLevel": "Postgraduate",
+                    "institution": {
+                        "name": "University of Derby",
+                        "address": {"country": "United Kingdom", "city": "Derby", "line1": "Kedleston Road"},
+                    },
+                }
+                for i in range(sources)
+            ],
+        },
+    })
+    events.append({
+        "type": "final_summary",
+        "full_response_for_db": "".join(text),
+        "data": {"suggestions": [
+            {"text": "Show me courses in UK", "prompt": "Show me courses in UK", "action": ""},
+            {"text": "Scholarships", "prompt": f"Scholarships for {message[:30]}", "action": "SCHOLARSHIPS"},
+        ]},
+    })
+    events.append({"type": "stream_end"})
+    return events
+
+
+def _project(source, fields):
+    """Copy of source holding only the dotted field paths."""
+    out = {}
+    for path in fields:
+        keys = path.split(".")
+        value = source
+        for key in keys:
+            value = value.get(key) if isinstance(value, dict) else None
+        if value is None:
+            continue
+        target = out
+        for key in keys[:-1]:
+            target = target.setdefault(key, {})
+        target[keys[-1]] = value
+    return out
+
+
+def compact_event(event, fields, limit):
+    """The event as sent under the compact profile."""
+    if event["type"] == "ai_response_completed":
+        data = dict(event["data"])
+        data["sources"] = [_project(s, fields) if fields else s for s in data.get("sources", [])[:limit]]
+        return {**event, "data": data}
+    if event["type"] == "final_summary" and event.get("full_response_for_db"):
+        text = event["full_response_for_db"]
+        event = {k: v for k, v in event.items() if k != "full_response_for_db"}
+        event["text_length"] = len(text)
+        event["text_sha256"] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return event
+    return event
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    _gzip = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        standin = self.server.standin
+        standin.delay()
+        if self.path == "/chat-bot/chat-stream" and standin.stream_post:
+            # Single round-trip mode: accept the message and stream the answer
+            standin.post(body)
+            self._stream(body.get("session_id"))
+            return
+        if self.path == "/chat-bot/cancel" and standin.cancel_endpoint:
+            standin.cancel(body.get("session_id"))
+            self._send_json(200, {"status": "cancelled"})
+            return
+        if self.path != "/chat-bot/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+        standin.post(body)
+        self._send_json(200, {"status": "accepted", "session_id": body.get("session_id")})
+
+    def do_GET(self):
+        prefix = "/chat-bot/chat-stream/"
+        if not self.path.startswith(prefix):
+            self._send_json(404, {"error": "not found"})
+            return
+        self.server.standin.delay()
+        self._stream(self.path[len(prefix):])
+
+    def _stream(self, session_id):
+        standin = self.server.standin
+        events, delays = standin.events_for(session_id)
+        last_id = self.headers.get("Last-Event-ID")
+        start = int(last_id) + 1 if last_id and last_id.isdigit() else 0
+        if last_id:
+            standin.count("resumes")
+
+        compact = standin.compact and self.headers.get("X-Genie-Event-Profile") == "compact"
+        fields = [f for f in (self.headers.get("X-Genie-Source-Fields") or "").split(",") if f]
+        limit = int(self.headers.get("X-Genie-Source-Limit") or 0) or None
+        accepted = [e.split(";")[0].strip() for e in (self.headers.get("Accept-Encoding") or "").split(",")]
+        # gzip with a sync flush per frame, so every event reaches the client at once
+        self._gzip = zlib.compressobj(wbits=31) if standin.compression and "gzip" in accepted else None
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        if self._gzip is not None:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self._write_chunk(f"retry: {standin.retry_ms}\n: stand-in stream\n\n".encode())
+
+        interval = 1.0 / standin.token_rate if standin.token_rate else 0
+        drop_at = standin.drop_point(session_id, start)
+        standin.generating(1)
+        try:
+            if standin.think and not start:
+                standin.work(standin.think)
+            for index in range(start, len(events)):
+                if drop_at is not None and index >= drop_at:
+                    # Abort without the terminating chunk, like a dying proxy would
+                    standin.count("drops")
+                    if standin.drop_mid_event:
+                        # Cut inside the next event: its id line is sent, its data only in part
+                        frame = f"id: {index}\ndata: {json.dumps(events[index])}\n\n".encode()
+                        self._write_chunk(frame[:len(frame) // 2])
+                    self.close_connection = True
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+                if standin.is_cancelled(session_id):
+                    standin.count("generations_cancelled")
+                    self._write_chunk(b"")
+                    return
+                event = events[index]
+                if delays is not None:
+                    if standin.replay_speed:
+                        time.sleep(delays[index] / standin.replay_speed)
+                elif interval and event["type"] == "content_chunk":
+                    standin.work(interval)
+                if compact:
+                    event = compact_event(event, fields, limit)
+                frame = f"data: {json.dumps(event)}\n\n"
+                if standin.with_ids:
+                    frame = f"id: {index}\n" + frame
+                self._write_chunk(frame.encode())
+            self._write_chunk(b"")
+            standin.finish(session_id)
+        finally:
+            standin.generating(-1)
+
+    def _write_chunk(self, data):
+        if self._gzip is not None:
+            if data:
+                data = self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+            else:
+                # End of the gzip member, then the terminating empty chunk
+                tail, self._gzip = self._gzip.flush(zlib.Z_FINISH), None
+                self._write_chunk(tail)
+        self.server.standin.count("bytes", len(data))
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clients closing streams early (cancel, end-of-stream) are expected here
+        pass
+
+
+class StandinServer:
+    """Threaded stand-in backend; use as a context manager or call start()/stop()."""
+
+    def __init__(self, host="127.0.0.1", port=0, tokens=120, token_rate=0.0, sources=8,
+                 drop_after=None, drops=1, with_ids=True, retry_ms=50, latency=0.0, stream_post=True,
+                 cancel_endpoint=True, compression=True, compact=True, recordings=None, replay_speed=1.0,
+                 capacity=0, think=0.0, drop_mid_event=False):
+        self.tokens = tokens
+        # Streams generated at full speed at once (0: unlimited); beyond that all of them slow
+        # down in proportion, and think (seconds before the first event) stretches the same way
+        self.capacity = capacity
+        self.think = think
+        self.active = 0
+        self.latency = latency
+        self.stream_post = stream_post
+        self.cancel_endpoint = cancel_endpoint
+        self.compression = compression
+        self.compact = compact
+        self.token_rate = token_rate
+        self.sources = sources
+        self.drop_after = drop_after
+        self.drops = drops
+        self.drop_mid_event = drop_mid_event
+        self.with_ids = with_ids
+        self.retry_ms = retry_ms
+        self.replay_speed = replay_speed
+        self.recordings = [self._load_recording(r) for r in recordings or ()]
+        self._next_recording = 0
+        self.counters = {
+            "posts": 0, "streams": 0, "drops": 0, "resumes": 0, "cancels": 0, "bytes": 0, "peak_streams": 0,
+        }
+        self._turns = {}
+        self._cancelled = set()
+        self._drops_left = {}
+        self._lock = threading.Lock()
+        self.httpd = _QuietHTTPServer((host, port), StandinHandler)
+        self.httpd.standin = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay(self):
+        """Simulated network round-trip before each response."""
+        if self.latency:
+            time.sleep(self.latency)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def generating(self, delta):
+        """Track the streams being generated and the most seen at once."""
+        with self._lock:
+            self.active += delta
+            self.counters["peak_streams"] = max(self.counters["peak_streams"], self.active)
+
+    def work(self, seconds):
+        """Sleep for seconds of generation at full speed, stretched by the load over capacity."""
+        if not self.capacity:
+            time.sleep(seconds)
+            return
+        while seconds > 0:
+            with self._lock:
+                slowdown = max(1.0, self.active / self.capacity)
+            step = min(0.05, seconds * slowdown)
+            time.sleep(step)
+            seconds -= step / slowdown
+
+    @staticmethod
+    def _load_recording(recording):
+        # Imported here: sse_record reads config, which benchmarks configure after importing this module
+        from sse_record import Recording
+        if not isinstance(recording, Recording):
+            recording = Recording.load(recording)
+        timed = recording.events()
+        return [event for _, event in timed], [delay for delay, _ in timed]
+
+    def _new_turn(self, message):
+        """Events and per-event delays (None when paced by token_rate) of a new turn."""
+        if not self.recordings:
+            return turn_events(message, self.tokens, self.sources), None
+        recorded = self.recordings[self._next_recording % len(self.recordings)]
+        self._next_recording += 1
+        return recorded
+
+    def post(self, body):
+        with self._lock:
+            self.counters["posts"] += 1
+            self._cancelled.discard(body.get("session_id"))
+            self._turns[body.get("session_id")] = self._new_turn(body.get("message", ""))
+
+    def cancel(self, session_id):
+        with self._lock:
+            self.counters["cancels"] += 1
+            self._cancelled.add(session_id)
+
+    def is_cancelled(self, session_id):
+        with self._lock:
+            return session_id in self._cancelled
+
+    def events_for(self, session_id):
+        with self._lock:
+            self.counters["streams"] += 1
+            turn = self._turns.get(session_id)
+            if turn is None:
+                turn = self._turns[session_id] = self._new_turn("")
+            return turn
+
+    def drop_point(self, session_id, start):
+        """Index at which this connection should be cut, or None."""
+        if self.drop_after is None:
+            return None
+        with self._lock:
+            left = self._drops_left.setdefault(session_id, self.drops)
+            if left <= 0:
+                return None
+            self._drops_left[session_id] = left - 1
+        return start + self.drop_after
+
+    def finish(self, session_id):
+        with self._lock:
+            self._turns.pop(session_id, None)
+            self._drops_left.pop(session_id, None)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="standin-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=4110)
+    ap.add_argument("--tokens", type=int, default=120)
+    ap.add_argument("--rate", type=float, default=50.0, help="content_chunk events per second, 0 for unpaced")
+    ap.add_argument("--drop-after", type=int, default=None, help="cut each stream once after N events")
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds of simulated round-trip per request")
+    ap.add_argument("--recordings", nargs="+", help="replay these recorded turns (*.sserec) instead")
+    ap.add_argument("--speed", default="original", help="replay speed: original, max or Nx")
+    args = ap.parse_args()
+    from sse_record import parse_speed
+    server = StandinServer(args.host, args.port, tokens=args.tokens, token_rate=args.rate,
+                           drop_after=args.drop_after, latency=args.latency,
+                           recordings=args.recordings, replay_speed=parse_speed(args.speed))
+    print(f"Stand-in chatbot service on {server.url} (set CHATBOT_SERVICE_URL to use it)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+CHATBOT_SERVICE_URL = os.environ.get("CHATBOT_SERVICE_URL", "https://api-qa.edvoy.com")
+# CHATBOT_SERVICE_URL = "http://localhost:4110"
+
+# Shared HTTP connection pool
+HTTP_POOL_CONNECTIONS = _env_int("GENIE_HTTP_POOL_CONNECTIONS", 4)
+HTTP_POOL_MAXSIZE = _env_int("GENIE_HTTP_POOL_MAXSIZE", 64)
+HTTP_POOL_BLOCK = _env_bool("GENIE_HTTP_POOL_BLOCK", False)
+HTTP_TCP_KEEPALIVE = _env_bool("GENIE_HTTP_TCP_KEEPALIVE", True)
+HTTP_TCP_KEEPIDLE = _env_int("GENIE_HTTP_TCP_KEEPIDLE", 60)
+HTTP_TCP_KEEPINTVL = _env_int("GENIE_HTTP_TCP_KEEPINTVL", 15)
+HTTP_TCP_KEEPCNT = _env_int("GENIE_HTTP_TCP_KEEPCNT", 4)
+HTTP_MAX_RETRIES = _env_int("GENIE_HTTP_MAX_RETRIES", 3)
+HTTP_BACKOFF_FACTOR = _env_float("GENIE_HTTP_BACKOFF_FACTOR", 0.3)
+
+# Timeouts as (connect, read) tuples
+HTTP_CONNECT_TIMEOUT = _env_float("GENIE_HTTP_CONNECT_TIMEOUT", 3.05)
+CHAT_TIMEOUT = (HTTP_CONNECT_TIMEOUT, _env_float("GENIE_CHAT_READ_TIMEOUT", 10))
+STREAM_TIMEOUT = (HTTP_CONNECT_TIMEOUT, _env_float("GENIE_STREAM_READ_TIMEOUT", 30))
+
+# Streaming UI updates: "incremental" sends only new text, "full" re-renders the message per event
+STREAM_RENDER_MODE = os.environ.get("GENIE_STREAM_RENDER_MODE", "incremental")
+STREAM_FLUSH_INTERVAL = _env_float("GENIE_STREAM_FLUSH_INTERVAL", 0.05)
+STREAM_FLUSH_CHUNKS = _env_int("GENIE_STREAM_FLUSH_CHUNKS", 20)
+# "adaptive" picks the flush interval from the measured chunk rate and render cost within
+# [MIN, MAX]; "fixed" always waits STREAM_FLUSH_INTERVAL between flushes
+STREAM_FLUSH_MODE = os.environ.get("GENIE_STREAM_FLUSH_MODE", "adaptive")
+STREAM_FLUSH_MIN_INTERVAL = _env_float("GENIE_STREAM_FLUSH_MIN_INTERVAL", 0.03)
+STREAM_FLUSH_MAX_INTERVAL = _env_float("GENIE_STREAM_FLUSH_MAX_INTERVAL", 0.25)
+# Frames per second aimed for once chunks arrive faster than that
+STREAM_FLUSH_FPS = _env_float("GENIE_STREAM_FLUSH_FPS", 15)
+# Largest share of wall time the script thread may spend rendering a stream
+STREAM_FLUSH_RENDER_SHARE = _env_float("GENIE_STREAM_FLUSH_RENDER_SHARE", 0.2)
+
+# Background stream consumers
+STREAM_WORKERS = _env_int("GENIE_STREAM_WORKERS", 64)
+STREAM_QUEUE_SIZE = _env_int("GENIE_STREAM_QUEUE_SIZE", 256)
+STREAM_ABANDON_TIMEOUT = _env_float("GENIE_STREAM_ABANDON_TIMEOUT", 60)
+# Seconds a script/fragment run keeps draining events without sending anything before it
+# yields the thread; while text is flowing it runs on, as each run re-sends the message
+STREAM_UI_SLICE = _env_float("GENIE_STREAM_UI_SLICE", 0.5)
+STREAM_POLL_INTERVAL = _env_float("GENIE_STREAM_POLL_INTERVAL", 0.1)
+
+# Admission control toward the backend, per process: at most UPSTREAM_MAX_IN_FLIGHT turns
+# talk to it at once (0 disables the limit). Later turns wait in one FIFO queue across
+# sessions, shown their place in line, and are turned away with a "busy" message when
+# UPSTREAM_MAX_QUEUE are already waiting or after UPSTREAM_MAX_QUEUE_WAIT seconds in line.
+# Queued turns wait on a stream worker, so the pool grows by UPSTREAM_MAX_QUEUE threads.
+# In the two_phase request mode the POST is sent by the script, so only the stream is limited.
+UPSTREAM_MAX_IN_FLIGHT = _env_int("GENIE_UPSTREAM_MAX_IN_FLIGHT", 32)
+UPSTREAM_MAX_QUEUE = _env_int("GENIE_UPSTREAM_MAX_QUEUE", 64)
+UPSTREAM_MAX_QUEUE_WAIT = _env_float("GENIE_UPSTREAM_MAX_QUEUE_WAIT", 30)
+
+# SSE parsing: "auto" uses orjson when installed, "json" forces the stdlib decoder
+SSE_JSON_BACKEND = os.environ.get("GENIE_SSE_JSON_BACKEND", "auto")
+
+# Event-stream transport: "auto" accepts gzip/deflate plus br and zstd when their decoders are
+# installed, "gzip" only gzip, "off" asks for an uncompressed stream
+STREAM_COMPRESSION = os.environ.get("GENIE_STREAM_COMPRESSION", "auto")
+# "compact" asks the backend to project sources to the fields the cards use and to send the
+# answer's length and SHA-256 in final_summary instead of the full text again; "full" does not.
+# Backends that ignore the request keep sending full events, which are handled as before.
+STREAM_EVENT_PROFILE = os.environ.get("GENIE_STREAM_EVENT_PROFILE", "compact")
+
+# Opt-in recording of each turn's raw event stream with timings into STREAM_RECORD_DIR
+# ("" disables), for a STREAM_RECORD_SAMPLE fraction of turns; see sse_record.py
+STREAM_RECORD_DIR = os.environ.get("GENIE_STREAM_RECORD_DIR", "")
+STREAM_RECORD_SAMPLE = _env_float("GENIE_STREAM_RECORD_SAMPLE", 1.0)
+
+# Resuming dropped streams with Last-Event-ID
+STREAM_MAX_RECONNECTS = _env_int("GENIE_STREAM_MAX_RECONNECTS", 5)
+STREAM_RECONNECT_BACKOFF = _env_float("GENIE_STREAM_RECONNECT_BACKOFF", 0.5)
+STREAM_RECONNECT_MAX_DELAY = _env_float("GENIE_STREAM_RECONNECT_MAX_DELAY", 8)
+
+# Metadata sent with every chat message
+CHAT_METADATA = {
+    "university_name": "University of Derby",
+    "country": "United Kingdom"
+}
+
+# Opt-in response cache: "off", "memory" (per process) or "disk" (SQLite, shared by processes).
+# Only opening questions and chip actions are cached; follow-ups always reach the backend.
+# A cache hit never reaches the user's backend session either, so its follow-ups are answered
+# without that turn. Enable only when the backend keeps no per-session memory that later
+# answers rely on.
+RESPONSE_CACHE = os.environ.get("GENIE_RESPONSE_CACHE", "off")
+RESPONSE_CACHE_MAX_ENTRIES = _env_int("GENIE_RESPONSE_CACHE_MAX_ENTRIES", 512)
+RESPONSE_CACHE_TTL = _env_float("GENIE_RESPONSE_CACHE_TTL", 3600)
+RESPONSE_CACHE_PATH = os.environ.get("GENIE_RESPONSE_CACHE_PATH", "genie_response_cache.sqlite3")
+
+# Course/university cards: how many sources are shown, and the memoized card HTML
+CARD_LIMIT = _env_int("GENIE_CARD_LIMIT", 5)
+CARD_CACHE_SIZE = _env_int("GENIE_CARD_CACHE_SIZE", 2048)
+
+# Chat history: turns rendered in full, older ones go to a collapsed archive (0 renders everything).
+# Only the last HISTORY_MAX_TURNS stay in session state; the rest are read back from the store.
+HISTORY_WINDOW_TURNS = _env_int("GENIE_HISTORY_WINDOW_TURNS", 20)
+HISTORY_MAX_TURNS = _env_int("GENIE_HISTORY_MAX_TURNS", 100)
+
+# Persistent history store: "jsonl" (directory of per-session files), "sqlite" (single file)
+# or "resp" (lists on the shared key-value server at KV_URL, for multi-host deployments)
+HISTORY_STORE = os.environ.get("GENIE_HISTORY_STORE", "jsonl")
+HISTORY_STORE_PATH = os.environ.get(
+    "GENIE_HISTORY_STORE_PATH", "genie_history.sqlite3" if HISTORY_STORE == "sqlite" else ".genie_history"
+)
+# Sessions without a new message for HISTORY_TTL seconds are deleted (0 keeps them forever)
+HISTORY_TTL = _env_float("GENIE_HISTORY_TTL", 30 * 86400)
+HISTORY_WRITE_BATCH = _env_int("GENIE_HISTORY_WRITE_BATCH", 64)
+HISTORY_WRITE_INTERVAL = _env_float("GENIE_HISTORY_WRITE_INTERVAL", 0.2)
+
+# Latency spans and counters (off by default); exported on a port and/or dumped as JSON.
+# Each app process needs its own METRICS_PORT: a process whose port is taken logs a
+# warning and runs without the endpoint. Set METRICS_HOST to 0.0.0.0 to scrape from other hosts.
+METRICS_ENABLED = _env_bool("GENIE_METRICS", False)
+METRICS_HOST = os.environ.get("GENIE_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = _env_int("GENIE_METRICS_PORT", 0)
+METRICS_JSON_PATH = os.environ.get("GENIE_METRICS_JSON_PATH", "")
+METRICS_JSON_INTERVAL = _env_float("GENIE_METRICS_JSON_INTERVAL", 15)
+
+# How a turn reaches the backend: "eager" (POST then stream right away from the worker),
+# "single" (one streaming POST to CHAT_STREAM_POST_PATH, falling back to eager) or
+# "two_phase" (POST, rerun, then open the stream)
+CHAT_REQUEST_MODE = os.environ.get("GENIE_CHAT_REQUEST_MODE", "eager")
+CHAT_STREAM_POST_PATH = os.environ.get("GENIE_CHAT_STREAM_POST_PATH", "/chat-bot/chat-stream")
+
+# Best-effort signal asking the backend to stop generating a cancelled turn ("" disables it).
+# Backends answering 404/405/501 are remembered as not supporting it.
+CHAT_CANCEL_PATH = os.environ.get("GENIE_CHAT_CANCEL_PATH", "/chat-bot/cancel")
+CHAT_CANCEL_TIMEOUT = (HTTP_CONNECT_TIMEOUT, _env_float("GENIE_CHAT_CANCEL_READ_TIMEOUT", 2))
+
+# Opt-in single-flight: identical opening questions (same normalized message, action_key
+# and metadata, no prior history) in flight at once share one upstream stream.
+# Needs the eager or single request mode, where the worker sends the message.
+# Only the leader's backend session receives the question: followers' backend sessions
+# never see that turn, so their follow-up questions are answered without it. Enable only
+# when the backend keeps no per-session memory that later answers rely on.
+COALESCE_REQUESTS = _env_bool("GENIE_COALESCE_REQUESTS", False)
+
+# Opt-in speculative prefetch of the top-k suggestion chips once a turn ends; answers are
+# kept PREFETCH_TTL seconds. At most PREFETCH_CONCURRENCY run at once and PREFETCH_BUDGET
+# start per minute, process-wide. Only chips with an action_key are prefetched: the answer
+# comes from a scratch backend session without the conversation, and the user's own backend
+# session never records a claimed chip, so prompt-only chips always go to the backend.
+PREFETCH_SUGGESTIONS = _env_bool("GENIE_PREFETCH_SUGGESTIONS", False)
+PREFETCH_TOP_K = _env_int("GENIE_PREFETCH_TOP_K", 2)
+PREFETCH_CONCURRENCY = _env_int("GENIE_PREFETCH_CONCURRENCY", 4)
+PREFETCH_BUDGET = _env_int("GENIE_PREFETCH_BUDGET", 30)
+PREFETCH_CACHE_SIZE = _env_int("GENIE_PREFETCH_CACHE_SIZE", 256)
+PREFETCH_TTL = _env_float("GENIE_PREFETCH_TTL", 300)
+
+# Shared session store for running several app processes behind a load balancer: "off",
+# "sqlite" (a file shared by the processes on one host, in /dev/shm when available) or
+# "resp" (a Redis-compatible server at KV_URL shared by every host). A reloaded page
+# resumes its session, including an answer still streaming, on whichever process serves it.
+SESSION_STORE = os.environ.get("GENIE_SESSION_STORE", "off")
+SESSION_STORE_PATH = os.environ.get(
+    "GENIE_SESSION_STORE_PATH",
+    "/dev/shm/genie_sessions.sqlite3" if os.path.isdir("/dev/shm") else "genie_sessions.sqlite3",
+)
+SESSION_TTL = _env_float("GENIE_SESSION_TTL", 86400)
+KV_URL = os.environ.get("GENIE_KV_URL", "redis://127.0.0.1:6379/0")
+KV_TIMEOUT = _env_float("GENIE_KV_TIMEOUT", 2)
@@ -0,0 +1,309 @@
+"""Persistent chat history keyed by session_id.
+
+Every finished message is appended to a local store so a browser refresh or a
+process restart can restore the conversation. Writes go through a background
+batching writer; startup only reads the most recent window. Sessions without a
+new message for HISTORY_TTL seconds are deleted.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import config
+from kv_client import KVClient
+from messages import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+_SAFE_ID = re.compile(r"[^A-Za-z0-9_.-]")
+
+# Seconds between sweeps for expired sessions
+EXPIRE_INTERVAL = 3600
+
+
+def _encode(message):
+    return json.dumps(message.to_dict(), separators=(",", ":"))
+
+
+def _decode(line, session_id):
+    try:
+        return ChatMessage.from_dict(json.loads(line))
+    except (ValueError, KeyError):
+        logger.warning(f"Skipping corrupt history record for {session_id}")
+        return None
+
+
+class JsonlHistoryStore:
+    """Append-only JSONL file per session under a local directory."""
+
+    def __init__(self, directory=None):
+        self.directory = config.HISTORY_STORE_PATH if directory is None else directory
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, session_id):
+        return os.path.join(self.directory, _SAFE_ID.sub("_", session_id) + ".jsonl")
+
+    def append_batch(self, items):
+        """Append (session_id, message) pairs, one file write per session."""
+        lines = {}
+        for session_id, message in items:
+            lines.setdefault(session_id, []).append(_encode(message) + "\n")
+        with self._lock:
+            for session_id, chunk in lines.items():
+                with open(self._path(session_id), "a", encoding="utf-8") as f:
+                    f.write("".join(chunk))
+
+    def append(self, session_id, messages):
+        self.append_batch((session_id, m) for m in messages)
+
+    def load(self, session_id, start=0, stop=None):
+        """Stored messages of the session in [start, stop), oldest first."""
+        messages = []
+        try:
+            with open(self._path(session_id), encoding="utf-8") as f:
+                for index, line in enumerate(f):
+                    if stop is not None and index >= stop:
+                        break
+                    if index >= start:
+                        message = _decode(line, session_id)
+                        if message is not None:
+                            messages.append(message)
+        except FileNotFoundError:
+            pass
+        return messages
+
+    def load_recent(self, session_id, limit):
+        """The last limit messages (all if None) and the total stored, decoding only those."""
+        try:
+            with open(self._path(session_id), encoding="utf-8") as f:
+                total = 0
+                tail = deque(maxlen=limit)
+                for line in f:
+                    total += 1
+                    tail.append(line)
+        except FileNotFoundError:
+            return [], 0
+        messages = [m for m in (_decode(line, session_id) for line in tail) if m is not None]
+        return messages, total
+
+    def delete(self, session_id):
+        with self._lock:
+            try:
+                os.remove(self._path(session_id))
+            except FileNotFoundError:
+                pass
+
+    def expire(self, ttl):
+        """Delete sessions whose file was last written more than ttl seconds ago; returns how many."""
+        cutoff = time.time() - ttl
+        expired = 0
+        with self._lock:
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(".jsonl"):
+                    continue
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        expired += 1
+                except FileNotFoundError:
+                    pass
+        return expired
+
+
+class SqliteHistoryStore:
+    """Single SQLite file holding every session's messages."""
+
+    def __init__(self, path=None):
+        self.path = config.HISTORY_STORE_PATH if path is None else path
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, data TEXT NOT NULL, "
+                "created REAL NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in db.execute("PRAGMA table_info(messages)")]
+            if "created" not in columns:
+                # Stores from before expiry: their messages count as written now
+                db.execute("ALTER TABLE messages ADD COLUMN created REAL NOT NULL DEFAULT 0")
+                db.execute("UPDATE messages SET created = ?", (time.time(),))
+            db.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, seq)")
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=5)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def append_batch(self, items):
+        now = time.time()
+        rows = [(session_id, _encode(message), now) for session_id, message in items]
+        with self._connect() as db:
+            db.executemany("INSERT INTO messages (session_id, data, created) VALUES (?, ?, ?)", rows)
+
+    def append(self, session_id, messages):
+        self.append_batch((session_id, m) for m in messages)
+
+    def load(self, session_id, start=0, stop=None):
+        limit = -1 if stop is None else max(stop - start, 0)
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT data FROM messages WHERE session_id = ? ORDER BY seq LIMIT ? OFFSET ?",
+                (session_id, limit, start),
+            ).fetchall()
+        return [m for m in (_decode(row[0], session_id) for row in rows) if m is not None]
+
+    def load_recent(self, session_id, limit):
+        with self._connect() as db:
+            total = db.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+            rows = db.execute(
+                "SELECT data FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                (session_id, -1 if limit is None else limit),
+            ).fetchall()
+        return [m for m in (_decode(row[0], session_id) for row in reversed(rows)) if m is not None], total
+
+    def delete(self, session_id):
+        with self._connect() as db:
+            db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+    def expire(self, ttl):
+        """Delete sessions whose last message is older than ttl seconds; returns how many."""
+        with self._connect() as db:
+            stale = db.execute(
+                "SELECT session_id FROM messages GROUP BY session_id HAVING MAX(created) < ?", (time.time() - ttl,),
+            ).fetchall()
+            db.executemany("DELETE FROM messages WHERE session_id = ?", stale)
+        return len(stale)
+
+
+class RespHistoryStore:
+    """One list per session on a Redis-compatible server, shared by every host."""
+
+    def __init__(self, client=None, ttl=None):
+        self.client = KVClient() if client is None else client
+        self.ttl = config.HISTORY_TTL if ttl is None else ttl
+
+    def _key(self, session_id):
+        return f"genie:history:{session_id}"
+
+    def append_batch(self, items):
+        lines = {}
+        for session_id, message in items:
+            lines.setdefault(session_id, []).append(_encode(message))
+        commands = []
+        for sid, chunk in lines.items():
+            commands.append(("RPUSH", self._key(sid), *chunk))
+            if self.ttl:
+                # The server drops the list once the session has been quiet for ttl
+                commands.append(("EXPIRE", self._key(sid), int(self.ttl)))
+        if commands:
+            self.client.pipeline(commands)
+
+    def append(self, session_id, messages):
+        self.append_batch((session_id, m) for m in messages)
+
+    def load(self, session_id, start=0, stop=None):
+        if stop is not None and stop <= start:
+            return []
+        rows = self.client.execute("LRANGE", self._key(session_id), start, -1 if stop is None else stop - 1)
+        return [m for m in (_decode(row, session_id) for row in rows) if m is not None]
+
+    def load_recent(self, session_id, limit):
+        key = self._key(session_id)
+        if limit == 0:
+            return [], self.client.execute("LLEN", key)
+        total, rows = self.client.pipeline([("LLEN", key), ("LRANGE", key, 0 if limit is None else -limit, -1)])
+        return [m for m in (_decode(row, session_id) for row in rows) if m is not None], total
+
+    def delete(self, session_id):
+        self.client.delete(self._key(session_id))
+
+    def expire(self, ttl):
+        """Nothing to sweep: every list carries its own EXPIRE."""
+        return 0
+
+
+class BatchedHistoryWriter:
+    """Wraps a store so appends return immediately and are written in batches.
+
+    Reads and deletes flush pending writes first, so callers always see their
+    own appends.
+    """
+
+    def __init__(self, store, batch_size=None, flush_interval=None, ttl=None):
+        self.store = store
+        self.batch_size = config.HISTORY_WRITE_BATCH if batch_size is None else batch_size
+        self.flush_interval = config.HISTORY_WRITE_INTERVAL if flush_interval is None else flush_interval
+        self.ttl = config.HISTORY_TTL if ttl is None else ttl
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="genie-history-writer", daemon=True)
+        self._thread.start()
+        if self.ttl:
+            threading.Thread(target=self._expire_loop, name="genie-history-expiry", daemon=True).start()
+        atexit.register(self.flush)
+
+    def append(self, session_id, messages):
+        for message in messages:
+            self._queue.put((session_id, message))
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+            try:
+                self.store.append_batch(batch)
+            except Exception as e:
+                logger.error(f"History write of {len(batch)} messages failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _expire_loop(self):
+        while True:
+            try:
+                expired = self.store.expire(self.ttl)
+                if expired:
+                    logger.info(f"Deleted the history of {expired} sessions idle for over {self.ttl:g}s")
+            except Exception as e:
+                logger.warning(f"History expiry failed: {e}")
+            time.sleep(min(self.ttl, EXPIRE_INTERVAL))
+
+    def flush(self):
+        """Block until every queued append has been written."""
+        self._queue.join()
+
+    def load(self, session_id, start=0, stop=None):
+        self.flush()
+        return self.store.load(session_id, start, stop)
+
+    def load_recent(self, session_id, limit):
+        self.flush()
+        return self.store.load_recent(session_id, limit)
+
+    def delete(self, session_id):
+        self.flush()
+        self.store.delete(session_id)
+
+
+def build_history_store(backend=None):
+    """Create the configured store behind a batching writer."""
+    backend = config.HISTORY_STORE if backend is None else backend
+    if backend == "sqlite":
+        store = SqliteHistoryStore()
+    elif backend == "jsonl":
+        store = JsonlHistoryStore()
+    elif backend == "resp":
+        store = RespHistoryStore()
+    else:
+        raise ValueError(f"Unknown history store backend: {backend}")
+    return BatchedHistoryWriter(store)
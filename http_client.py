@@ -0,0 +1,85 @@
+"""Connection-pooled HTTP session shared by every chat session in the process."""
+import logging
+import socket
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
+
+import config
+from messages import SOURCE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = (502, 503, 504)
+
+
+def _keepalive_socket_options():
+    """Socket options that turn on TCP keep-alive for pooled connections."""
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    # The fine-grained knobs are not available on every platform
+    for name, value in (
+        ("TCP_KEEPIDLE", config.HTTP_TCP_KEEPIDLE),
+        ("TCP_KEEPINTVL", config.HTTP_TCP_KEEPINTVL),
+        ("TCP_KEEPCNT", config.HTTP_TCP_KEEPCNT),
+    ):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return options
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled sockets use TCP keep-alive."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        if config.HTTP_TCP_KEEPALIVE:
+            kwargs["socket_options"] = _keepalive_socket_options()
+        super().init_poolmanager(*args, **kwargs)
+
+
+def build_session():
+    """Create a requests.Session with a bounded keep-alive pool and retry/backoff."""
+    # Connect errors are retried for every method since the request never left.
+    # Read/status retries are limited to GET so a chat POST is never sent twice.
+    retry = Retry(
+        total=config.HTTP_MAX_RETRIES,
+        connect=config.HTTP_MAX_RETRIES,
+        read=config.HTTP_MAX_RETRIES,
+        status=config.HTTP_MAX_RETRIES,
+        backoff_factor=config.HTTP_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False,
+    )
+    adapter = KeepAliveAdapter(
+        pool_connections=config.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=config.HTTP_POOL_MAXSIZE,
+        pool_block=config.HTTP_POOL_BLOCK,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    logger.info(f"HTTP pool ready: maxsize={config.HTTP_POOL_MAXSIZE}, retries={config.HTTP_MAX_RETRIES}")
+    return session
+
+
+def stream_headers(profile=None):
+    """Request headers for an event stream: accepted encodings and the event profile."""
+    headers = {"Accept": "text/event-stream"}
+    if config.STREAM_COMPRESSION == "off":
+        headers["Accept-Encoding"] = "identity"
+    elif config.STREAM_COMPRESSION == "gzip":
+        headers["Accept-Encoding"] = "gzip"
+    else:
+        # Lists br/zstd only when urllib3 can decode them here
+        headers["Accept-Encoding"] = make_headers(accept_encoding=True)["accept-encoding"]
+    if (config.STREAM_EVENT_PROFILE if profile is None else profile) == "compact":
+        headers["X-Genie-Event-Profile"] = "compact"
+        headers["X-Genie-Source-Fields"] = ",".join(SOURCE_FIELDS)
+        headers["X-Genie-Source-Limit"] = str(config.CARD_LIMIT)
+    return headers
@@ -0,0 +1,138 @@
+"""Minimal client for Redis-compatible key-value servers (RESP protocol).
+
+Covers only the commands the shared session and history stores use, so the
+app needs no extra dependency. Each thread keeps its own connection, opened
+lazily and replaced when the server dropped it while idle. Commands are never
+resent once they may have reached the server, so a timed-out RPUSH is not
+applied twice.
+"""
+import logging
+import select
+import socket
+import threading
+from urllib.parse import urlparse
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class KVError(Exception):
+    """Error reply from the server."""
+
+
+def _encode(args):
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+class KVClient:
+    """Thread-safe RESP client for a redis:// URL."""
+
+    def __init__(self, url=None, timeout=None):
+        parsed = urlparse(config.KV_URL if url is None else url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self.timeout = config.KV_TIMEOUT if timeout is None else timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = self._local.conn = (sock, sock.makefile("rb"))
+        if self.password:
+            self._roundtrip(conn, [("AUTH", self.password)])
+        if self.db:
+            self._roundtrip(conn, [("SELECT", self.db)])
+        return conn
+
+    def _read(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            return KVError(rest.decode("utf-8"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            return reader.read(size + 2)[:-2].decode("utf-8")
+        if kind == b"*":
+            size = int(rest)
+            return None if size < 0 else [self._read(reader) for _ in range(size)]
+        raise ConnectionError(f"unexpected reply {line[:20]!r}")
+
+    def _replies(self, conn, commands):
+        replies = [self._read(conn[1]) for _ in commands]
+        for reply in replies:
+            if isinstance(reply, KVError):
+                raise reply
+        return replies
+
+    def _roundtrip(self, conn, commands):
+        conn[0].sendall(b"".join(_encode(c) for c in commands))
+        return self._replies(conn, commands)
+
+    @staticmethod
+    def _stale(conn):
+        """Whether an idle connection was closed by the server (it has nothing else to say)."""
+        try:
+            readable, _, _ = select.select([conn[0]], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def pipeline(self, commands):
+        """Send several commands in one round-trip and return their replies."""
+        payload = b"".join(_encode(c) for c in commands)
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._stale(conn):
+            logger.info(f"Reconnecting to {self.host}:{self.port}: idle connection closed by the server")
+            self.close()
+            conn = None
+        if conn is not None:
+            try:
+                conn[0].sendall(payload)
+            except OSError as e:
+                # Dropped since the check: the server never got the commands, so resend them once
+                logger.info(f"Reconnecting to {self.host}:{self.port} after: {e}")
+                self.close()
+                conn = None
+        if conn is None:
+            conn = self._connect()
+            conn[0].sendall(payload)
+        try:
+            return self._replies(conn, commands)
+        except OSError:
+            # The commands may have run: drop the connection but never resend them
+            self.close()
+            raise
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn[0].close()
+
+    def get(self, key):
+        return self.execute("GET", key)
+
+    def set(self, key, value, ex=None):
+        return self.execute("SET", key, value, "EX", int(ex)) if ex else self.execute("SET", key, value)
+
+    def delete(self, *keys):
+        return self.execute("DEL", *keys)
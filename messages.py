@@ -0,0 +1,148 @@
+import uuid
+
+import config
+
+# Events after which the backend sends nothing more for the turn
+END_EVENT_TYPES = frozenset({
+    "final_summary", "handoff_initiated", "information_gathering_required", "stream_end", "error",
+})
+
+
+def new_genie_message():
+    """Create the local state for a Genie message that is about to stream."""
+    return {
+        "id": str(uuid.uuid4()),
+        "sender": "genie",
+        "text": "",
+        "thinkingText": "Genie is thinking...",
+        "sources": [],
+        "suggestions": [],
+        "intent": "",
+        "isStreamEnded": False
+    }
+
+
+def apply_event(current_msg, chunk):
+    """Fold one parsed stream event into the message being streamed."""
+    ctype = chunk.get("type")
+
+    if ctype == "status_update":
+        current_msg["thinkingText"] = chunk.get("data", {}).get("message") or chunk.get("message") or "Thinking..."
+
+    elif ctype == "content_chunk":
+        if chunk.get("full_response_for_db"):
+            current_msg["text"] = chunk["full_response_for_db"]
+        elif chunk.get("text_chunk"):
+            current_msg["text"] += chunk["text_chunk"]
+
+    elif ctype == "ai_response_completed":
+        current_msg["intent"] = chunk.get("data", {}).get("intent", "")
+        current_msg["sources"] = trim_sources(chunk.get("data", {}).get("sources", []), current_msg["intent"])
+
+    elif ctype == "final_summary":
+        if chunk.get("full_response_for_db"):
+            current_msg["text"] = chunk["full_response_for_db"]
+        elif chunk.get("data", {}).get("text"):
+            current_msg["text"] = chunk["data"]["text"]
+        current_msg["suggestions"] = chunk.get("data", {}).get("suggestions", [])
+        current_msg["isStreamEnded"] = True
+
+    elif ctype in ["handoff_initiated", "information_gathering_required"]:
+        current_msg["text"] = chunk.get("full_response_for_db") or chunk.get("data", {}).get("text") or "Assistance required."
+        current_msg["isStreamEnded"] = True
+
+    elif ctype == "stream_end":
+        current_msg["isStreamEnded"] = True
+
+    elif ctype == "error":
+        current_msg["text"] = f"Error: {chunk.get('message', 'An unknown error occurred.')}"
+        current_msg["isStreamEnded"] = True
+
+    return ctype
+
+
+# Source fields rendered by the cards (see trim_sources), as dotted paths for the compact event profile
+SOURCE_FIELDS = (
+    "name", "url", "refId", "edpRefId", "slug", "courseLevel",
+    "address.country", "institution.name", "institution.address.country",
+)
+
+
+def trim_sources(sources, intent):
+    """Keep only the sources and fields the course/university cards render."""
+    trimmed = []
+    for source in (sources or [])[:config.CARD_LIMIT]:
+        compact = {k: source[k] for k in ("name", "url", "refId", "edpRefId", "slug", "courseLevel") if k in source}
+        if intent == "UNIVERSITY_SEARCH":
+            country = (source.get("address") or {}).get("country")
+            if country is not None:
+                compact["address"] = {"country": country}
+        else:
+            institution = source.get("institution") or {}
+            compact_institution = {}
+            if "name" in institution:
+                compact_institution["name"] = institution["name"]
+            country = (institution.get("address") or {}).get("country")
+            if country is not None:
+                compact_institution["address"] = {"country": country}
+            if compact_institution:
+                compact["institution"] = compact_institution
+        trimmed.append(compact)
+    return trimmed
+
+
+class ChatMessage:
+    """Compact record of a finished history entry, holding only what gets rendered."""
+
+    __slots__ = ("id", "sender", "text", "intent", "sources", "suggestions", "frozen_parts")
+
+    def __init__(self, sender, text, id=None, intent="", sources=(), suggestions=()):
+        self.id = id
+        self.sender = sender
+        self.text = text
+        self.intent = intent
+        self.sources = tuple(sources)
+        self.suggestions = tuple(suggestions)
+        self.frozen_parts = None
+
+    @classmethod
+    def from_stream(cls, msg):
+        """Build the record for a streamed message once it has ended."""
+        suggestions = [
+            {"text": s.get("text", s.get("prompt", "Option")), "prompt": s.get("prompt"), "action": s.get("action")}
+            for s in msg.get("suggestions", [])
+        ]
+        return cls(
+            msg.get("sender", "genie"),
+            msg.get("text", ""),
+            id=msg.get("id"),
+            intent=msg.get("intent", ""),
+            sources=trim_sources(msg.get("sources", []), msg.get("intent", "")),
+            suggestions=suggestions,
+        )
+
+    def to_dict(self):
+        data = {"sender": self.sender, "text": self.text}
+        if self.id:
+            data["id"] = self.id
+        if self.intent:
+            data["intent"] = self.intent
+        if self.sources:
+            data["sources"] = list(self.sources)
+        if self.suggestions:
+            data["suggestions"] = list(self.suggestions)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["sender"],
+            data.get("text", ""),
+            id=data.get("id"),
+            intent=data.get("intent", ""),
+            sources=data.get("sources", ()),
+            suggestions=data.get("suggestions", ()),
+        )
+
+    def __repr__(self):
+        return f"ChatMessage(sender={self.sender!r}, id={self.id!r}, text={self.text[:30]!r})"
@@ -0,0 +1,213 @@
+"""Process-wide latency spans and counters for the chat client.
+
+Disabled by default; every helper returns immediately unless GENIE_METRICS is
+on. Exported as Prometheus/OpenMetrics text on GENIE_METRICS_HOST:GENIE_METRICS_PORT
+(localhost by default) and/or as a periodic JSON dump to GENIE_METRICS_JSON_PATH.
+"""
+import json
+import logging
+import threading
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+ENABLED = config.METRICS_ENABLED
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    "genie_chat_post_seconds": "Duration of the POST to /chat-bot/chat",
+    "genie_stream_connect_seconds": "Time from opening /chat-bot/chat-stream until response headers",
+    "genie_time_to_first_status_seconds": "Turn start until the first status_update event",
+    "genie_time_to_first_token_seconds": "Turn start until the first content_chunk event",
+    "genie_time_to_final_summary_seconds": "Turn start until the final_summary event",
+    "genie_turn_seconds": "Turn start until the end-of-stream event",
+    "genie_render_seconds": "Time spent flushing a streaming message to the UI",
+    "genie_stream_events_total": "SSE events received, by type",
+    "genie_errors_total": "Client errors, by stage",
+    "genie_stream_reconnects_total": "Stream reconnects after a dropped connection",
+    "genie_stream_cancelled_total": "Streams cancelled before their end-of-stream event, by reason",
+    "genie_backend_cancel_total": "Cancel signals sent to the backend, by result",
+    "genie_coalesced_requests_total": "Turns served by joining an identical turn already in flight",
+    "genie_prefetch_total": "Suggestion prefetches, by outcome (started, skipped_*, stored, failed, cancelled)",
+    "genie_stream_bytes_total": "Event-stream bytes received off the wire (before decompression), by Content-Encoding",
+    "genie_text_digest_mismatch_total": "Compact final_summary events whose text digest did not match the streamed text",
+    "genie_admission_wait_seconds": "Time turns waited for an upstream slot, by result (admitted, shed_timeout, cancelled)",
+    "genie_admission_total": "Turns by admission outcome (admitted, queued, shed_queue_full, shed_timeout, cancelled)",
+    "genie_prefetch_claims_total": "Sent messages looked up in the prefetch cache, by result (hit, in_flight, miss)",
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())) if labels else ())
+
+
+def inc(name, labels=None, value=1):
+    """Add value to a counter."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, labels=None):
+    """Record a duration in a histogram."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+        counts = hist[0]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                counts[i] += 1
+                break
+        hist[1] += seconds
+        hist[2] += 1
+
+
+class span:
+    """Context manager timing its block into a histogram."""
+
+    __slots__ = ("name", "labels", "started")
+
+    def __init__(self, name, labels=None):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter() if ENABLED else 0.0
+        return self
+
+    def __exit__(self, *exc):
+        if ENABLED:
+            observe(self.name, time.perf_counter() - self.started, self.labels)
+        return False
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _labels_text(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def render_prometheus():
+    """Current metrics in Prometheus/OpenMetrics text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: (list(v[0]), v[1], v[2]) for k, v in _histograms.items()}
+    lines = []
+    seen = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_labels_text(labels)} {value}")
+    for (name, labels), (counts, total, count) in sorted(histograms.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS, counts):
+            cumulative += bucket
+            lines.append(f"{name}_bucket{_labels_text(labels, ('le', bound))} {cumulative}")
+        lines.append(f"{name}_bucket{_labels_text(labels, ('le', '+Inf'))} {count}")
+        lines.append(f"{name}_sum{_labels_text(labels)} {total}")
+        lines.append(f"{name}_count{_labels_text(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    """Current metrics as a JSON-serialisable dict."""
+    with _lock:
+        counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(_counters.items())]
+        histograms = [
+            {
+                "name": n,
+                "labels": dict(l),
+                "count": h[2],
+                "sum": h[1],
+                "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS], h[0])),
+            }
+            for (n, l), h in sorted(_histograms.items())
+        ]
+    return {"timestamp": time.time(), "counters": counters, "histograms": histograms}
+
+
+def _metrics_server(host, port):
+    """HTTP server answering /metrics; http.server is only loaded when the endpoint is on."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    return server
+
+
+def _dump_loop(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            with open(path, "w") as f:
+                json.dump(snapshot(), f)
+        except OSError as e:
+            logger.warning(f"Metrics dump to {path} failed: {e}")
+
+
+def start_exporters(port=None, json_path=None, interval=None, host=None):
+    """Start the /metrics endpoint and/or JSON dumper threads; returns the HTTP server.
+
+    The server is None when the port could not be bound, e.g. because another app
+    process already serves it; the JSON dumper still starts.
+    """
+    if not ENABLED:
+        return None
+    host = config.METRICS_HOST if host is None else host
+    port = config.METRICS_PORT if port is None else port
+    json_path = config.METRICS_JSON_PATH if json_path is None else json_path
+    interval = config.METRICS_JSON_INTERVAL if interval is None else interval
+    server = None
+    if port:
+        try:
+            server = _metrics_server(host, port)
+        except OSError as e:
+            logger.warning(f"Metrics endpoint not started, cannot bind {host}:{port}: {e}")
+        else:
+            threading.Thread(target=server.serve_forever, name="genie-metrics", daemon=True).start()
+            logger.info(f"Metrics endpoint on {host}:{port}/metrics")
+    if json_path:
+        threading.Thread(target=_dump_loop, args=(json_path, interval), name="genie-metrics-dump", daemon=True).start()
+        logger.info(f"Dumping metrics to {json_path} every {interval}s")
+    return server
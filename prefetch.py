@@ -0,0 +1,162 @@
+"""Opt-in speculative prefetch of the follow-ups offered as suggestion chips.
+
+When a turn finishes, the top-k suggestions are sent to the backend in the
+background, each under a scratch session_id, and the finished answers are kept
+in a small TTL cache. Clicking a chip whose answer is cached replays it at
+once; clicking one still being prefetched joins that stream where it is.
+
+Prefetch runs on its own small pool, is skipped when no slot is free, when the
+per-minute budget is spent or when the stream pool or the upstream admission
+limit is busy (it never queues behind user turns), and is dropped as
+soon as the session sends something else.
+
+A scratch session has none of the conversation, and a claimed chip never
+reaches the user's own backend session. So, as with the response cache, only
+chips with an action_key are prefetched: their answers do not depend on
+context. Prompt-only chips continue the conversation and always go to the
+backend under the user's session_id.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import metrics
+from response_cache import ResponseCache, make_key
+from single_flight import FlightBoard
+from stream_worker import StreamHandle
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """Background prefetch of suggestion answers for a StreamManager's sessions."""
+
+    def __init__(self, manager, base_url=None, top_k=None, concurrency=None, budget=None, clock=time.monotonic):
+        self.manager = manager
+        self.base_url = config.CHATBOT_SERVICE_URL if base_url is None else base_url
+        self.top_k = config.PREFETCH_TOP_K if top_k is None else top_k
+        self.budget = config.PREFETCH_BUDGET if budget is None else budget
+        self.cache = ResponseCache(config.PREFETCH_CACHE_SIZE, config.PREFETCH_TTL)
+        self.flights = FlightBoard()
+        self.clock = clock
+        concurrency = config.PREFETCH_CONCURRENCY if concurrency is None else concurrency
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="genie-prefetch")
+        self._tokens = float(self.budget)
+        self._refilled = clock()
+        self._by_session = {}
+        self._lock = threading.Lock()
+
+    def key(self, session_id, prompt, action=""):
+        return make_key(prompt, action, {**config.CHAT_METADATA, "session_id": session_id})
+
+    def _spend(self):
+        """Take one prefetch from the per-minute budget (token bucket)."""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.budget, self._tokens + (now - self._refilled) * self.budget / 60.0)
+            self._refilled = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def schedule(self, session_id, suggestions):
+        """Start prefetching the first top_k suggestions of a finished turn."""
+        self.release(session_id)
+        for sugg in list(suggestions)[:self.top_k]:
+            prompt, action = sugg.get("prompt"), sugg.get("action") or ""
+            if not prompt:
+                continue
+            if not action:
+                metrics.inc("genie_prefetch_total", {"result": "skipped_context"})
+                continue
+            key = self.key(session_id, prompt, action)
+            if self.flights.get(key) is not None:
+                continue
+            admission = self.manager.admission
+            if self.manager.active() >= config.STREAM_WORKERS // 2 or (admission is not None and admission.saturated()):
+                metrics.inc("genie_prefetch_total", {"result": "skipped_busy"})
+                return
+            if not self._slots.acquire(blocking=False):
+                metrics.inc("genie_prefetch_total", {"result": "skipped_concurrency"})
+                return
+            if not self._spend():
+                self._slots.release()
+                metrics.inc("genie_prefetch_total", {"result": "skipped_budget"})
+                return
+            if self.flights.launch(key, lambda flight: self._launch(flight, prompt, action)) is None:
+                self._slots.release()
+                continue
+            with self._lock:
+                self._by_session.setdefault(session_id, []).append(key)
+            metrics.inc("genie_prefetch_total", {"result": "started"})
+
+    def _launch(self, flight, prompt, action):
+        scratch_id = str(uuid.uuid4())
+        body = {"session_id": scratch_id, "message": prompt, "metadata": config.CHAT_METADATA, "action_key": action}
+        source = flight.source = StreamHandle(
+            scratch_id, f"{self.base_url}/chat-bot/chat-stream/{scratch_id}", queue_size=0,
+            cache=self.cache, cache_key=flight.key, post_url=f"{self.base_url}/chat-bot/chat", post_body=body,
+            stream_post_url=(
+                f"{self.base_url}{config.CHAT_STREAM_POST_PATH}" if config.CHAT_REQUEST_MODE == "single" else None
+            ),
+            cancel_url=f"{self.base_url}{config.CHAT_CANCEL_PATH}" if config.CHAT_CANCEL_PATH else None,
+            sink=flight.publish, admission=self.manager.admission,
+        )
+        # Keep speculative turns out of the user-facing latency metrics
+        source.speculative = True
+        flight.on_idle = lambda reason: self._cancel(source, reason)
+        self._executor.submit(self._fly, flight)
+
+    def _fly(self, flight):
+        try:
+            flight.source.run(self.manager.http_session)
+        finally:
+            self.flights.land(flight)
+            self._slots.release()
+        source = flight.source
+        if source.ended:
+            metrics.inc("genie_prefetch_total", {"result": "stored"})
+        elif not source.cancelled:
+            metrics.inc("genie_prefetch_total", {"result": "failed"})
+
+    def _cancel(self, source, reason):
+        if source.cancel(reason):
+            metrics.inc("genie_prefetch_total", {"result": "cancelled"})
+            if source.cancel_url is not None:
+                self._executor.submit(source.notify_backend, self.manager.http_session)
+
+    def claim(self, session_id, prompt, action, turn_id=None):
+        """Serve a chip click from the prefetch: a handle for the session, or None on a miss."""
+        key = self.key(session_id, prompt, action or "")
+        handle = None
+        events = self.cache.get(key)
+        if events is not None:
+            metrics.inc("genie_prefetch_claims_total", {"result": "hit"})
+            handle = self.manager.replay(session_id, events, turn_id=turn_id)
+        else:
+            subscriber = self.flights.attach(key, session_id, turn_id)
+            if subscriber is not None:
+                metrics.inc("genie_prefetch_claims_total", {"result": "in_flight"})
+                handle = self.manager.adopt(subscriber)
+            else:
+                metrics.inc("genie_prefetch_claims_total", {"result": "miss"})
+        # The other suggestions were not taken; a joined prefetch has a reader and stays
+        self.release(session_id)
+        return handle
+
+    def release(self, session_id):
+        """Cancel the session's unclaimed prefetches, e.g. once it has moved on."""
+        with self._lock:
+            keys = self._by_session.pop(session_id, [])
+        for key in keys:
+            flight = self.flights.get(key)
+            if flight is not None and not flight.subscribers:
+                self._cancel(flight.source, "released")
+
+    def stats(self):
+        return {"cache": self.cache.stats(), "in_flight": len(self.flights)}
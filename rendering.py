@@ -0,0 +1,448 @@
+import functools
+import hashlib
+import html
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import streamlit as st
+
+import config
+import metrics
+from messages import ChatMessage
+
+# Page stylesheet and auto-scroll script, served from ./static when static serving is on
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_URL = "app/static"
+
+
+@functools.lru_cache(maxsize=None)
+def _static_asset(name):
+    """Contents of a file under static/ and a short content hash for cache busting."""
+    with open(os.path.join(STATIC_DIR, name), encoding="utf-8") as f:
+        text = f.read()
+    return text, hashlib.sha1(text.encode("utf-8")).hexdigest()[:10]
+
+
+def inject_page_assets():
+    """Add the stylesheet and auto-scroll script to the page.
+
+    With server.enableStaticServing each rerun only sends a <link> and a
+    <script src> the browser caches; without it the files are inlined.
+    """
+    css, css_version = _static_asset("genie.css")
+    js, js_version = _static_asset("genie_autoscroll.js")
+    if st.get_option("server.enableStaticServing"):
+        st.markdown(f'<link rel="stylesheet" href="{STATIC_URL}/genie.css?v={css_version}">', unsafe_allow_html=True)
+        _script_frame(f'<script src="{STATIC_URL}/genie_autoscroll.js?v={js_version}"></script>')
+    else:
+        st.markdown(f"<style>\n{css}</style>", unsafe_allow_html=True)
+        _script_frame(f"<script>\n{js}</script>")
+
+
+def _script_frame(html):
+    """Hidden same-origin frame running html (st.iframe, or components.html before it existed)."""
+    # The marker lets genie.css hide the frame's element container
+    html = f"<!-- genie-autoscroll -->{html}"
+    if hasattr(st, "iframe"):
+        st.iframe(html, height=1)
+    else:
+        import streamlit.components.v1 as components
+        components.html(html, height=0)
+
+
+GENIE_HEADER_HTML = '<div class="genie-header"><strong>🧞‍♂️ Genie</strong></div>'
+
+
+COURSE_CARD_TEMPLATE = """
+<div class="course-card">
+    <div class="course-content">
+        <div class="course-title">{course_name}</div>
+        <div class="course-university">🏛️ {university_name}</div>
+        <div class="course-location">📍 {location}</div>
+        <a href="{course_url}" target="_blank" class="course-link">View Course ↗</a>
+    </div>
+</div>
+"""
+
+UNIVERSITY_CARD_TEMPLATE = """
+<div class="course-card">
+    <div class="course-content">
+        <div class="course-title">{university_name}</div>
+        <div class="course-location">📍 {location}</div>
+        <a href="{university_url}" target="_blank" class="course-link">View University ↗</a>
+    </div>
+</div>
+"""
+
+# Bounded LRU of card HTML keyed by intent and every source field the cards render
+_card_cache = OrderedDict()
+_card_cache_lock = threading.Lock()
+
+
+def render_card(source, intent):
+    """Generate the HTML for a single course or university card."""
+    if intent == "UNIVERSITY_SEARCH":
+        university_name = source.get("name", "Unknown University")
+        address = source.get("address", {})
+        location = address.get('country', 'N/A')
+        ref_id = source.get("refId", "")
+        university_url = source.get("url", f"https://edvoy.com/institutions/{ref_id}/")
+        return UNIVERSITY_CARD_TEMPLATE.format(university_name=university_name, location=location, university_url=university_url)
+    institution = source.get("institution", {})
+    address = institution.get("address", {})
+    course_name = source.get("name", "Course Title")
+    university_name = institution.get("name", "Unknown University")
+    location = address.get('country', 'N/A')
+    edp_ref_id = source.get("edpRefId", "")
+    course_level = (source.get("courseLevel") or "").lower()
+    slug = source.get("slug", "")
+    course_url = source.get("url", f"https://edvoy.com/institutions/{edp_ref_id}/{course_level}/{slug}/")
+    return COURSE_CARD_TEMPLATE.format(course_name=course_name, university_name=university_name, location=location, course_url=course_url)
+
+
+def card_key(source, intent):
+    """Everything render_card reads from a source (the fields trim_sources keeps).
+
+    Ids alone are no key: a course's edpRefId is its institution's, so two
+    courses of one university can share every id the source carries.
+    """
+    institution = source.get("institution") or {}
+    return (
+        intent, source.get("name"), source.get("url"), source.get("refId"), source.get("edpRefId"),
+        source.get("slug"), source.get("courseLevel"), (source.get("address") or {}).get("country"),
+        institution.get("name"), (institution.get("address") or {}).get("country"),
+    )
+
+
+def cached_card(source, intent):
+    """render_card memoized per rendered content."""
+    key = card_key(source, intent)
+    try:
+        hash(key)
+    except TypeError:
+        # Unexpected non-string values: render without caching
+        return render_card(source, intent)
+    with _card_cache_lock:
+        html = _card_cache.get(key)
+        if html is not None:
+            _card_cache.move_to_end(key)
+            return html
+    html = render_card(source, intent)
+    with _card_cache_lock:
+        _card_cache[key] = html
+        if len(_card_cache) > config.CARD_CACHE_SIZE:
+            _card_cache.popitem(last=False)
+    return html
+
+
+def render_course_cards(sources, intent):
+    """Generate HTML for course or university sources."""
+    if not sources:
+        return ""
+    cards = "".join(cached_card(source, intent) for source in sources[:config.CARD_LIMIT])
+    return f'<div class="sources-section">{cards}</div>'
+
+
+def finalize_message(entry):
+    """Turn a finished streaming message into a compact history record, pre-rendered once."""
+    record = ChatMessage.from_stream(entry)
+    frozen_parts(record)
+    return record
+
+
+def frozen_parts(record):
+    """Pre-rendered (body, unsafe_allow_html) parts of a finished message, built once.
+
+    Only our own templates are rendered as HTML; the answer text is a plain
+    markdown part, as while it streamed, so markup in it is never live HTML.
+    """
+    if record.frozen_parts is None:
+        if record.sender == "user":
+            parts = [(f'<div class="user-message"><strong>You:</strong> {html.escape(record.text)}</div>', True)]
+        else:
+            parts = [(GENIE_HEADER_HTML, True)]
+            if record.text:
+                parts.append((record.text, False))
+                if record.sources:
+                    parts.append((render_course_cards(record.sources, record.intent), True))
+        record.frozen_parts = tuple(parts)
+    return record.frozen_parts
+
+
+def render_suggestions(record, placeholder=st):
+    """Render the suggestion chips of a finished Genie message."""
+    suggestions = record.suggestions
+    if not (record.text and suggestions):
+        return
+    # Using a container for suggestions to keep them grouped
+    with placeholder.container():
+        st.write("---") # Visual separator
+        st.caption("Suggested actions:")
+        # Create columns for buttons to simulate chips
+        cols = st.columns(len(suggestions) if len(suggestions) > 0 else 1)
+        for i, sugg in enumerate(suggestions):
+            btn_label = sugg.get("text", sugg.get("prompt", "Option"))
+            # Use a unique key for each button
+            if i < len(cols):
+                if cols[i].button(btn_label, key=f"sugg_{record.id or 'h'}_{i}"):
+                    st.session_state.suggestion_clicked = {
+                        "prompt": sugg.get("prompt"),
+                        "action": sugg.get("action")
+                    }
+                    st.rerun()
+
+
+def render_message(entry, placeholder=st, interactive=True):
+    """Render a history record or the live state of a streaming message."""
+    if isinstance(entry, ChatMessage):
+        # Finished messages never change, so their parts are built once
+        for body, unsafe in frozen_parts(entry):
+            placeholder.markdown(body, unsafe_allow_html=unsafe)
+        if interactive:
+            render_suggestions(entry, placeholder)
+        return
+
+    # Check for thinking state
+    thinking_text = entry.get("thinkingText", "")
+    text = entry.get("text", "")
+
+    # Display Header
+    placeholder.markdown(GENIE_HEADER_HTML, unsafe_allow_html=True)
+
+    # Thinking State
+    if thinking_text and not entry.get("isStreamEnded", False):
+        placeholder.markdown(f'<div class="thinking-message"><span class="pulse"></span> {html.escape(thinking_text)}</div>', unsafe_allow_html=True)
+
+    if text:
+        # Render main response
+        placeholder.markdown(text)
+
+        # Sources/Cards
+        sources = entry.get("sources", [])
+        if sources:
+            placeholder.markdown(render_course_cards(sources, entry.get("intent", "")), unsafe_allow_html=True)
+
+
+def history_split(history, turns=None):
+    """Index where the live window of the last `turns` turns starts."""
+    turns = config.HISTORY_WINDOW_TURNS if turns is None else turns
+    if not turns:
+        return 0
+    split = max(0, len(history) - 2 * turns)
+    # Never cut a turn in half: the window starts on a user message
+    while split > 0 and history[split].sender != "user":
+        split -= 1
+    return split
+
+
+def render_history(history, turns=None, spilled=0, load_spilled=None):
+    """Render the last turns in full and fold older ones into an on-demand archive.
+
+    spilled counts messages already moved out of session state; load_spilled
+    fetches them, and is only called when the archive is opened.
+    """
+    split = history_split(history, turns)
+    if split or spilled:
+        # Archived messages are only sent to the browser when asked for
+        if st.toggle(f"Show {split + spilled} earlier messages", key="show_archive"):
+            archived = history[:split]
+            if spilled and load_spilled is not None:
+                archived = load_spilled() + archived
+            for entry in archived:
+                render_message(entry, interactive=False)
+    for entry in history[split:]:
+        render_message(entry)
+
+
+def split_frozen_blocks(text):
+    """Return the length of the prefix of text made of complete markdown blocks.
+
+    A block ends at a blank line that is not inside an open ``` fence, so the
+    prefix can be rendered once and never touched again.
+    """
+    end = 0
+    pos = text.find("\n\n")
+    while pos != -1:
+        if text.count("```", 0, pos) % 2 == 0:
+            end = pos + 2
+        pos = text.find("\n\n", pos + 2)
+    return end
+
+
+# Seconds of content chunks averaged into one sample of the chunk rate
+RATE_WINDOW = 0.25
+
+
+class StreamRenderer:
+    """Incrementally render a streaming Genie message into a placeholder.
+
+    The header and course cards are emitted once, completed markdown blocks are
+    frozen into their own elements and only the trailing open block is resent,
+    with updates coalesced to at most one flush per interval. In adaptive mode
+    the interval follows the measured chunk rate and render cost: slow streams
+    show each chunk as it arrives, fast ones are batched into frames.
+
+    tuning seeds those estimates from the renderer of an earlier UI run of the
+    same turn (see the tuning property), so each run starts at the measured
+    interval instead of learning it again.
+    """
+
+    def __init__(self, placeholder, flush_interval=None, flush_chunks=None, clock=time.monotonic, adaptive=None,
+                 tuning=None):
+        self.flush_interval = config.STREAM_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.flush_chunks = config.STREAM_FLUSH_CHUNKS if flush_chunks is None else flush_chunks
+        self.adaptive = config.STREAM_FLUSH_MODE == "adaptive" if adaptive is None else adaptive
+        self.clock = clock
+        self.flushes = 0
+        self.interval = config.STREAM_FLUSH_MIN_INTERVAL if self.adaptive else self.flush_interval
+        self.batch_limit = self.flush_chunks
+        self.rate = None
+        self.render_cost = None
+        self._rate_count = 0
+        self._rate_since = None
+        if tuning is not None:
+            self.rate, self.render_cost, self._rate_count, self._rate_since = tuning
+            if self.adaptive:
+                self._retune()
+
+        root = placeholder.container()
+        root.markdown(GENIE_HEADER_HTML, unsafe_allow_html=True)
+        self._thinking = root.empty()
+        self._body_slot = root.empty()
+        self._cards = root.empty()
+        self._reset_body()
+
+        self._thinking_shown = None
+        self._cards_key = None
+        self._pending = 0
+        self._last_flush = None
+
+    def _reset_body(self):
+        self._body = self._body_slot.container()
+        self._tail = self._body.empty()
+        self._frozen = ""
+        self._tail_shown = ""
+
+    @property
+    def pending(self):
+        return self._pending
+
+    @property
+    def tuning(self):
+        """The chunk-rate and render-cost estimates, to carry over to the next run's renderer."""
+        return self.rate, self.render_cost, self._rate_count, self._rate_since
+
+    def update(self, entry, force=False):
+        """Record a new state of entry and flush it if the interval allows.
+
+        force is for events that must show at once (status updates, end of
+        stream); other updates count as content chunks for the rate estimate.
+        """
+        self._pending += 1
+        now = self.clock()
+        if not force and self.adaptive:
+            self._observe_chunk(now)
+        due = (
+            force
+            or entry.get("isStreamEnded", False)
+            or self._last_flush is None
+            or not (self._frozen or self._tail_shown)
+            or self._pending >= self.batch_limit
+            or now - self._last_flush >= self.interval
+        )
+        if due:
+            self.flush(entry)
+            self._last_flush = now
+        return due
+
+    def next_flush_in(self):
+        """Seconds until held-back updates are due, None when nothing is pending."""
+        if not self._pending:
+            return None
+        if self._last_flush is None:
+            return 0.0
+        return max(0.0, self._last_flush + self.interval - self.clock())
+
+    def flush_due(self, entry):
+        """Flush held-back updates whose interval is up, e.g. when the stream goes idle."""
+        if self._pending and self.next_flush_in() == 0.0:
+            self.flush(entry)
+            self._last_flush = self.clock()
+
+    def flush(self, entry):
+        """Send only what changed in entry since the last flush."""
+        # CPU time, so waiting on the GIL under load does not count as render cost
+        started = time.thread_time()
+        with metrics.span("genie_render_seconds"):
+            self._flush(entry)
+        cost = time.thread_time() - started
+        self.render_cost = cost if self.render_cost is None else 0.8 * self.render_cost + 0.2 * cost
+        if self.adaptive:
+            self._retune()
+
+    def _observe_chunk(self, now):
+        """Fold one content chunk into the windowed chunk-rate estimate."""
+        if self._rate_since is None:
+            self._rate_since = now
+            return
+        self._rate_count += 1
+        elapsed = now - self._rate_since
+        if elapsed >= RATE_WINDOW:
+            sample = self._rate_count / elapsed
+            self.rate = sample if self.rate is None else 0.5 * self.rate + 0.5 * sample
+            self._rate_since = now
+            self._rate_count = 0
+            self._retune()
+
+    def _retune(self):
+        """Pick the flush interval and batch limit from the chunk rate and render cost."""
+        frame = 1.0 / config.STREAM_FLUSH_FPS
+        if self.rate is None or self.rate <= config.STREAM_FLUSH_FPS:
+            # Chunks arrive no faster than frames: batching would only add lag
+            interval = config.STREAM_FLUSH_MIN_INTERVAL
+        else:
+            interval = frame
+        # Keep rendering within its share of the script thread's time
+        interval = max(interval, (self.render_cost or 0.0) / config.STREAM_FLUSH_RENDER_SHARE)
+        self.interval = min(config.STREAM_FLUSH_MAX_INTERVAL, max(config.STREAM_FLUSH_MIN_INTERVAL, interval))
+        expected = int(self.rate * self.interval * 2) if self.rate else 0
+        self.batch_limit = max(self.flush_chunks, expected)
+
+    def _flush(self, entry):
+        self._pending = 0
+        self.flushes += 1
+
+        thinking_text = entry.get("thinkingText", "")
+        if entry.get("isStreamEnded", False):
+            thinking_text = ""
+        if thinking_text != self._thinking_shown:
+            if thinking_text:
+                self._thinking.markdown(f'<div class="thinking-message"><span class="pulse"></span> {html.escape(thinking_text)}</div>', unsafe_allow_html=True)
+            else:
+                self._thinking.empty()
+            self._thinking_shown = thinking_text
+
+        text = entry.get("text", "")
+        if not text.startswith(self._frozen):
+            # Text was replaced wholesale (e.g. full_response_for_db), start over
+            self._reset_body()
+        tail = text[len(self._frozen):]
+        cut = split_frozen_blocks(tail)
+        if cut:
+            self._tail.markdown(tail[:cut])
+            self._frozen += tail[:cut]
+            tail = tail[cut:]
+            self._tail = self._body.empty()
+            self._tail_shown = ""
+        if tail != self._tail_shown:
+            self._tail.markdown(tail)
+            self._tail_shown = tail
+
+        sources = entry.get("sources", [])
+        if text and sources:
+            cards_key = (id(sources), entry.get("intent", ""))
+            if cards_key != self._cards_key:
+                self._cards.markdown(render_course_cards(sources, entry.get("intent", "")), unsafe_allow_html=True)
+                self._cards_key = cards_key
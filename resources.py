@@ -0,0 +1,72 @@
+"""Per-process resources of the app, created on first use and shared by every session.
+
+Streamlit re-executes app.py from the top on every rerun, so nothing costly
+belongs there. Each resource here is built once per process by
+st.cache_resource, and the modules behind it (requests, the stores, the stream
+workers) are imported on first use: a fresh worker serves its first page
+without loading the HTTP stack, which is only needed once a message is sent.
+"""
+import logging
+
+import streamlit as st
+
+import config
+
+
+@st.cache_resource
+def init_process():
+    """Logging and the optional metrics exporters, once per process."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    import metrics
+    return metrics.start_exporters()
+
+
+@st.cache_resource
+def get_http_session():
+    """Process-wide pooled HTTP session, reused across reruns and user sessions."""
+    from http_client import build_session
+    return build_session()
+
+
+@st.cache_resource
+def get_response_cache():
+    """Opt-in response cache shared by all sessions (None when disabled)."""
+    if config.RESPONSE_CACHE == "off":
+        return None
+    from response_cache import build_cache
+    return build_cache()
+
+
+@st.cache_resource
+def get_stream_manager():
+    """Process-wide pool of background stream consumers."""
+    from stream_worker import StreamManager
+    return StreamManager(get_http_session(), cache=get_response_cache())
+
+
+@st.cache_resource
+def get_prefetcher():
+    """Opt-in background prefetch of suggestion answers (None when disabled)."""
+    if not config.PREFETCH_SUGGESTIONS:
+        return None
+    from prefetch import Prefetcher
+    return Prefetcher(get_stream_manager())
+
+
+@st.cache_resource
+def get_history_store():
+    """Persistent history store with batched background writes."""
+    from history_store import build_history_store
+    return build_history_store()
+
+
+@st.cache_resource
+def get_session_store():
+    """Opt-in store sharing session state between app processes (None when off)."""
+    if config.SESSION_STORE == "off":
+        return None
+    from session_store import build_session_store
+    return build_session_store()
@@ -0,0 +1,163 @@
+"""Opt-in cache of finished turns, replayed through the normal streaming path.
+
+The key covers the message, action and metadata but not the conversation, and
+a replayed turn never reaches the backend's own conversation memory. So only
+turns passing cacheable() are stored or looked up: opening questions and chip
+actions, never follow-ups such as "tell me more". The user's backend session
+still misses a replayed turn, so the follow-ups it answers lack that context:
+only enable the cache when the backend keeps no per-session memory.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(message, action_key="", metadata=None):
+    """Cache key for a request: normalized message text, action and metadata."""
+    normalized = " ".join((message or "").lower().split())
+    raw = json.dumps([normalized, action_key or "", metadata or {}], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def cacheable(opening, action_key=""):
+    """Whether a turn's answer may be shared: an opening question or a chip action."""
+    return opening or bool(action_key)
+
+
+class ResponseCache:
+    """In-process TTL cache with LRU eviction, storing each turn's event list."""
+
+    def __init__(self, max_entries=None, ttl=None, clock=time.time):
+        self.max_entries = config.RESPONSE_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl = config.RESPONSE_CACHE_TTL if ttl is None else ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the stored events for key, or None on a miss or expiry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, events):
+        with self._lock:
+            self._entries[key] = (self.clock(), events)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self),
+        }
+
+
+class DiskResponseCache(ResponseCache):
+    """SQLite-backed variant shared by every Streamlit process on the host."""
+
+    def __init__(self, path=None, max_entries=None, ttl=None, clock=time.time):
+        super().__init__(max_entries, ttl, clock)
+        self.path = config.RESPONSE_CACHE_PATH if path is None else path
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, events TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=5)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def get(self, key):
+        now = self.clock()
+        try:
+            with self._connect() as db:
+                row = db.execute("SELECT events, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] > self.ttl:
+                    db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    row = None
+                if row is not None:
+                    db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache read failed: {e}")
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, events):
+        now = self.clock()
+        try:
+            with self._connect() as db:
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, events, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(events), now, now),
+                )
+                db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                excess = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    db.execute(
+                        "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                        (excess,),
+                    )
+                    with self._lock:
+                        self.evictions += excess
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    def __len__(self):
+        try:
+            with self._connect() as db:
+                return db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def stats(self):
+        stats = super().stats()
+        stats["backend"] = "disk"
+        return stats
+
+
+def build_cache(backend=None):
+    """Create the configured cache, or None when caching is off."""
+    backend = config.RESPONSE_CACHE if backend is None else backend
+    if backend == "memory":
+        return ResponseCache()
+    if backend == "disk":
+        return DiskResponseCache()
+    return None
@@ -0,0 +1,106 @@
+"""Shared per-session state, so a session can resume on any app process.
+
+Streamlit keeps st.session_state in the process that served the page. When
+several processes run behind a load balancer, a reload may land on another
+one; it restores the chat history from the history store and the rest of the
+session (the turn still streaming, its id and start time) from here.
+
+Turn start times are monotonic per process, so they are stored as wall-clock
+time and converted back when loaded.
+"""
+import json
+import logging
+import sqlite3
+import time
+
+import config
+from kv_client import KVClient
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("pending_response", "turn_id", "turn_started", "pending_cache_key")
+
+
+def snapshot(state):
+    """The shared part of a session's state, ready to store."""
+    data = {name: state.get(name) for name in FIELDS}
+    if data["turn_started"] is not None:
+        data["turn_started"] = time.time() - (time.monotonic() - data["turn_started"])
+    return data
+
+
+def restore(data):
+    """Inverse of snapshot: the state to put back into st.session_state."""
+    data = {name: data.get(name) for name in FIELDS}
+    if data["turn_started"] is not None:
+        data["turn_started"] = time.monotonic() - max(time.time() - data["turn_started"], 0)
+    return data
+
+
+class SqliteSessionStore:
+    """Session snapshots in one SQLite file shared by the processes on a host."""
+
+    def __init__(self, path=None, ttl=None):
+        self.path = config.SESSION_STORE_PATH if path is None else path
+        self.ttl = config.SESSION_TTL if ttl is None else ttl
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=5)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def save(self, session_id, data):
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, expires) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data), time.time() + self.ttl),
+            )
+
+    def load(self, session_id):
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT data FROM sessions WHERE session_id = ? AND expires > ?", (session_id, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, session_id):
+        with self._connect() as db:
+            db.execute("DELETE FROM sessions WHERE session_id = ? OR expires <= ?", (session_id, time.time()))
+
+
+class RespSessionStore:
+    """Session snapshots on a Redis-compatible server, expiring after ttl."""
+
+    def __init__(self, client=None, ttl=None):
+        self.client = KVClient() if client is None else client
+        self.ttl = config.SESSION_TTL if ttl is None else ttl
+
+    def _key(self, session_id):
+        return f"genie:session:{session_id}"
+
+    def save(self, session_id, data):
+        self.client.set(self._key(session_id), json.dumps(data), ex=self.ttl)
+
+    def load(self, session_id):
+        raw = self.client.get(self._key(session_id))
+        return json.loads(raw) if raw else None
+
+    def delete(self, session_id):
+        self.client.delete(self._key(session_id))
+
+
+def build_session_store(backend=None):
+    """Create the configured store, or None when sessions stay in their process."""
+    backend = config.SESSION_STORE if backend is None else backend
+    if backend == "off":
+        return None
+    if backend == "sqlite":
+        return SqliteSessionStore()
+    if backend == "resp":
+        return RespSessionStore()
+    raise ValueError(f"Unknown session store backend: {backend}")
@@ -0,0 +1,204 @@
+"""Opt-in single-flight: identical opening questions share one upstream stream.
+
+A flight reads the backend once and appends every event to a shared log. Each
+waiting session subscribes with its own cursor into that log, so it replays
+what it missed and then follows live; a slow or vanished browser only lags its
+own cursor and never holds up the upstream reader or the other subscribers.
+
+Only the leader's session_id reaches the backend, so, as with the response
+cache, only coalesce prompts whose answers do not depend on history. The
+followers' backend sessions never receive the question either: their next
+turns reach the backend without it, which is only safe when the backend keeps
+no per-session memory.
+"""
+import logging
+import threading
+import time
+
+import config
+import metrics
+from messages import new_genie_message
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """One in-flight upstream turn fanned out to any number of subscribers.
+
+    source is the StreamHandle reading the backend, publishing into this
+    flight; on_idle(reason) cancels it once nobody is reading any more.
+    leader is the subscriber whose session_id the backend sees (None for a
+    prefetch); leader_left is set once it leaves while others still read,
+    after which its session may be on another turn.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.source = None
+        self.on_idle = None
+        self.leader = None
+        self.leader_left = False
+        self.events = []
+        self.done = False
+        self.subscribers = set()
+        self._cond = threading.Condition()
+        self._checked = time.monotonic()
+
+    def subscribe(self, session_id, turn_id=None):
+        subscriber = FlightSubscriber(self, session_id, turn_id)
+        with self._cond:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber, reason):
+        with self._cond:
+            self.subscribers.discard(subscriber)
+            idle = not self.subscribers and not self.done
+            if subscriber is self.leader and self.subscribers:
+                self.leader_left = True
+        if idle and self.on_idle is not None:
+            # Nobody is reading any more: stop the upstream generation too
+            self.on_idle(reason)
+
+    def publish(self, item):
+        with self._cond:
+            self.events.append(item)
+            self._cond.notify_all()
+        now = time.monotonic()
+        if now - self._checked >= 1.0:
+            self._checked = now
+            self._check_abandoned(now)
+
+    def _check_abandoned(self, now):
+        with self._cond:
+            subscribers = list(self.subscribers)
+        if subscribers and all(now - s.last_read >= config.STREAM_ABANDON_TIMEOUT for s in subscribers):
+            logger.warning(f"Flight {self.key[:12]} abandoned by all {len(subscribers)} readers, cancelling")
+            self.on_idle("abandoned")
+
+    def finish(self):
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+
+    def wait(self, cursor, timeout):
+        """Block until there are events past cursor, the flight ends or timeout passes."""
+        with self._cond:
+            if cursor >= len(self.events) and not self.done:
+                self._cond.wait(max(timeout, 0))
+            return len(self.events), self.done
+
+
+class FlightSubscriber:
+    """A session's view of a flight, used like a StreamHandle by the UI."""
+
+    def __init__(self, flight, session_id, turn_id=None):
+        self.flight = flight
+        self.session_id = session_id
+        self.turn_id = turn_id
+        self.message = new_genie_message()
+        self.flush_tuning = None
+        self.cursor = 0
+        self.exhausted = False
+        self.last_read = time.monotonic()
+        self._cancelled = False
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    @property
+    def ended(self):
+        return self.flight.source.ended
+
+    @property
+    def error(self):
+        return self.flight.source.error
+
+    @property
+    def failed_stage(self):
+        return self.flight.source.failed_stage
+
+    @property
+    def delivered(self):
+        return self.cursor
+
+    @property
+    def done(self):
+        return self.flight.done
+
+    def cancel(self, reason="cancelled"):
+        """Leave the flight; the upstream is only cancelled once every subscriber has left."""
+        if self._cancelled:
+            return False
+        self._cancelled = True
+        self.flight.unsubscribe(self, reason)
+        return False
+
+    def drain(self, timeout, max_events=None):
+        """Return this subscriber's unread events, waiting up to timeout for the first one."""
+        self.last_read = time.monotonic()
+        available, done = self.flight.wait(self.cursor, timeout)
+        end = available if max_events is None else min(available, self.cursor + max_events)
+        events = self.flight.events[self.cursor:end]
+        self.cursor = end
+        if done and self.cursor >= available:
+            self.exhausted = True
+        return events
+
+
+class FlightBoard:
+    """Registry of in-flight coalesced turns, keyed by the request's cache key."""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def join(self, key, session_id, turn_id, launch):
+        """Subscribe to the flight for key, starting one with launch(flight) if none is running."""
+        with self._lock:
+            flight = self._flights.get(key)
+            # A flight whose readers all left is being cancelled: start afresh
+            joined = flight is not None and not flight.source.cancelled
+            if not joined:
+                flight = self._flights[key] = Flight(key)
+                # Launched under the lock so joiners never see a flight without its source
+                launch(flight)
+            subscriber = flight.subscribe(session_id, turn_id)
+            if not joined:
+                flight.leader = subscriber
+        if joined:
+            metrics.inc("genie_coalesced_requests_total")
+            logger.info(f"Session {session_id} joined in-flight turn {key[:12]} ({len(flight.subscribers)} readers)")
+        return subscriber
+
+    def launch(self, key, launch):
+        """Start a flight for key with launch(flight) and no subscribers yet; None if one is running."""
+        with self._lock:
+            if key in self._flights:
+                return None
+            flight = self._flights[key] = Flight(key)
+            launch(flight)
+        return flight
+
+    def attach(self, key, session_id, turn_id=None):
+        """Subscribe to the running flight for key, or return None if there is none."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None or flight.source.cancelled:
+                return None
+            return flight.subscribe(session_id, turn_id)
+
+    def get(self, key):
+        with self._lock:
+            return self._flights.get(key)
+
+    def land(self, flight):
+        """Mark flight finished and stop offering it to new requests."""
+        flight.finish()
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def __len__(self):
+        return len(self._flights)
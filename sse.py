@@ -0,0 +1,176 @@
+"""Incremental Server-Sent Events parser working directly on raw byte chunks."""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+import config
+
+_scan_once = json.JSONDecoder().scan_once
+
+
+def stdlib_loads(raw):
+    """Decode one event's data with the standard library."""
+    # SSE is always UTF-8, and event data is one JSON value without surrounding
+    # whitespace: the C scanner alone skips the encoding sniffing and whitespace
+    # regexes json.loads runs around it. Anything else goes through json.loads,
+    # which also raises the proper JSONDecodeError.
+    text = raw.decode("utf-8")
+    try:
+        value, end = _scan_once(text, 0)
+    except StopIteration:
+        return json.loads(text)
+    if end != len(text):
+        return json.loads(text)
+    return value
+
+
+if orjson is not None and config.SSE_JSON_BACKEND in ("auto", "orjson"):
+    JSON_BACKEND = "orjson"
+    loads = orjson.loads
+else:
+    JSON_BACKEND = "json"
+    loads = stdlib_loads
+
+READ_CHUNK_SIZE = 8192
+
+
+class Event:
+    """A dispatched SSE event; data is kept as raw bytes until decoded."""
+
+    __slots__ = ("event", "raw", "id", "retry")
+
+    def __init__(self, event, raw, id=None, retry=None):
+        self.event = event
+        self.raw = raw
+        self.id = id
+        self.retry = retry
+
+    @property
+    def data(self):
+        return self.raw.decode("utf-8", "replace")
+
+    def json(self):
+        """Decode data as JSON with the fastest available backend."""
+        return loads(self.raw)
+
+    def __repr__(self):
+        return f"Event(event={self.event!r}, id={self.id!r}, data={self.raw[:40]!r})"
+
+
+class SSEParser:
+    """Feed raw bytes in, get complete events out.
+
+    Implements the WHATWG event-stream rules: LF, CR and CRLF line endings,
+    comments, multi-line data, and the event/id/retry fields. Incomplete lines
+    stay in a single bytearray that is compacted in place after each feed, and
+    complete lines are split in one pass with a fast path for "data: " lines.
+    """
+
+    def __init__(self, last_event_id=None, retry=None):
+        self._buf = bytearray()
+        self._data = []
+        self._event = None
+        self._started = False
+        self._has_cr = False
+        # The id field only takes effect once its event is dispatched, so a
+        # connection cut inside an event resumes from the one before it
+        self._id = last_event_id
+        self.last_event_id = last_event_id
+        self.retry = retry
+        self.comments = 0
+
+    def feed(self, chunk):
+        """Consume a chunk of bytes and return the list of events it completed."""
+        buf = self._buf
+        buf += chunk
+        if not self._started:
+            if len(buf) < 3 and b"\xef\xbb\xbf".startswith(bytes(buf)):
+                return []
+            if buf.startswith(b"\xef\xbb\xbf"):
+                del buf[:3]
+            self._started = True
+        if not self._has_cr and b"\r" in chunk:
+            self._has_cr = True
+
+        if self._has_cr:
+            # A trailing CR may be the first half of a CRLF split across chunks
+            end = len(buf) - 1 if buf.endswith(b"\r") else len(buf)
+            last = max(buf.rfind(b"\n", 0, end), buf.rfind(b"\r", 0, end))
+            if last == -1:
+                return []
+            block = bytes(buf[:last + 1]).replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        else:
+            last = buf.rfind(b"\n")
+            if last == -1:
+                return []
+            block = bytes(buf[:last + 1])
+        del buf[:last + 1]
+
+        events = []
+        append = events.append
+        lines = block.split(b"\n")
+        lines.pop()
+        data = self._data
+        for line in lines:
+            if line.startswith(b"data: "):
+                data.append(line[6:])
+            elif line:
+                self._field(line)
+            elif data:
+                # Blank line: dispatch the buffered event
+                self.last_event_id = self._id
+                raw = data[0] if len(data) == 1 else b"\n".join(data)
+                append(Event(self._event or "message", raw, self.last_event_id, self.retry))
+                data = self._data = []
+                self._event = None
+            else:
+                self.last_event_id = self._id
+                self._event = None
+        return events
+
+    def _field(self, line):
+        if line[0] == 0x3A:  # ':'
+            self.comments += 1
+            return
+        colon = line.find(b":")
+        if colon == -1:
+            field, value = line, b""
+        else:
+            field = line[:colon]
+            value = line[colon + 1:]
+            if value[:1] == b" ":
+                value = value[1:]
+        if field == b"data":
+            self._data.append(value)
+        elif field == b"event":
+            self._event = value.decode("utf-8", "replace")
+        elif field == b"id":
+            if b"\0" not in value:
+                self._id = value.decode("utf-8", "replace")
+        elif field == b"retry":
+            if value.isdigit():
+                self.retry = int(value)
+
+
+def iter_response_chunks(resp, chunk_size=READ_CHUNK_SIZE):
+    """Yield body bytes of a streamed requests response as soon as they arrive."""
+    raw = resp.raw
+    if hasattr(raw, "read1"):
+        # urllib3 2.x: returns whatever is available instead of filling chunk_size
+        while True:
+            data = raw.read1(chunk_size, decode_content=True)
+            if not data:
+                return
+            yield data
+    else:
+        yield from resp.iter_content(chunk_size=None)
+
+
+def iter_events(chunks, parser=None):
+    """Yield events parsed from an iterable of byte chunks."""
+    parser = SSEParser() if parser is None else parser
+    for chunk in chunks:
+        yield from parser.feed(chunk)
@@ -0,0 +1,137 @@
+"""Opt-in recording of raw event streams with timings, and reading them back.
+
+A recording (*.sserec) holds one turn's stream exactly as the parser saw it:
+the decoded body chunks and the time between them, across reconnects. The
+file is gzip-compressed and contains a magic line, a JSON header line and
+then frames of FRAME (microseconds since the previous frame, payload length)
+followed by the payload. A zero-length frame marks the start of a connection.
+
+Recordings hold everything the backend sent, answers included, so only
+enable them where that is acceptable.
+"""
+import gzip
+import json
+import logging
+import os
+import random
+import struct
+import time
+import uuid
+
+import config
+from sse import SSEParser
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GSSE1\n"
+FRAME = struct.Struct("<II")
+MAX_DELAY_US = 0xFFFFFFFF
+
+
+class StreamRecorder:
+    """Writes the chunks of one turn's stream, with their timings, to a recording."""
+
+    def __init__(self, path, header):
+        self.path = path
+        self.frames = 0
+        self._file = gzip.open(path, "wb")
+        self._file.write(MAGIC + json.dumps(header).encode("utf-8") + b"\n")
+        self._last = time.perf_counter()
+
+    def _frame(self, payload):
+        now = time.perf_counter()
+        delay = min(int((now - self._last) * 1e6), MAX_DELAY_US)
+        self._file.write(FRAME.pack(delay, len(payload)) + payload)
+        self._last = now
+        self.frames += 1
+
+    def tap(self, chunks):
+        """Record a new connection and pass its chunks through unchanged."""
+        self._frame(b"")
+        for chunk in chunks:
+            self._frame(chunk)
+            yield chunk
+
+    def close(self):
+        self._file.close()
+
+
+def open_recorder(session_id, url, turn_id=None, directory=None, sample=None):
+    """A recorder for a new turn, or None when recording is off or the turn is not sampled."""
+    directory = config.STREAM_RECORD_DIR if directory is None else directory
+    sample = config.STREAM_RECORD_SAMPLE if sample is None else sample
+    if not directory or random.random() >= sample:
+        return None
+    try:
+        os.makedirs(directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{session_id[:8]}-{uuid.uuid4().hex[:6]}.sserec"
+        header = {"session_id": session_id, "turn_id": turn_id, "url": url, "started": time.time()}
+        return StreamRecorder(os.path.join(directory, name), header)
+    except OSError as e:
+        logger.warning(f"Stream recording disabled for {session_id}: {e}")
+        return None
+
+
+class Recording:
+    """A recorded turn: header and a list of connections, each a list of (delay, chunk)."""
+
+    def __init__(self, header, connections, path=None):
+        self.header = header
+        self.connections = connections
+        self.path = path
+
+    @classmethod
+    def load(cls, path):
+        connections = []
+        with gzip.open(path, "rb") as f:
+            if f.readline() != MAGIC:
+                raise ValueError(f"{path} is not a stream recording")
+            header = json.loads(f.readline())
+            try:
+                while True:
+                    head = f.read(FRAME.size)
+                    if len(head) < FRAME.size:
+                        break
+                    delay, size = FRAME.unpack(head)
+                    payload = f.read(size)
+                    if not size or not connections:
+                        connections.append([])
+                    if size:
+                        connections[-1].append((delay / 1e6, payload))
+            except EOFError:
+                # Written by a process that stopped mid-turn: keep what made it to disk
+                logger.info(f"{path} is truncated, using the complete frames")
+        return cls(header, connections, path)
+
+    @property
+    def bytes(self):
+        return sum(len(chunk) for conn in self.connections for _, chunk in conn)
+
+    @property
+    def duration(self):
+        return sum(delay for conn in self.connections for delay, _ in conn)
+
+    def events(self):
+        """The parsed events as (seconds since the previous event, decoded JSON) pairs."""
+        timed = []
+        waited = 0.0
+        for conn in self.connections:
+            parser = SSEParser()
+            for delay, chunk in conn:
+                waited += delay
+                for event in parser.feed(chunk):
+                    try:
+                        timed.append((waited, event.json()))
+                    except ValueError:
+                        continue
+                    waited = 0.0
+        return timed
+
+
+def parse_speed(text):
+    """Replay speed from "original", "max" or "<N>x" as a factor (0 means no waiting)."""
+    if text == "original":
+        return 1.0
+    if text == "max":
+        return 0.0
+    return float(text[:-1] if text.endswith("x") else text)
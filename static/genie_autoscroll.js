@@ -0,0 +1,60 @@
+// Keeps the Genie chat scrolled to the newest message while answers stream in.
+// Loaded once into a hidden same-origin frame; it observes the app page and
+// coalesces DOM mutations into at most one scroll per animation frame. Scrolling
+// pauses while the user has scrolled up to read older messages.
+(function () {
+    var win = window.parent;
+    var doc = win.document;
+
+    // The frame was remounted: drop the observer installed by the old one
+    var previous = win.__genieAutoScroll;
+    if (previous) {
+        previous.observer.disconnect();
+        doc.removeEventListener("scroll", previous.onScroll, true);
+        if (previous.frame) {
+            win.cancelAnimationFrame(previous.frame);
+        }
+    }
+
+    var state = win.__genieAutoScroll = { mutations: 0, scrolls: 0, frame: 0, pinned: true };
+
+    function scroller() {
+        return doc.querySelector('[data-testid="stMain"]')
+            || doc.querySelector("section.main")
+            || doc.scrollingElement;
+    }
+
+    function nearBottom(el) {
+        return el.scrollHeight - el.scrollTop - el.clientHeight < 120;
+    }
+
+    function scrollToBottom() {
+        state.frame = 0;
+        var el = scroller();
+        if (el) {
+            el.scrollTop = el.scrollHeight;
+            state.scrolls++;
+        }
+    }
+
+    function schedule() {
+        state.mutations++;
+        if (state.frame || !state.pinned) {
+            return;
+        }
+        // The parent's frame clock: a hidden frame's own may be throttled
+        state.frame = win.requestAnimationFrame(scrollToBottom);
+    }
+
+    state.onScroll = function (event) {
+        var el = scroller();
+        if (el && (event.target === el || event.target === doc)) {
+            state.pinned = nearBottom(el);
+        }
+    };
+
+    state.observer = new win.MutationObserver(schedule);
+    state.observer.observe(doc.body, { childList: true, subtree: true, characterData: true });
+    doc.addEventListener("scroll", state.onScroll, { capture: true, passive: true });
+    schedule();
+})();
@@ -0,0 +1,600 @@
+"""Background consumers for /chat-bot/chat-stream that feed per-session event queues."""
+import hashlib
+import logging
+import queue
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import config
+import metrics
+from admission import AdmissionController, AdmissionRejected
+from http_client import stream_headers
+from messages import END_EVENT_TYPES, new_genie_message
+from single_flight import FlightBoard
+from sse import SSEParser, iter_events, iter_response_chunks
+from sse_record import open_recorder
+
+logger = logging.getLogger(__name__)
+
+# Statuses meaning the backend has no streaming POST endpoint
+STREAM_POST_UNSUPPORTED = (404, 405, 415, 501)
+
+# Statuses meaning the backend has no cancel endpoint
+CANCEL_UNSUPPORTED = (404, 405, 501)
+
+# Streaming POST and cancel URLs that turned out to be unsupported, so later turns skip them
+_unsupported_stream_posts = set()
+_unsupported_cancel_urls = set()
+
+# Histogram observed the first time each event type arrives in a turn
+FIRST_EVENT_METRICS = {
+    "status_update": "genie_time_to_first_status_seconds",
+    "content_chunk": "genie_time_to_first_token_seconds",
+    "final_summary": "genie_time_to_final_summary_seconds",
+}
+
+# Shown to a turn turned away by admission control
+BUSY_MESSAGE = "Genie is very busy right now. Please try again in a minute."
+
+
+class StreamCancelled(Exception):
+    """Raised inside a worker when its stream has been cancelled."""
+
+
+class TextDigestMismatch(Exception):
+    """A compact final_summary did not match the text built from the content chunks."""
+
+
+class TextDigest:
+    """Running length and SHA-256 of the answer text, built the way apply_event builds it."""
+
+    def __init__(self):
+        self.length = 0
+        self._sha = hashlib.sha256()
+
+    def feed(self, chunk):
+        text = chunk.get("full_response_for_db")
+        if text:
+            self.length = 0
+            self._sha = hashlib.sha256()
+        else:
+            text = chunk.get("text_chunk") or ""
+        self.length += len(text)
+        self._sha.update(text.encode("utf-8"))
+
+    def matches(self, length, sha256):
+        return (length is None or length == self.length) and self._sha.hexdigest() == sha256
+
+
+class StreamHandle:
+    """One in-flight chat stream read off the script thread into a bounded queue."""
+
+    def __init__(self, session_id, url, timeout=None, queue_size=None, cache=None, cache_key=None,
+                 turn_started=None, post_url=None, post_body=None, stream_post_url=None, turn_id=None,
+                 cancel_url=None, sink=None, admission=None):
+        self.session_id = session_id
+        # Callable taking each event instead of the queue (a single-flight's shared log)
+        self.sink = sink
+        self.turn_id = turn_id
+        self.url = url
+        self.post_url = post_url
+        self.post_body = post_body
+        self.stream_post_url = None if stream_post_url in _unsupported_stream_posts else stream_post_url
+        self.cancel_url = cancel_url
+        self.cancel_reason = None
+        # Speculative (prefetch) turns are left out of the turn metrics
+        self.speculative = False
+        # Whether the backend may be generating: the message was sent before the worker started
+        self.generating = url is not None and post_url is None and self.stream_post_url is None
+        self.failed_stage = None
+        self.turn_started = time.monotonic() if turn_started is None else turn_started
+        self._seen_types = set()
+        self.cache = cache
+        self.cache_key = cache_key
+        self.recorded = [] if cache is not None and cache_key is not None else None
+        self.timeout = config.STREAM_TIMEOUT if timeout is None else timeout
+        self.message = new_genie_message()
+        # StreamRenderer.tuning of the last UI run that showed this turn
+        self.flush_tuning = None
+        self.parser = SSEParser()
+        self.event_profile = config.STREAM_EVENT_PROFILE
+        self._text = TextDigest()
+        self._event_id = None
+        self.recorder = None
+        self.events = queue.Queue(maxsize=config.STREAM_QUEUE_SIZE if queue_size is None else queue_size)
+        self.error = None
+        self.exhausted = False
+        self.ended = False
+        self.delivered = 0
+        self.reconnects = 0
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self.last_read = time.monotonic()
+        self._response = None
+        # Cancel signal for the session's previous turn, which must reach the backend first
+        self.after = None
+        # Upstream slot, taken from the admission controller before the first request
+        self.admission = admission
+        self.ticket = None
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self, reason="cancelled"):
+        """Stop reading and abort the upstream connection.
+
+        Returns True when this call interrupted a turn the backend may still be
+        generating, i.e. when a backend cancel signal is worth sending.
+        """
+        if self._cancelled.is_set():
+            return False
+        self.cancel_reason = reason
+        self._cancelled.set()
+        resp = self._response
+        if resp is not None:
+            # Only the worker may close the response: closing it here would hand
+            # the connection back to the pool while the worker is still reading.
+            # Shutting the socket down wakes the blocked read instead.
+            conn = getattr(resp.raw, "connection", None) or getattr(resp.raw, "_connection", None)
+            sock = getattr(conn, "sock", None)
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        return self.generating and not self.ended
+
+    def notify_backend(self, http_session):
+        """Ask the backend to stop generating this turn (best effort)."""
+        url = self.cancel_url
+        if url is None or url in _unsupported_cancel_urls:
+            return
+        try:
+            resp = http_session.post(url, json={"session_id": self.session_id}, timeout=config.CHAT_CANCEL_TIMEOUT)
+            resp.close()
+        except Exception as e:
+            metrics.inc("genie_backend_cancel_total", {"result": "error"})
+            logger.warning(f"Cancel signal for {self.session_id} failed: {e}")
+            return
+        if resp.status_code in CANCEL_UNSUPPORTED:
+            logger.info(f"Backend cancel unsupported ({resp.status_code}), not sending it again")
+            _unsupported_cancel_urls.add(url)
+            result = "unsupported"
+        else:
+            result = "ok" if resp.ok else "error"
+        metrics.inc("genie_backend_cancel_total", {"result": result})
+
+    def _put(self, item):
+        """Queue an item, blocking (backpressure) while the UI is behind."""
+        if self.sink is not None:
+            if self.cancelled:
+                raise StreamCancelled()
+            self.sink(item)
+            return
+        waited = 0.0
+        while not self.cancelled:
+            try:
+                self.events.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                waited += 0.1
+                if waited >= config.STREAM_ABANDON_TIMEOUT:
+                    logger.warning(f"Stream {self.session_id} abandoned by its reader, cancelling")
+                    if self.cancel("abandoned"):
+                        metrics.inc("genie_stream_cancelled_total", {"reason": "abandoned"})
+        raise StreamCancelled()
+
+    def _admit(self):
+        """Wait for an upstream slot, showing the place in line; raises AdmissionRejected when shed."""
+        if self.speculative:
+            self.ticket = self.admission.try_enter(self.session_id)
+            if self.ticket is None:
+                raise AdmissionRejected("no free upstream slot for a prefetch")
+            return
+        self.ticket = self.admission.enter(self.session_id)
+        shown = 0
+        while True:
+            position = self.admission.wait(self.ticket, 0.25)
+            if not position:
+                break
+            if self.cancelled:
+                raise StreamCancelled()
+            if time.monotonic() - self.ticket.enqueued >= self.admission.max_wait:
+                self.admission.leave(self.ticket, "shed_timeout")
+                self.ticket = None
+                raise AdmissionRejected(f"waited {self.admission.max_wait:g}s at place {position} in line")
+            if position != shown:
+                shown = position
+                self._put({"type": "status_update", "message": f"Genie is busy, you are number {position} in line..."})
+        if shown:
+            self._put({"type": "status_update", "message": "Genie is thinking..."})
+
+    def _post(self, http_session):
+        """Send the chat message from the worker, right before streaming."""
+        with metrics.span("genie_chat_post_seconds"):
+            resp = http_session.post(self.post_url, json=self.post_body, timeout=config.CHAT_TIMEOUT)
+        resp.raise_for_status()
+
+    def _open(self, http_session, headers):
+        """Open the event stream: one streaming POST when available, else POST + GET."""
+        if self.stream_post_url is not None and not self.reconnects:
+            logger.info(f"Streaming from: POST {self.stream_post_url}")
+            self.generating = True
+            connect_started = time.perf_counter()
+            resp = http_session.post(
+                self.stream_post_url, json=self.post_body, stream=True, timeout=self.timeout,
+                headers=stream_headers(self.event_profile),
+            )
+            if resp.status_code not in STREAM_POST_UNSUPPORTED:
+                metrics.observe("genie_stream_connect_seconds", time.perf_counter() - connect_started)
+                return resp
+            resp.close()
+            logger.info(f"Streaming POST unsupported ({resp.status_code}), falling back to POST + GET")
+            _unsupported_stream_posts.add(self.stream_post_url)
+            self.stream_post_url = None
+        if self.post_url is not None and not self.reconnects:
+            self.generating = True
+            try:
+                self._post(http_session)
+            except Exception:
+                self.failed_stage = "post"
+                raise
+        logger.info(f"Streaming from: {self.url}" + (f" (resuming after {headers['Last-Event-ID']})" if headers else ""))
+        connect_started = time.perf_counter()
+        resp = http_session.get(
+            self.url, stream=True, timeout=self.timeout, headers={**stream_headers(self.event_profile), **headers},
+        )
+        metrics.observe("genie_stream_connect_seconds", time.perf_counter() - connect_started)
+        return resp
+
+    def _read(self, http_session):
+        """Read one connection until end-of-stream, EOF or cancellation."""
+        headers = {}
+        if self.parser.last_event_id is not None:
+            headers["Last-Event-ID"] = self.parser.last_event_id
+        with self._open(http_session, headers) as resp:
+            self._response = resp
+            resp.raise_for_status()
+            try:
+                self._read_events(resp)
+            finally:
+                if metrics.ENABLED and not self.speculative:
+                    # Bytes off the wire, i.e. before decompression
+                    metrics.inc(
+                        "genie_stream_bytes_total", {"encoding": resp.headers.get("Content-Encoding", "identity")},
+                        value=resp.raw.tell(),
+                    )
+
+    def _read_events(self, resp):
+        chunks = iter_response_chunks(resp)
+        if self.recorder is not None:
+            chunks = self.recorder.tap(chunks)
+        for event in iter_events(chunks, self.parser):
+            if self.cancelled:
+                return
+            try:
+                chunk = event.json()
+            except ValueError:
+                continue
+            ctype = chunk.get("type")
+            if ctype == "content_chunk":
+                self._text.feed(chunk)
+            elif ctype == "final_summary" and "text_sha256" in chunk and not chunk.get("full_response_for_db"):
+                self._check_text(chunk)
+            if metrics.ENABLED and not self.speculative:
+                self._record(ctype)
+            self._put(chunk)
+            self.delivered += 1
+            self._event_id = event.id
+            if self.recorded is not None:
+                self.recorded.append(chunk)
+            if ctype in END_EVENT_TYPES:
+                self.ended = True
+                self._store(chunk)
+                return
+
+    def _check_text(self, chunk):
+        """Verify a compact final_summary against the text the content chunks built."""
+        if self._text.matches(chunk.get("text_length"), chunk["text_sha256"]):
+            return
+        metrics.inc("genie_text_digest_mismatch_total")
+        if self.event_profile == "compact" and self._event_id is not None:
+            # Resume just before the summary and ask for it with the full text this time
+            self.event_profile = "full"
+            self.parser.last_event_id = self._event_id
+            raise TextDigestMismatch(f"streamed text of {self._text.length} chars does not match final_summary")
+        logger.warning(f"Stream {self.session_id}: final_summary digest mismatch, keeping the streamed text")
+
+    def _record(self, ctype):
+        """Count the event and time the first arrival of each phase of the turn."""
+        metrics.inc("genie_stream_events_total", {"type": ctype})
+        if ctype in self._seen_types:
+            return
+        self._seen_types.add(ctype)
+        elapsed = time.monotonic() - self.turn_started
+        if ctype in FIRST_EVENT_METRICS:
+            metrics.observe(FIRST_EVENT_METRICS[ctype], elapsed)
+        if ctype in END_EVENT_TYPES:
+            metrics.observe("genie_turn_seconds", elapsed)
+
+    def _store(self, last_chunk):
+        """Save a cleanly finished turn in the response cache."""
+        if self.recorded is None or last_chunk.get("type") == "error":
+            return
+        try:
+            self.cache.put(self.cache_key, self.recorded)
+        except Exception as e:
+            logger.warning(f"Could not cache response for {self.session_id}: {e}")
+
+    def _resumable(self, error):
+        """Whether reconnecting can continue the stream without duplicating events."""
+        if self.failed_stage == "post" or self.reconnects >= config.STREAM_MAX_RECONNECTS:
+            return False
+        if isinstance(error, requests.HTTPError) and error.response is not None and error.response.status_code < 500:
+            return False
+        # Without event ids the server would replay from the start
+        return self.parser.last_event_id is not None or self.delivered == 0
+
+    def _backoff(self):
+        """Jittered exponential delay, seeded by the server's retry field when sent."""
+        base = self.parser.retry / 1000 if self.parser.retry is not None else config.STREAM_RECONNECT_BACKOFF
+        delay = min(config.STREAM_RECONNECT_MAX_DELAY, base * (2 ** self.reconnects))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def run(self, http_session):
+        """Worker body: read the SSE stream, reconnecting with Last-Event-ID on drops."""
+        if not self.speculative:
+            self.recorder = open_recorder(self.session_id, self.url, self.turn_id)
+        try:
+            if self.after is not None:
+                try:
+                    self.after.result(timeout=sum(config.CHAT_CANCEL_TIMEOUT))
+                except Exception:
+                    pass
+            if self.admission is not None:
+                try:
+                    self._admit()
+                except AdmissionRejected as e:
+                    logger.warning(f"Turn of {self.session_id} shed by admission control: {e}")
+                    self.failed_stage = "admission"
+                    self.error = AdmissionRejected(BUSY_MESSAGE)
+                    return
+            while not self.cancelled:
+                error = None
+                try:
+                    self._read(http_session)
+                except StreamCancelled:
+                    return
+                except Exception as e:
+                    error = e
+                finally:
+                    self._response = None
+                if self.ended or self.cancelled:
+                    return
+                if error is None:
+                    error = ConnectionError("stream closed before end-of-stream event")
+                if not self._resumable(error):
+                    metrics.inc("genie_errors_total", {"stage": self.failed_stage or "stream"})
+                    logger.error(f"Stream error: {error}", exc_info=error)
+                    self.error = error
+                    return
+                delay = self._backoff()
+                self.reconnects += 1
+                metrics.inc("genie_stream_reconnects_total")
+                logger.warning(f"Stream {self.session_id} dropped ({error}), reconnect {self.reconnects} in {delay:.2f}s")
+                self._put({"type": "status_update", "message": "Reconnecting..."})
+                if self._cancelled.wait(delay):
+                    return
+                # Drop any half-received event from the broken connection
+                self.parser = SSEParser(last_event_id=self.parser.last_event_id, retry=self.parser.retry)
+        except StreamCancelled:
+            pass
+        finally:
+            if self.ticket is not None:
+                self.admission.leave(self.ticket)
+                self.ticket = None
+            if self.recorder is not None:
+                self.recorder.close()
+            self._done.set()
+            # With a shared session store the reader may have resumed this session on another
+            # process, whose stream a backend cancel would stop as well
+            if self.cancel_reason == "abandoned" and not self.ended and config.SESSION_STORE == "off":
+                self.notify_backend(http_session)
+
+    @property
+    def done(self):
+        """Whether the worker has finished (events may still be queued)."""
+        return self._done.is_set()
+
+    def drain(self, timeout, max_events=None):
+        """Return the events queued so far, waiting up to timeout for the first one."""
+        self.last_read = time.monotonic()
+        events = []
+        try:
+            if self._done.is_set():
+                events.append(self.events.get_nowait())
+            else:
+                events.append(self.events.get(timeout=max(timeout, 0)))
+            while max_events is None or len(events) < max_events:
+                events.append(self.events.get_nowait())
+        except queue.Empty:
+            pass
+        if self._done.is_set() and self.events.empty():
+            self.exhausted = True
+        return events
+
+
+class StreamManager:
+    """Process-wide registry of active streams, one per chat session."""
+
+    def __init__(self, http_session, max_workers=None, cache=None, coalesce=None, max_in_flight=None):
+        self.http_session = http_session
+        self.cache = cache
+        self.flights = FlightBoard() if (config.COALESCE_REQUESTS if coalesce is None else coalesce) else None
+        max_in_flight = config.UPSTREAM_MAX_IN_FLIGHT if max_in_flight is None else max_in_flight
+        self.admission = AdmissionController(max_in_flight) if max_in_flight else None
+        max_workers = config.STREAM_WORKERS if max_workers is None else max_workers
+        if self.admission is not None:
+            # Queued turns wait on a worker thread of their own
+            max_workers += self.admission.max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="genie-stream")
+        self._handles = {}
+        self._notifying = {}
+        self._lock = threading.Lock()
+
+    def _reap(self):
+        """Forget finished handles nobody has drained for a while, e.g. of closed or refreshed tabs.
+
+        Called with the lock held.
+        """
+        now = time.monotonic()
+        stale = [
+            session_id for session_id, handle in self._handles.items()
+            if handle.done and now - handle.last_read >= config.STREAM_ABANDON_TIMEOUT
+        ]
+        for session_id in stale:
+            del self._handles[session_id]
+
+    def _register(self, handle):
+        with self._lock:
+            self._reap()
+            previous = self._handles.get(handle.session_id)
+            self._handles[handle.session_id] = handle
+        if previous is not None:
+            self._cancel(previous, "superseded")
+
+    def _cancel(self, handle, reason):
+        """Cancel handle and, if it was still generating, tell the backend off the caller's thread."""
+        if not handle.cancel(reason):
+            return
+        metrics.inc("genie_stream_cancelled_total", {"reason": reason})
+        if handle.cancel_url is not None:
+            future = self._executor.submit(handle.notify_backend, self.http_session)
+            with self._lock:
+                self._notifying[handle.session_id] = future
+            future.add_done_callback(lambda f: self._notified(handle.session_id, f))
+
+    def _cancel_flight(self, flight, reason):
+        """Cancel a flight nobody reads any more.
+
+        The backend cancel names the leader's session_id, so once the leader has
+        left for another turn only the connection is closed: the signal would
+        stop the leader's new turn instead. The same goes for readers that
+        stopped reading while a shared session store is on: they may have resumed
+        the session on another process.
+        """
+        resumable = reason == "abandoned" and config.SESSION_STORE != "off"
+        if not (flight.leader_left or resumable):
+            self._cancel(flight.source, reason)
+        elif flight.source.cancel(reason):
+            metrics.inc("genie_stream_cancelled_total", {"reason": reason})
+
+    def _notified(self, session_id, future):
+        with self._lock:
+            if self._notifying.get(session_id) is future:
+                del self._notifying[session_id]
+
+    def settle(self, session_id, timeout=None):
+        """Wait for a pending cancel signal of session_id, so it cannot hit the next turn."""
+        with self._lock:
+            future = self._notifying.get(session_id)
+        if future is not None:
+            try:
+                future.result(timeout=sum(config.CHAT_CANCEL_TIMEOUT) if timeout is None else timeout)
+            except Exception:
+                pass
+
+    def start(self, session_id, url, cache_key=None, turn_started=None, post_url=None, post_body=None,
+              stream_post_url=None, turn_id=None, cancel_url=None, coalesce_key=None):
+        """Start consuming url for session_id, superseding any earlier stream.
+
+        With a cache_key the finished turn is stored in the response cache.
+        turn_started (time.monotonic) anchors the phase timings of the turn.
+        With post_url the worker sends post_body there first, so the stream
+        opens without waiting for a script rerun; stream_post_url tries a
+        single streaming POST before that. turn_id tags the handle with the
+        turn it answers; cancel_url receives a cancel signal if the turn is
+        cancelled while the backend is still generating. With coalescing on,
+        a coalesce_key joins an identical turn already in flight, if any.
+        """
+        if coalesce_key is not None and self.flights is not None:
+            def launch(flight):
+                source = flight.source = StreamHandle(
+                    session_id, url, queue_size=0, cache=self.cache, cache_key=cache_key,
+                    turn_started=turn_started, post_url=post_url, post_body=post_body,
+                    stream_post_url=stream_post_url, cancel_url=cancel_url, sink=flight.publish,
+                    admission=self.admission,
+                )
+                flight.on_idle = lambda reason: self._cancel_flight(flight, reason)
+                with self._lock:
+                    source.after = self._notifying.get(session_id)
+                self._executor.submit(self._fly, flight)
+
+            handle = self.flights.join(coalesce_key, session_id, turn_id, launch)
+            self._register(handle)
+            return handle
+
+        handle = StreamHandle(
+            session_id, url, cache=self.cache, cache_key=cache_key, turn_started=turn_started,
+            post_url=post_url, post_body=post_body, stream_post_url=stream_post_url,
+            turn_id=turn_id, cancel_url=cancel_url, admission=self.admission,
+        )
+        self._register(handle)
+        with self._lock:
+            handle.after = self._notifying.get(session_id)
+        self._executor.submit(handle.run, self.http_session)
+        return handle
+
+    def _fly(self, flight):
+        try:
+            flight.source.run(self.http_session)
+        finally:
+            self.flights.land(flight)
+
+    def replay(self, session_id, events, turn_id=None):
+        """Serve a cached turn: a handle whose queue is pre-filled with events."""
+        handle = StreamHandle(session_id, None, queue_size=0, turn_id=turn_id)
+        for chunk in events:
+            handle.events.put_nowait(chunk)
+        handle.delivered = len(events)
+        handle.ended = True
+        handle._done.set()
+        self._register(handle)
+        return handle
+
+    def adopt(self, handle):
+        """Make a handle started elsewhere (e.g. a prefetch) the active stream of its session."""
+        self._register(handle)
+        return handle
+
+    def active(self):
+        """Number of sessions whose stream worker is still running."""
+        with self._lock:
+            self._reap()
+            return sum(not handle.done for handle in self._handles.values())
+
+    def get(self, session_id):
+        with self._lock:
+            return self._handles.get(session_id)
+
+    def cancel(self, session_id, reason="cancelled"):
+        """Cancel and forget the active stream of session_id, if any."""
+        with self._lock:
+            handle = self._handles.pop(session_id, None)
+        if handle is not None:
+            self._cancel(handle, reason)
+        return handle
+
+    def discard(self, handle):
+        """Forget a finished handle; False if it was superseded or cancelled meanwhile."""
+        with self._lock:
+            if self._handles.get(handle.session_id) is not handle:
+                return False
+            del self._handles[handle.session_id]
+            return True
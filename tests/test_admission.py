@@ -0,0 +1,77 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import config  # noqa: E402
+from admission import AdmissionController, AdmissionRejected  # noqa: E402
+from http_client import build_session  # noqa: E402
+from standin_server import StandinServer  # noqa: E402
+from stream_worker import BUSY_MESSAGE, StreamManager  # noqa: E402
+
+
+def test_waiting_turns_are_admitted_in_arrival_order():
+    admission = AdmissionController(limit=1, max_queue=5, max_wait=10)
+    first, second, third = (admission.enter(s) for s in ("a", "b", "c"))
+    assert first.admitted and not second.admitted and not third.admitted
+    assert admission.wait(second, 0) == 1 and admission.wait(third, 0) == 2
+
+    admission.leave(first)
+    assert second.admitted and not third.admitted
+    admission.leave(second)
+    assert third.admitted
+    admission.leave(third)
+    assert admission.stats() == {"in_flight": 0, "queued": 0, "limit": 1}
+
+
+def test_full_queue_sheds_new_turns():
+    admission = AdmissionController(limit=1, max_queue=1, max_wait=10)
+    admission.enter("a")
+    admission.enter("b")
+    with pytest.raises(AdmissionRejected):
+        admission.enter("c")
+    assert admission.stats()["queued"] == 1
+
+
+def test_leaving_the_queue_moves_later_turns_up():
+    admission = AdmissionController(limit=1, max_queue=5, max_wait=10)
+    running = admission.enter("a")
+    cancelled, waiting = admission.enter("b"), admission.enter("c")
+    admission.leave(cancelled)
+    assert admission.wait(waiting, 0) == 1
+    admission.leave(running)
+    assert waiting.admitted and not cancelled.admitted
+    assert admission.stats()["in_flight"] == 1
+
+
+def test_prefetches_never_queue():
+    admission = AdmissionController(limit=1, max_queue=5, max_wait=10)
+    assert admission.try_enter("prefetch") is not None
+    assert admission.try_enter("prefetch") is None
+    assert admission.stats()["queued"] == 0
+
+
+def start_turn(manager, server, session_id):
+    return manager.start(
+        session_id, f"{server.url}/chat-bot/chat-stream/{session_id}", turn_id=uuid.uuid4().hex,
+        post_url=f"{server.url}/chat-bot/chat",
+        post_body={"session_id": session_id, "message": "busy", "metadata": {}, "action_key": ""},
+    )
+
+
+def test_turn_waiting_too_long_is_shed(monkeypatch):
+    monkeypatch.setattr(config, "UPSTREAM_MAX_QUEUE_WAIT", 0.3)
+    with StandinServer(tokens=100, token_rate=50) as server:
+        manager = StreamManager(build_session(), max_in_flight=1)
+        running = start_turn(manager, server, str(uuid.uuid4()))
+        shed = start_turn(manager, server, str(uuid.uuid4()))
+        while not shed.exhausted:
+            shed.drain(1.0)
+        assert shed.failed_stage == "admission"
+        assert str(shed.error) == BUSY_MESSAGE
+        assert not running.done and server.counters["posts"] == 1
+        manager.cancel(running.session_id)
+        assert manager.admission.stats()["queued"] == 0
@@ -0,0 +1,38 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from history_store import JsonlHistoryStore, RespHistoryStore, SqliteHistoryStore  # noqa: E402
+from kv_client import KVClient  # noqa: E402
+from messages import ChatMessage  # noqa: E402
+from standin_kv import StandinKV  # noqa: E402
+
+
+@pytest.mark.parametrize("kind", ["jsonl", "sqlite"])
+def test_idle_sessions_expire(tmp_path, kind):
+    if kind == "jsonl":
+        store = JsonlHistoryStore(str(tmp_path / "history"))
+    else:
+        store = SqliteHistoryStore(str(tmp_path / "history.sqlite3"))
+    store.append("old", [ChatMessage("user", "hi")])
+    if kind == "jsonl":
+        past = time.time() - 120
+        os.utime(store._path("old"), (past, past))
+    else:
+        with store._connect() as db:
+            db.execute("UPDATE messages SET created = created - 120")
+    store.append("new", [ChatMessage("user", "hello")])
+    assert store.expire(60) == 1
+    assert store.load("old") == []
+    assert [m.text for m in store.load("new")] == ["hello"]
+
+
+def test_resp_lists_carry_the_ttl():
+    with StandinKV() as kv:
+        store = RespHistoryStore(KVClient(kv.url), ttl=60)
+        store.append("s", [ChatMessage("user", "hi")])
+        assert 0 < kv.expires[store._key("s").encode()] - time.time() <= 60
@@ -0,0 +1,75 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from kv_client import KVClient
+
+
+class ScriptedKV:
+    """Accepts connections and answers each command with replies.pop(0); None means stay silent."""
+
+    def __init__(self, replies, close_after_reply=False):
+        self.replies = replies
+        self.close_after_reply = close_after_reply
+        self.received = []
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.listener.getsockname()[1]}"
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        reader = conn.makefile("rb")
+        with conn:
+            while True:
+                line = reader.readline()
+                if not line:
+                    return
+                args = []
+                for _ in range(int(line[1:-2])):
+                    size = int(reader.readline()[1:-2])
+                    args.append(reader.read(size + 2)[:-2].decode())
+                self.received.append(args)
+                reply = self.replies.pop(0)
+                if reply is None:
+                    continue
+                conn.sendall(reply)
+                if self.close_after_reply:
+                    return
+
+    def close(self):
+        self.listener.close()
+
+
+def test_connection_closed_while_idle_is_replaced():
+    server = ScriptedKV([b"+PONG\r\n", b":1\r\n"], close_after_reply=True)
+    client = KVClient(server.url, timeout=2)
+    assert client.execute("PING") == "PONG"
+    time.sleep(0.1)
+    assert client.execute("RPUSH", "k", "v") == 1
+    assert server.received == [["PING"], ["RPUSH", "k", "v"]]
+    server.close()
+
+
+def test_commands_are_not_resent_after_a_reply_timeout():
+    server = ScriptedKV([b"+PONG\r\n", None, b"+PONG\r\n"])
+    client = KVClient(server.url, timeout=0.3)
+    assert client.execute("PING") == "PONG"
+    with pytest.raises(socket.timeout):
+        client.execute("RPUSH", "k", "v")
+    assert server.received == [["PING"], ["RPUSH", "k", "v"]]
+    # The next command gets a fresh connection
+    assert client.execute("PING") == "PONG"
+    assert server.received == [["PING"], ["RPUSH", "k", "v"], ["PING"]]
+    server.close()
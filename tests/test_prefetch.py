@@ -0,0 +1,29 @@
+import metrics
+from prefetch import Prefetcher
+
+
+class BusyManager:
+    admission = None
+
+    def active(self):
+        return 10 ** 6
+
+
+def prefetch_results():
+    return {
+        c["labels"]["result"]: c["value"] for c in metrics.snapshot()["counters"] if c["name"] == "genie_prefetch_total"
+    }
+
+
+def test_only_action_chips_are_prefetched(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    metrics.reset()
+    prefetcher = Prefetcher(BusyManager(), base_url="http://127.0.0.1:1", top_k=3)
+    prefetcher.schedule("s1", [
+        {"prompt": "Show me courses in UK", "action": ""},
+        {"prompt": "Tell me more"},
+        {"prompt": "Scholarships", "action": "SCHOLARSHIPS"},
+    ])
+    # Both prompt-only chips are skipped; the action chip reaches the busy check
+    assert prefetch_results() == {"skipped_context": 2, "skipped_busy": 1}
+    assert len(prefetcher.flights) == 0
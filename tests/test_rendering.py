@@ -0,0 +1,56 @@
+import config
+import rendering
+from messages import ChatMessage
+
+
+def course(name, **extra):
+    return {"name": name, "edpRefId": "derby", "institution": {"name": "University of Derby"}, **extra}
+
+
+def test_courses_of_one_university_get_their_own_cards():
+    first = rendering.cached_card(course("MSc Data Science"), "COURSE_SEARCH")
+    second = rendering.cached_card(course("MBA"), "COURSE_SEARCH")
+    assert "MSc Data Science" in first and "MBA" not in first
+    assert "MBA" in second
+
+
+def test_cards_are_reused_for_the_same_source():
+    source = course("MSc Nursing", slug="msc-nursing")
+    assert rendering.cached_card(dict(source), "COURSE_SEARCH") is rendering.cached_card(dict(source), "COURSE_SEARCH")
+
+
+def test_answer_text_is_never_rendered_as_html():
+    record = ChatMessage("genie", "Hello <img src=x onerror=alert(1)>", sources=[course("MBA")], intent="COURSE_SEARCH")
+    parts = rendering.frozen_parts(record)
+    assert ("Hello <img src=x onerror=alert(1)>", False) in parts
+    assert all("<img" not in body for body, unsafe in parts if unsafe)
+
+
+def test_user_text_is_escaped():
+    (body, unsafe), = rendering.frozen_parts(ChatMessage("user", "<b>hi</b>"))
+    assert unsafe and "&lt;b&gt;hi&lt;/b&gt;" in body
+
+
+class Placeholder:
+    def container(self):
+        return self
+
+    def empty(self):
+        return self
+
+    def markdown(self, body, unsafe_allow_html=False):
+        pass
+
+
+def test_next_run_starts_from_the_measured_flush_interval():
+    now = [0.0]
+    first = rendering.StreamRenderer(Placeholder(), clock=lambda: now[0], adaptive=True)
+    entry = {"text": ""}
+    for _ in range(200):
+        now[0] += 0.005
+        entry["text"] += "x"
+        first.update(entry)
+    assert first.interval > config.STREAM_FLUSH_MIN_INTERVAL
+
+    second = rendering.StreamRenderer(Placeholder(), clock=lambda: now[0], adaptive=True, tuning=first.tuning)
+    assert second.interval == first.interval and second.batch_limit == first.batch_limit
@@ -0,0 +1,22 @@
+from response_cache import ResponseCache, cacheable, make_key
+
+
+def test_only_opening_questions_and_chip_actions_are_cacheable():
+    assert cacheable(True)
+    assert cacheable(False, "SCHOLARSHIPS")
+    assert not cacheable(False)
+    assert not cacheable(False, "")
+
+
+def test_key_normalizes_case_and_whitespace():
+    assert make_key("Tell  me more ", "", {"a": 1}) == make_key("tell me more", "", {"a": 1})
+    assert make_key("tell me more", "", {"a": 1}) != make_key("tell me more", "X", {"a": 1})
+
+
+def test_entries_expire():
+    now = [0.0]
+    cache = ResponseCache(max_entries=4, ttl=10, clock=lambda: now[0])
+    cache.put("k", [{"type": "stream_end"}])
+    assert cache.get("k") == [{"type": "stream_end"}]
+    now[0] = 11
+    assert cache.get("k") is None
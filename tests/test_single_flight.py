@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from http_client import build_session  # noqa: E402
+from messages import apply_event  # noqa: E402
+from standin_server import StandinServer  # noqa: E402
+from stream_worker import StreamManager  # noqa: E402
+
+
+def start_turn(manager, server, session_id, message, coalesce_key=None):
+    return manager.start(
+        session_id, f"{server.url}/chat-bot/chat-stream/{session_id}", turn_id=uuid.uuid4().hex,
+        post_url=f"{server.url}/chat-bot/chat",
+        post_body={"session_id": session_id, "message": message, "metadata": {}, "action_key": ""},
+        cancel_url=f"{server.url}/chat-bot/cancel", coalesce_key=coalesce_key,
+    )
+
+
+def read_turn(handle, timeout=10):
+    msg = handle.message
+    deadline = time.monotonic() + timeout
+    while not (msg["isStreamEnded"] or handle.exhausted) and time.monotonic() < deadline:
+        for chunk in handle.drain(0.1):
+            apply_event(msg, chunk)
+    return msg
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_follower_leaving_last_spares_the_leaders_next_turn():
+    with StandinServer(tokens=40, token_rate=40, sources=1) as server:
+        manager = StreamManager(build_session(), coalesce=True, max_in_flight=0)
+        leader = start_turn(manager, server, "a", "hello", coalesce_key="k")
+        follower = start_turn(manager, server, "b", "hello", coalesce_key="k")
+        assert follower.flight is leader.flight
+        source = leader.flight.source
+        assert wait_for(lambda: follower.delivered or follower.drain(0.1))
+
+        # The leader moves on, then the last follower clears its chat
+        next_turn = start_turn(manager, server, "a", "something else")
+        manager.cancel("b")
+        assert wait_for(lambda: source.done)
+
+        msg = read_turn(next_turn)
+        assert source.cancelled
+        assert server.counters["cancels"] == 0
+    assert next_turn.error is None and next_turn.reconnects == 0
+    assert msg["isStreamEnded"] and msg["text"]
+
+
+def test_leader_leaving_last_cancels_the_generation():
+    with StandinServer(tokens=40, token_rate=40, sources=1) as server:
+        manager = StreamManager(build_session(), coalesce=True, max_in_flight=0)
+        leader = start_turn(manager, server, "a", "hello", coalesce_key="k")
+        follower = start_turn(manager, server, "b", "hello", coalesce_key="k")
+        assert wait_for(lambda: leader.drain(0.1))
+        manager.cancel("b")
+        manager.cancel("a")
+        assert wait_for(lambda: server.counters["cancels"] == 1)
+        assert follower.flight.source.cancelled
+
+
+def test_identical_turns_share_one_upstream_stream():
+    with StandinServer(tokens=20, token_rate=100, sources=1) as server:
+        manager = StreamManager(build_session(), coalesce=True, max_in_flight=0)
+        first = start_turn(manager, server, "a", "hello", coalesce_key="k")
+        second = start_turn(manager, server, "b", "hello", coalesce_key="k")
+        first_msg, second_msg = read_turn(first), read_turn(second)
+        assert server.counters["posts"] == 1 and server.counters["streams"] == 1
+    assert first_msg["isStreamEnded"] and second_msg["isStreamEnded"]
+    assert first_msg["text"] == second_msg["text"]
+
+
+def test_late_joiner_replays_the_events_it_missed():
+    with StandinServer(tokens=40, token_rate=40, sources=1) as server:
+        manager = StreamManager(build_session(), coalesce=True, max_in_flight=0)
+        first = start_turn(manager, server, "a", "hello", coalesce_key="k")
+        first_msg = first.message
+        while not first_msg["text"]:
+            for chunk in first.drain(0.1):
+                apply_event(first_msg, chunk)
+        late = start_turn(manager, server, "b", "hello", coalesce_key="k")
+        assert late.flight is first.flight
+        late_msg = read_turn(late)
+        read_turn(first)
+    assert late.delivered == first.delivered
+    assert late_msg["text"] == first_msg["text"]
+
+
+def test_landed_flight_is_not_joined_again():
+    with StandinServer(tokens=5, sources=1) as server:
+        manager = StreamManager(build_session(), coalesce=True, max_in_flight=0)
+        first = start_turn(manager, server, "a", "hello", coalesce_key="k")
+        read_turn(first)
+        assert wait_for(lambda: len(manager.flights) == 0)
+        again = start_turn(manager, server, "b", "hello", coalesce_key="k")
+        assert again.flight is not first.flight
+        assert read_turn(again)["isStreamEnded"]
+        assert server.counters["posts"] == 2
+
+
+def test_upstream_is_cancelled_only_when_the_last_reader_leaves():
+    with StandinServer(tokens=40, token_rate=40, sources=1) as server:
+        manager = StreamManager(build_session(), coalesce=True, max_in_flight=0)
+        first = start_turn(manager, server, "a", "hello", coalesce_key="k")
+        second = start_turn(manager, server, "b", "hello", coalesce_key="k")
+        source = first.flight.source
+        manager.cancel("a")
+        assert not source.cancelled
+        assert read_turn(second)["isStreamEnded"]
+        assert server.counters["cancels"] == 0
+
+        third = start_turn(manager, server, "c", "hello again", coalesce_key="k2")
+        fourth = start_turn(manager, server, "d", "hello again", coalesce_key="k2")
+        manager.cancel("c")
+        manager.cancel("d")
+        assert third.flight.source.cancelled and fourth.flight is third.flight
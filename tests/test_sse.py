@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+import sse
+from sse import SSEParser, iter_events, stdlib_loads
+
+
+def parse(*chunks, parser=None):
+    parser = SSEParser() if parser is None else parser
+    return [event for chunk in chunks for event in parser.feed(chunk)]
+
+
+def test_single_event():
+    events = parse(b'data: {"type": "stream_end"}\n\n')
+    assert len(events) == 1
+    assert events[0].event == "message"
+    assert events[0].json() == {"type": "stream_end"}
+
+
+def test_event_split_at_every_byte():
+    body = b'event: update\nid: 7\ndata: {"a": 1}\n\ndata: {"b": "\xc3\xa9"}\n\n'
+    for size in range(1, len(body) + 1):
+        chunks = [body[i:i + size] for i in range(0, len(body), size)]
+        events = parse(*chunks)
+        assert [e.json() for e in events] == [{"a": 1}, {"b": "é"}], size
+        assert events[0].event == "update" and events[0].id == "7"
+        assert events[1].event == "message"
+
+
+@pytest.mark.parametrize("eol", [b"\n", b"\r\n", b"\r"])
+def test_line_endings(eol):
+    body = b"data: 1" + eol + b"data: 2" + eol + eol + b"data: 3" + eol + eol
+    # A trailing CR could still be half of a CRLF, so the next byte settles it
+    assert [e.data for e in parse(body, b":" + eol)] == ["1\n2", "3"]
+
+
+def test_crlf_split_across_chunks():
+    events = parse(b"data: 1\r", b"\n\r", b"\ndata: 2\r\n\r\n")
+    assert [e.data for e in events] == ["1", "2"]
+
+
+def test_bom_is_stripped_even_when_split():
+    events = parse(b"\xef", b"\xbb\xbfdata: 1\n\n")
+    assert [e.data for e in events] == ["1"]
+
+
+def test_fields_without_space_and_comments():
+    parser = SSEParser()
+    events = parse(b": keep-alive\ndata:x\nretry: 250\nretry: soon\n\n", parser=parser)
+    assert [e.data for e in events] == ["x"]
+    assert parser.comments == 1
+    assert parser.retry == 250
+
+
+def test_blank_line_without_data_dispatches_nothing():
+    events = parse(b"event: ping\n\ndata: 1\n\n")
+    assert len(events) == 1
+    assert events[0].event == "message"
+
+
+def test_id_with_nul_is_ignored():
+    parser = SSEParser(last_event_id="3")
+    parse(b"id: 4\x005\ndata: 1\n\n", parser=parser)
+    assert parser.last_event_id == "3"
+
+
+def test_iter_events_keeps_parser_state():
+    parser = SSEParser()
+    events = list(iter_events([b"id: 1\ndata: 1\n", b"\nretry: 10\n"], parser))
+    assert [e.id for e in events] == ["1"]
+    assert parser.retry == 10
+
+
+@pytest.mark.parametrize("raw", [b'{"a": [1, 2.5, null, true]}', b'"\\u00e9"', b"3", b' {"a": 1} '])
+def test_stdlib_loads_matches_json(raw):
+    assert stdlib_loads(raw) == json.loads(raw)
+
+
+@pytest.mark.parametrize("raw", [b"", b"{", b'{"a": 1} x', b"\xef\xbb\xbf{}", b"nope"])
+def test_stdlib_loads_rejects_what_json_rejects(raw):
+    with pytest.raises(ValueError):
+        stdlib_loads(raw)
+
+
+def test_event_json_uses_configured_backend():
+    assert sse.JSON_BACKEND in ("json", "orjson")
+    assert parse(b'data: {"x": "y"}\n\n')[0].json() == {"x": "y"}
+
+
+def test_id_is_committed_only_when_its_event_is_dispatched():
+    parser = SSEParser()
+    parse(b'id: 1\ndata: {"a": 1}\n\nid: 2\ndata: {"a"', parser=parser)
+    # Cut inside event 2: resuming must ask for everything after event 1
+    assert parser.last_event_id == "1"
+    events = parse(b': 2}\n\n', parser=parser)
+    assert [e.id for e in events] == ["2"]
+    assert parser.last_event_id == "2"
+
+
+def test_id_is_committed_by_a_blank_line_without_data():
+    parser = SSEParser()
+    parse(b"id: 5\n\n", parser=parser)
+    assert parser.last_event_id == "5"
@@ -0,0 +1,65 @@
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from http_client import build_session  # noqa: E402
+from messages import apply_event  # noqa: E402
+from standin_server import StandinServer  # noqa: E402
+from stream_worker import StreamManager  # noqa: E402
+
+
+def start_turn(manager, server, session_id, message):
+    return manager.start(
+        session_id, f"{server.url}/chat-bot/chat-stream/{session_id}", turn_id=uuid.uuid4().hex,
+        post_url=f"{server.url}/chat-bot/chat",
+        post_body={"session_id": session_id, "message": message, "metadata": {}, "action_key": ""},
+        cancel_url=f"{server.url}/chat-bot/cancel",
+    )
+
+
+def read_turn(handle):
+    msg = handle.message
+    while not (msg["isStreamEnded"] or handle.exhausted):
+        for chunk in handle.drain(1.0):
+            apply_event(msg, chunk)
+    return msg
+
+
+def test_new_turn_supersedes_and_cancels_the_previous_one():
+    with StandinServer(tokens=100, token_rate=50, sources=1) as server:
+        manager = StreamManager(build_session(), max_in_flight=0)
+        old = start_turn(manager, server, "s", "first")
+        assert old.drain(5.0)
+        new = start_turn(manager, server, "s", "second")
+        assert old.cancelled and old.cancel_reason == "superseded"
+        assert manager.get("s") is new
+
+        # The cancel reaches the backend before the new turn's POST, so it cannot stop it
+        msg = read_turn(new)
+        assert server.counters["cancels"] == 1
+    assert new.error is None and new.reconnects == 0
+    assert msg["isStreamEnded"] and msg["text"]
+    assert not manager.discard(old)
+    assert manager.discard(new)
+
+
+def test_clearing_cancels_and_forgets_the_turn():
+    with StandinServer(tokens=100, token_rate=50, sources=1) as server:
+        manager = StreamManager(build_session(), max_in_flight=0)
+        handle = start_turn(manager, server, "s", "first")
+        assert handle.drain(5.0)
+        assert manager.cancel("s", "cleared") is handle
+        manager.settle("s")
+        assert handle.cancel_reason == "cleared" and manager.get("s") is None
+        assert server.counters["cancels"] == 1
+
+
+def test_finished_turn_is_not_cancelled_upstream():
+    with StandinServer(tokens=5, sources=1) as server:
+        manager = StreamManager(build_session(), max_in_flight=0)
+        handle = start_turn(manager, server, "s", "first")
+        assert read_turn(handle)["isStreamEnded"]
+        assert read_turn(start_turn(manager, server, "s", "second"))["isStreamEnded"]
+        assert server.counters["cancels"] == 0
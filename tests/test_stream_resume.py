@@ -0,0 +1,63 @@
+import os
+import sys
+import threading
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import config  # noqa: E402
+from http_client import build_session  # noqa: E402
+from messages import apply_event  # noqa: E402
+from standin_server import StandinServer, turn_events  # noqa: E402
+from stream_worker import StreamHandle  # noqa: E402
+
+TOKENS = 10
+EVENTS = len(turn_events("", TOKENS, 3))
+
+
+def run_turn(server):
+    session_id = str(uuid.uuid4())
+    handle = StreamHandle(
+        session_id, f"{server.url}/chat-bot/chat-stream/{session_id}", timeout=(2, 5),
+        post_url=f"{server.url}/chat-bot/chat",
+        post_body={"session_id": session_id, "message": "resume", "metadata": {}, "action_key": ""},
+    )
+    threading.Thread(target=handle.run, args=(build_session(),), daemon=True).start()
+    msg = handle.message
+    while not (msg["isStreamEnded"] or handle.exhausted):
+        for chunk in handle.drain(1.0):
+            apply_event(msg, chunk)
+    return handle, msg
+
+
+# Cuts inside the first content chunk, ai_response_completed and final_summary
+@pytest.mark.parametrize("drop_after", [2, EVENTS - 3, EVENTS - 2])
+def test_drop_inside_an_event_loses_nothing(drop_after):
+    with StandinServer(tokens=TOKENS, sources=3, drop_after=drop_after, drop_mid_event=True, retry_ms=10) as server:
+        handle, msg = run_turn(server)
+        assert server.counters["drops"] == 1 and server.counters["resumes"] == 1
+    assert handle.error is None and handle.reconnects == 1
+    # Every event up to final_summary, which ends the turn; the reconnect's status update is not counted
+    assert handle.delivered == EVENTS - 1
+    assert msg["isStreamEnded"]
+    assert len(msg["sources"]) == 3
+    assert len(msg["suggestions"]) == 2
+
+
+@pytest.mark.parametrize("session_store, cancels", [("off", 1), ("sqlite", 0)])
+def test_abandoned_stream_spares_sessions_resumed_elsewhere(monkeypatch, session_store, cancels):
+    monkeypatch.setattr(config, "SESSION_STORE", session_store)
+    monkeypatch.setattr(config, "STREAM_ABANDON_TIMEOUT", 0.3)
+    with StandinServer(tokens=200, token_rate=50) as server:
+        session_id = str(uuid.uuid4())
+        handle = StreamHandle(
+            session_id, f"{server.url}/chat-bot/chat-stream/{session_id}", timeout=(2, 5), queue_size=1,
+            post_url=f"{server.url}/chat-bot/chat", cancel_url=f"{server.url}/chat-bot/cancel",
+            post_body={"session_id": session_id, "message": "abandon", "metadata": {}, "action_key": ""},
+        )
+        # Nobody drains the queue, as when the reader resumed on another process
+        handle.run(build_session())
+        assert handle.cancel_reason == "abandoned"
+        assert server.counters["cancels"] == cancels